@@ -0,0 +1,93 @@
+"""
+Compare FISTA with and without the preallocated workspace.
+
+Reports wall time per iteration and a measure of allocator churn
+per iteration:
+
+* with tracemalloc (Python >= 3.4) the peak number of bytes
+  allocated on top of what was live before the fit;
+
+* the number of minor page faults. The script reruns itself with
+  glibc's mmap threshold fixed at 128KB, so every array larger
+  than that (p > 16000) is mapped fresh when allocated and the
+  page faults per iteration divided by p * 8 / 4096 count the
+  coefficient-sized arrays allocated per iteration.
+
+Usage::
+
+    python bench_fista_workspace.py [n] [p] [max_its]
+"""
+import os
+import sys
+import time
+import resource
+
+import numpy as np
+
+import regreg.api as rr
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def make_problem(n, p):
+    np.random.seed(0)
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal(n)
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, lagrange=np.fabs(np.dot(X.T, Y)).max() / 4.)
+    return rr.simple_problem(loss, penalty)
+
+def run(n, p, max_its, workspace):
+    problem = make_problem(n, p)
+    solver = rr.FISTA(problem)
+    fit_args = dict(max_its=max_its, min_its=max_its, tol=0,
+                    workspace=workspace, return_objective_hist=False)
+
+    # one warm up fit so workspace buffers exist before measuring
+    solver.fit(**fit_args)
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+
+    toc = time.time()
+    solver.fit(**fit_args)
+    elapsed = time.time() - toc
+
+    result = {'seconds per iteration': elapsed / max_its,
+              'minor page faults per iteration':
+              (resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults) / float(max_its)}
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result['peak bytes allocated during fit'] = peak - baseline
+    return result
+
+def main():
+    if 'MALLOC_MMAP_THRESHOLD_' not in os.environ:
+        # a fixed threshold turns off glibc's heap reuse for large blocks
+        os.environ['MALLOC_MMAP_THRESHOLD_'] = '131072'
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    n, p, max_its = 200, 100000, 100
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        max_its = int(sys.argv[3])
+
+    print('n=%d, p=%d, iterations=%d' % (n, p, max_its))
+    for workspace in [False, True]:
+        result = run(n, p, max_its, workspace)
+        result['coefficient arrays allocated per iteration'] = \
+            result['minor page faults per iteration'] / np.ceil(p * 8. / 4096)
+        print('workspace=%s' % workspace)
+        for key in sorted(result.keys()):
+            print('    %s: %0.4g' % (key, result[key]))
+
+if __name__ == '__main__':
+    main()
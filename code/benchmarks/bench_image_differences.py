@@ -0,0 +1,56 @@
+"""
+Compare forming the sparse difference matrix of `formD` and 
+multiplying by it with the differences of `image2d_differences`
+and `image_differences`, computed with slices of the image.
+
+Usage::
+
+    python bench_image_differences.py [size ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from regreg.affine.image2d import formD, image2d_differences, image_differences
+
+def timing(f, *args):
+    toc = time.time()
+    value = f(*args)
+    return time.time() - toc, value
+
+def main():
+    sizes = [64, 128, 256, 512]
+    if len(sys.argv) > 1:
+        sizes = [int(size) for size in sys.argv[1:]]
+
+    for size in sizes:
+        shape = (size, size)
+        x = np.random.standard_normal(shape)
+        u = np.random.standard_normal((size**2-1, 2))
+
+        form, D = timing(formD, size, size)
+        transpose, DT = timing(lambda: D.T.tocsr())
+        forward, _ = timing(lambda: D * x.reshape(-1))
+        adjoint, _ = timing(lambda: DT * u.T.reshape(-1))
+        print('%dx%d formD: form %0.4f, transpose %0.4f, D x %0.4f, D^T u %0.4f seconds, %0.1f MB' %
+              (size, size, form, transpose, forward, adjoint, 
+               2 * (D.data.nbytes + D.indices.nbytes + D.indptr.nbytes) / 2.**20))
+
+        for name, transform in [('image2d_differences', image2d_differences(shape)),
+                                ('image_differences', image_differences(shape))]:
+            forward, v = timing(transform.linear_map, x)
+            adjoint, _ = timing(transform.adjoint_map, np.random.standard_normal(v.shape))
+            print('%dx%d %s: D x %0.4f, D^T u %0.4f seconds' % (size, size, name, forward, adjoint))
+
+    # volumes, for which there is no formD
+    for size in [64, 128]:
+        shape = (size, size, size)
+        transform = image_differences(shape)
+        forward, v = timing(transform.linear_map, np.random.standard_normal(shape))
+        adjoint, _ = timing(transform.adjoint_map, v)
+        print('%dx%dx%d image_differences: D x %0.4f, D^T u %0.4f seconds' % 
+              (size, size, size, forward, adjoint))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the cost of the KKT checks of a step of `lasso.main`
+as they used to be computed, with a restricted problem built
+for the strong set and the full gradient recomputed, with
+the gradient computed only on the columns being checked,
+from the maintained linear predictor.
+
+The checks are timed at each solution of a path of a wide,
+sparse squared error lasso.
+
+Usage::
+
+    python bench_kkt_check.py [n] [p] [nstep]
+"""
+import sys
+import time
+
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+from regreg.atoms.mixed_lasso import check_KKT
+
+def rebuilt_check(path_lasso, strong, lagrange):
+    strong_problem = path_lasso.restricted_problem(strong, lagrange)[0]
+    strong_soln = path_lasso.solution[strong]
+    strong_grad = strong_problem.smooth_objective(strong_soln, mode='grad')
+    check_KKT(strong_problem.proximal_atom, strong_grad, strong_soln, lagrange)
+    grad = path_lasso.grad()
+    return check_KKT(path_lasso.penalty, grad, path_lasso.solution, lagrange)
+
+def incremental_check(path_lasso, strong, lagrange, grad):
+    path_lasso.grad(columns=strong, out=grad)
+    strong_penalty = path_lasso.strong_penalty(strong, lagrange)
+    check_KKT(strong_penalty, grad[strong], path_lasso.solution[strong], lagrange)
+    path_lasso.grad(columns=~strong, out=grad)
+    return check_KKT(path_lasso.penalty, grad, path_lasso.solution, lagrange)
+
+def main():
+    n, p, nstep = 500, 50000, 20
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        nstep = int(sys.argv[3])
+
+    np.random.seed(0)
+    X = scipy.sparse.rand(n, p, density=0.01, format='csc')
+    Y = np.random.standard_normal(n) + X[:,:10] * np.linspace(5, 1, 10)
+
+    path_lasso = rr.lasso.squared_error(X, Y, nstep=nstep)
+    output = path_lasso.main(inner_tol=1.e-8)
+    beta = output['beta'].tocsc()
+
+    grad = path_lasso.grad()
+    lagrange_cur = path_lasso.lagrange_sequence[0]
+    timings = {'rebuilt':[], 'incremental':[]}
+    print('n=%d, p=%d, nstep=%d' % (n, p, nstep))
+    for i, lagrange in enumerate(path_lasso.lagrange_sequence[1:]):
+        # after the first, the solutions are those of the normalized design
+        solution = np.asarray(beta[:,i+1].todense()).reshape(-1)
+        path_lasso.solution[:] = path_lasso.nonzero.linear_map(solution)
+        path_lasso.lagrange = lagrange
+        strong = path_lasso.strong_set(lagrange_cur, lagrange, grad=grad)[0]
+
+        toc = time.time()
+        rebuilt_check(path_lasso, strong, lagrange)
+        timings['rebuilt'].append(time.time() - toc)
+
+        toc = time.time()
+        incremental_check(path_lasso, strong, lagrange, grad)
+        timings['incremental'].append(time.time() - toc)
+
+        lagrange_cur = lagrange
+
+    for name in ['rebuilt', 'incremental']:
+        print('%s: %0.4f seconds per step' % (name, np.mean(timings[name])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Time the l1 ball and epigraph projections with their thresholds
+found by sorting, the previous method, and by Condat's expected
+linear time algorithm, for increasing p: `projl1`,
+`projl1_epigraph`, the weighted `projl1_weighted` and the bound
+form proximal maps of `l1norm` and of `group_lasso`, which
+uses the weighted solution for the norms of its groups.
+
+Usage::
+
+    python bench_l1_projection.py [p ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+import regreg.api as rr
+from regreg.atoms import piecewise_linear
+from regreg.atoms.projl1_cython import projl1, projl1_epigraph, projl1_weighted
+
+def timing(f, x, repeat=5):
+    toc = time.time()
+    for _ in range(repeat):
+        f(x)
+    return (time.time() - toc) / repeat
+
+def main():
+    sizes = [10**4, 10**5, 10**6]
+    if len(sys.argv) > 1:
+        sizes = [int(p) for p in sys.argv[1:]]
+
+    np.random.seed(0)
+    for p in sizes:
+        x = np.random.standard_normal(p) * 2
+        center = np.hstack([np.fabs(x).sum() * 0.1, x])
+        weights = np.random.uniform(0.5, 2, p)
+        bound = np.fabs(x).sum() * 0.1
+        groups = np.arange(p) // 5
+        group_penalty = rr.group_lasso(groups, bound=bound)
+        l1_penalty = rr.l1norm(p, bound=bound)
+
+        projections = [('projl1', lambda v: projl1(v, bound), x),
+                       ('projl1_epigraph', projl1_epigraph, center),
+                       ('projl1_weighted', lambda v: projl1_weighted(v, bound, weights), x),
+                       ('l1norm.bound_prox', l1_penalty.bound_prox, x),
+                       ('group_lasso.bound_prox', group_penalty.bound_prox, x)]
+
+        print('p=%d' % p)
+        old_method = piecewise_linear.method
+        for name, project, arg in projections:
+            results = {}
+            for method in ['sort', 'condat']:
+                piecewise_linear.set_method(method)
+                results[method] = timing(project, arg)
+            print('  %s: sort %0.4f, condat %0.4f seconds (x%0.2f)' %
+                  (name, results['sort'], results['condat'],
+                   results['sort'] / results['condat']))
+        piecewise_linear.set_method(old_method)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare the construction of the adjacency array and the difference
+matrix D of a mask with `regreg.mask.prepare_adj` and `create_D`,
+which compare shifted copies of the mask for each neighbor offset,
+to the loops over the voxels they used to be computed with.
+
+The default mask is a brain sized ellipsoid in a 91x109x91 volume.
+
+Usage::
+
+    python bench_mask.py [radius] [skip_loops]
+"""
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+from regreg.mask import prepare_adj, create_D, graph_D
+
+def loop_prepare_adj(mask, numx=1, numy=1, numz=1):
+    """
+    The previous implementation of `prepare_adj`.
+    """
+    nx, ny, nz = mask.shape
+    vmap = -np.ones(mask.shape, np.int)
+    vmap[mask] = np.arange(mask.sum())
+    adj = []
+    for i in range(nx):
+        for j in range(ny):
+            for k in range(nz):
+                if mask[i,j,k]:
+                    local_map = vmap[max((i-numx),0):(i+numx+1),
+                                     max((j-numy),0):(j+numy+1),
+                                     max((k-numz),0):(k+numz+1)]
+                    nbrs = np.array(local_map[local_map > -1])
+                    nbrs[nbrs == vmap[i,j,k]] = -1
+                    adj.append(nbrs)
+    num_ind = np.max([len(a) for a in adj])
+    adjarray = -np.ones((len(adj),num_ind),dtype=np.int)
+    for i in range(len(adj)):
+        for j in range(len(adj[i])):
+            adjarray[i,j] = adj[i][j]
+    return adjarray
+
+def loop_create_D(adj):
+    p, d = adj.shape
+    D = sparse.lil_matrix((np.sum(adj > -1) // 2, p))
+    count = 0
+    for i in range(p):
+        for j in range(d):
+            nbr = adj[i,j]
+            if nbr > i:
+                D[count,i] = 1
+                D[count,nbr] = -1
+                count += 1
+    return D.tocsr()
+
+def ellipsoid_mask(shape=(91,109,91)):
+    grid = np.indices(shape).astype(np.float)
+    center = (np.array(shape) - 1) / 2.
+    radii = 0.45 * np.array(shape)
+    r2 = sum([((g - c) / r)**2 for g, c, r in zip(grid, center, radii)])
+    return r2 <= 1
+
+def main():
+    radius = 1
+    if len(sys.argv) > 1:
+        radius = int(sys.argv[1])
+    skip_loops = len(sys.argv) > 2 and sys.argv[2] == 'skip_loops'
+
+    mask = ellipsoid_mask()
+    print('%d voxels, radius %d' % (mask.sum(), radius))
+
+    toc = time.time()
+    adj = prepare_adj(mask, radius, radius, radius)
+    print('prepare_adj: %0.2f seconds' % (time.time() - toc))
+    toc = time.time()
+    D = create_D(adj)
+    print('create_D: %0.2f seconds, %d edges' % (time.time() - toc, D.shape[0]))
+    toc = time.time()
+    graph_D(mask, (radius,)*3)
+    print('graph_D: %0.2f seconds' % (time.time() - toc))
+
+    if not skip_loops:
+        toc = time.time()
+        loop_adj = loop_prepare_adj(mask, radius, radius, radius)
+        print('loops, adjacency: %0.2f seconds' % (time.time() - toc))
+        toc = time.time()
+        loop_D = loop_create_D(loop_adj)
+        print('loops, D: %0.2f seconds' % (time.time() - toc))
+        print('D agrees: %s' % (abs(loop_D - D).sum() == 0))
+
+if __name__ == '__main__':
+    main()
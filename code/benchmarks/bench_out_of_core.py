@@ -0,0 +1,79 @@
+"""
+Throughput of the products of a `block_design` stored in a 
+memory mapped .npy file, in MB of the design read per second,
+compared with the same products with the design in memory, and
+the time of a lasso path on the first path_n rows of both designs.
+
+Usage::
+
+    python bench_out_of_core.py [n] [p] [block_rows] [path_n]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+import regreg.api as rr
+
+def throughput(transform, nbytes, v, u, repeat=3):
+    rates = []
+    for product, arg in [(transform.linear_map, v), (transform.adjoint_map, u)]:
+        toc = time.time()
+        for _ in range(repeat):
+            product(arg)
+        rates.append(repeat * nbytes / 2.**20 / (time.time() - toc))
+    return rates
+
+def main():
+    n, p, block_rows, path_n = 200000, 500, None, 20000
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        block_rows = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        path_n = int(sys.argv[4])
+
+    np.random.seed(0)
+    X = np.random.standard_normal((n, p))
+    v = np.random.standard_normal(p)
+    u = np.random.standard_normal(n)
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'X.npy')
+        np.save(filename, X)
+        design = rr.block_design.from_array(filename, block_rows=block_rows)
+
+        print('n=%d, p=%d, %0.1f MB, %d blocks' % (n, p, X.nbytes / 2.**20, len(design.loaders)))
+        for name, transform in [('in memory', rr.linear_transform(X)),
+                                ('block_design', design),
+                                ('normalize(in memory)', rr.normalize(X)),
+                                ('normalize(block_design)', rr.normalize(design))]:
+            forward, adjoint = throughput(transform, X.nbytes, v, u)
+            print('%s: X v %0.1f MB/s, X^T u %0.1f MB/s' % (name, forward, adjoint))
+
+        toc = time.time()
+        design.column_moments()
+        print('column_moments: %0.1f MB/s' % (X.nbytes / 2.**20 / (time.time() - toc)))
+
+        path_n = min(n, path_n)
+        Y = np.dot(X[:path_n,:10], np.linspace(1, 2, 10)) + u[:path_n]
+        filename = os.path.join(tempdir, 'X_path.npy')
+        np.save(filename, X[:path_n])
+        solutions = []
+        for name, path_design in [('in memory', X[:path_n]),
+                                  ('block_design', rr.block_design.from_array(filename,
+                                                                              block_rows=block_rows))]:
+            toc = time.time()
+            solutions.append(rr.lasso.squared_error(path_design, Y, nstep=20).main()['beta'].toarray())
+            print('lasso path, n=%d, %s: %0.2f seconds' % (path_n, name, time.time() - toc))
+        print('max difference of the solutions: %0.2e' % np.fabs(solutions[0] - solutions[1]).max())
+    finally:
+        shutil.rmtree(tempdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare building a solution path by stacking sparse rows, as
+`lasso.main` used to, with appending to a `path_store`.
+
+Usage::
+
+    python bench_path_store.py [p] [nstep] [nonzeros]
+"""
+import sys
+import time
+
+import numpy as np
+import scipy.sparse
+
+from regreg.paths import path_store
+
+def solutions(p, nstep, nonzeros):
+    # paths grow: the k-th solution has about k * nonzeros / nstep nonzeros
+    rng = np.random.RandomState(0)
+    for k in range(nstep):
+        solution = np.zeros(p)
+        active = rng.permutation(p)[:max(1, (k + 1) * nonzeros // nstep)]
+        solution[active] = rng.standard_normal(active.shape[0])
+        yield solution
+
+def vstack_path(p, nstep, nonzeros):
+    path = None
+    for solution in solutions(p, nstep, nonzeros):
+        if path is None:
+            path = scipy.sparse.csr_matrix(solution)
+        else:
+            path = scipy.sparse.vstack([path, solution])
+    return path.T
+
+def store_path(p, nstep, nonzeros, max_memory=np.inf):
+    store = path_store(p, max_memory=max_memory)
+    for solution in solutions(p, nstep, nonzeros):
+        store.append(solution)
+    return store.finalize()
+
+def main():
+    p, nstep, nonzeros = 20000, 500, 2000
+    if len(sys.argv) > 1:
+        p = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nstep = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        nonzeros = int(sys.argv[3])
+
+    toc = time.time()
+    list(solutions(p, nstep, nonzeros))
+    generate = time.time() - toc
+
+    print('p=%d, nstep=%d, final nonzeros=%d' % (p, nstep, nonzeros))
+    results = []
+    for name, build in [('vstack', vstack_path),
+                        ('path_store', store_path),
+                        ('path_store (memory mapped)',
+                         lambda *args: store_path(*args, max_memory=0))]:
+        toc = time.time()
+        path = build(p, nstep, nonzeros)
+        elapsed = time.time() - toc - generate
+        results.append(path)
+        print('%s: %0.3f seconds' % (name, elapsed))
+    for path in results[1:]:
+        assert abs(path - results[0]).max() == 0
+
+if __name__ == '__main__':
+    main()
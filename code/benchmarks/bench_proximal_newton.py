@@ -0,0 +1,66 @@
+"""
+Compare FISTA with proximal Newton on l1 penalized logistic and
+Poisson regression problems like those in tests/test_logistic.py,
+scaled up to n=100000.
+
+Reports wall time, iterations and the objective value reached by
+each solver.
+
+Usage::
+
+    python bench_proximal_newton.py [n] [p]
+"""
+import sys
+import time
+
+import numpy as np
+
+import regreg.api as rr
+
+def make_problems(n, p):
+    np.random.seed(0)
+    X = np.random.standard_normal((n, p))
+    beta = np.zeros(p)
+    beta[:5] = 0.5
+    eta = np.dot(X, beta)
+    successes = np.random.binomial(1, np.exp(eta) / (1 + np.exp(eta)))
+    counts = np.random.poisson(np.exp(eta))
+    return [('logistic', rr.logistic_loss(X, successes), 0.01),
+            ('poisson', rr.affine_smooth(rr.poisson_deviance(n, counts, coef=1./n), X), 0.05)]
+
+def main():
+    n, p = 100000, 100
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+
+    print('n=%d, p=%d' % (n, p))
+    for name, loss, lagrange in make_problems(n, p):
+        penalty = rr.l1norm(p, lagrange=lagrange)
+
+        problem = rr.simple_problem(loss, penalty)
+        fista = rr.FISTA(problem)
+        toc = time.time()
+        hist = fista.fit(tol=1.e-10, max_its=5000)
+        fista_time = time.time() - toc
+        fista_obj = problem.objective(problem.coefs)
+        fista_coefs = problem.coefs.copy()
+
+        problem = rr.simple_problem(loss, penalty)
+        newton = rr.proximal_newton(problem)
+        toc = time.time()
+        newton.fit(tol=1.e-10)
+        newton_time = time.time() - toc
+        newton_obj = problem.objective(problem.coefs)
+
+        print('%s (%d nonzero)' % (name, (fista_coefs != 0).sum()))
+        print('    FISTA:            %0.3fs, %d iterations, objective %0.10f' %
+              (fista_time, len(hist) - 1, fista_obj))
+        print('    proximal Newton:  %0.3fs, %d iterations, objective %0.10f' %
+              (newton_time, newton.iterations, newton_obj))
+        print('    max coefficient difference: %0.2e' %
+              np.fabs(fista_coefs - problem.coefs).max())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Time the proximal maps of `sorted_l1norm`, in Lagrange and bound form,
+against that of `l1norm` for increasing p. The weights are the
+Benjamini-Hochberg sequence of SLOPE.
+
+Usage::
+
+    python bench_sorted_l1.py [p ...]
+"""
+import sys
+import time
+
+import numpy as np
+from scipy.stats import norm as normal
+
+import regreg.api as rr
+
+def timing(f, x, repeat=3):
+    toc = time.time()
+    for _ in range(repeat):
+        f(x)
+    return (time.time() - toc) / repeat
+
+def main():
+    sizes = [10**4, 10**5, 10**6]
+    if len(sys.argv) > 1:
+        sizes = [int(p) for p in sys.argv[1:]]
+
+    np.random.seed(0)
+    for p in sizes:
+        x = np.random.standard_normal(p) * 2
+        weights = normal.ppf(1 - 0.1 * np.arange(1, p+1) / (2. * p))
+        sorted_penalty = rr.sorted_l1norm(p, weights=weights, lagrange=0.5)
+        l1_penalty = rr.l1norm(p, lagrange=0.5)
+        bound = sorted_penalty.seminorm(x, lagrange=0.1)
+
+        print('p=%d: sorted_l1norm %0.4f, l1norm %0.4f, sorted_l1norm bound form %0.4f seconds' % 
+              (p, timing(sorted_penalty.lagrange_prox, x),
+               timing(l1_penalty.lagrange_prox, x),
+               timing(lambda v: sorted_penalty.bound_prox(v, bound=bound), x, repeat=1)))
+
+if __name__ == '__main__':
+    main()
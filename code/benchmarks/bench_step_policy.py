@@ -0,0 +1,56 @@
+"""
+Compare the step size policies of FISTA.fit on an ill-conditioned
+lasso and on a logistic lasso whose Lipschitz constant is much 
+smaller than the starting inverse step size.
+
+Reports iterations, rejected trial steps (each costs a proximal
+map and a smooth objective evaluation), gradient based restarts,
+wall time and the objective gap to a tightly converged solution.
+
+Usage::
+
+    python bench_step_policy.py [n] [p]
+"""
+import sys
+import time
+
+import numpy as np
+
+import regreg.api as rr
+
+def make_problems(n, p):
+    np.random.seed(0)
+    X = np.random.standard_normal((n, p)) * np.exp(np.linspace(0, -4, p))
+    X = np.dot(X, np.linalg.qr(np.random.standard_normal((p, p)))[0])
+    Y = np.random.standard_normal(n)
+    successes = np.random.binomial(1, 0.5, size=(n,))
+    return [('ill-conditioned lasso', rr.squared_error(X, Y), 1.),
+            ('scaled logistic lasso', rr.logistic_loss(0.05 * X, successes), 0.0005)]
+
+def main():
+    n, p = 500, 200
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+
+    print('n=%d, p=%d' % (n, p))
+    for name, loss, lagrange in make_problems(n, p):
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=lagrange))
+        solution = problem.solve(tol=1.e-14, max_its=100000).copy()
+        best = problem.objective(solution)
+
+        print(name)
+        for policy in ['backtracking', 'bb', 'sgb', 'restart']:
+            problem.coefs[:] = 0
+            solver = rr.FISTA(problem)
+            toc = time.time()
+            hist = solver.fit(tol=1.e-10, max_its=20000, step_policy=policy)
+            elapsed = time.time() - toc
+            print('    %-12s %5d iterations %6d rejected %3d restarts %0.3fs  gap %0.2e' %
+                  (policy, len(hist), solver.rejected_trials, 
+                   solver.gradient_restarts, elapsed,
+                   problem.objective(problem.coefs) - best))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Time the products of a `linear_transform` with a `threaded_matvec`
+backend for 1 up to the number of cores threads, for
+dense designs in row and column major order and
+sparse designs in CSR and CSC format.
+
+Usage::
+
+    python bench_threaded_matvec.py [n] [p] [density]
+"""
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+
+def timing(transform, v, u, repeat=5):
+    toc = time.time()
+    for _ in range(repeat):
+        transform.linear_map(v)
+    forward = (time.time() - toc) / repeat
+    toc = time.time()
+    for _ in range(repeat):
+        transform.adjoint_map(u)
+    adjoint = (time.time() - toc) / repeat
+    return forward, adjoint
+
+def main():
+    n, p, density = 20000, 2000, 0.01
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        p = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        density = float(sys.argv[3])
+
+    np.random.seed(0)
+    X = np.random.standard_normal((n, p))
+    S = scipy.sparse.rand(n, p, density=density, format='csr')
+    designs = [('dense, row major', X),
+               ('dense, column major', np.asfortranarray(X)),
+               ('csr, density %0.3f' % density, S),
+               ('csc, density %0.3f' % density, S.tocsc())]
+    v = np.random.standard_normal(p)
+    u = np.random.standard_normal(n)
+
+    max_threads = multiprocessing.cpu_count()
+    threads = sorted(set([1, 2, 4, 8, 16, 32, max_threads]))
+    threads = [t for t in threads if t <= max_threads]
+
+    print('n=%d, p=%d, %d cores' % (n, p, max_threads))
+    for name, M in designs:
+        baseline = timing(rr.linear_transform(M), v, u)
+        print('%s: X v %0.4f, X^T u %0.4f seconds without backend' % ((name,) + baseline))
+        for n_threads in threads:
+            backend = rr.threaded_matvec(n_threads=n_threads)
+            forward, adjoint = timing(rr.linear_transform(M, backend=backend), v, u)
+            print('  %2d threads: X v %0.4f (x%0.2f), X^T u %0.4f (x%0.2f)' %
+                  (n_threads, forward, baseline[0] / forward, adjoint, baseline[1] / adjoint))
+            backend.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare fused lasso signal approximation with the direct proximal
+map of `tv1d`, in a `simple_problem`, to the container route, an
+`l1norm` of the differences solved through its dual with FISTA.
+
+The signal is piecewise constant with noise. The container route
+is much slower, it is run on the first container_n points of the 
+signal, stopped after max_its iterations, and its distance to the
+direct solution is reported.
+
+Usage::
+
+    python bench_tv1d.py [n] [max_its] [container_n]
+"""
+import sys
+import time
+
+import numpy as np
+
+import regreg.api as rr
+from regreg.affine.fused_lasso import difference_transform
+
+def main():
+    n, max_its, container_n = 10**6, 200, 2000
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        max_its = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        container_n = int(sys.argv[3])
+
+    np.random.seed(0)
+    jumps = np.random.standard_normal(50) * 3
+    Y = np.repeat(jumps, n // 50 + 1)[:n] + np.random.standard_normal(n)
+    lagrange = 5.
+    # signal_approximator(-Y) is 0.5 * ||beta - Y||^2_2
+    loss = rr.signal_approximator(-Y)
+
+    print('n=%d, lagrange=%0.1f' % (n, lagrange))
+
+    penalty = rr.tv1d(n, lagrange=lagrange)
+    toc = time.time()
+    direct = penalty.lagrange_prox(Y)
+    print('tv1d.lagrange_prox: %0.4f seconds' % (time.time() - toc))
+
+    toc = time.time()
+    problem = rr.simple_problem(loss, penalty)
+    soln = problem.solve(tol=1.e-10)
+    print('simple_problem with tv1d: %0.4f seconds, %d iterations' % 
+          (time.time() - toc, len(problem.solver_results)))
+    print('  relative distance to direct: %0.2e' % 
+          (np.linalg.norm(soln - direct) / np.linalg.norm(direct)))
+
+    m = min(n, container_n)
+    direct = rr.tv1d(m, lagrange=lagrange).lagrange_prox(Y[:m])
+    D = difference_transform(np.arange(m), transform=True)
+    fused = rr.l1norm.linear(D, lagrange=lagrange)
+    toc = time.time()
+    container = rr.container(rr.signal_approximator(-Y[:m]), fused)
+    soln = container.solve(tol=1.e-10, max_its=max_its)
+    print('container with l1norm of differences, n=%d: %0.4f seconds, at most %d iterations' % 
+          (m, time.time() - toc, max_its))
+    print('  relative distance to direct: %0.2e' % 
+          (np.linalg.norm(soln - direct) / np.linalg.norm(direct)))
+
+if __name__ == '__main__':
+    main()
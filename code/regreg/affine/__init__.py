@@ -1,8 +1,12 @@
 from operator import add, mul
+import weakref
 import numpy as np
 from scipy import sparse
 import warnings
 
+from ..instrumentation import instrumented
+from .out_of_core import block_design
+
 def broadcast_first(a, b, op):
     """ apply binary operation `op`, broadcast `a` over axis 1 if necessary
 
@@ -35,8 +39,12 @@ class AffineError(Exception):
 
 
 class affine_transform(object):
+
+    # an optional backend for the matrix products, e.g. a `threaded_matvec`
+    backend = None
     
-    def __init__(self, linear_operator, affine_offset, diag=False, input_shape=None):
+    def __init__(self, linear_operator, affine_offset, diag=False, input_shape=None,
+                 backend=None):
         """ Create affine transform
 
         Parameters
@@ -52,6 +60,9 @@ class affine_transform(object):
             If True, interpret 1D `linear_operator` as the main diagonal of the
             a diagonal array, so that ``linear_operator =
             np.diag(linear_operator)``
+        backend : None or `threaded_matvec`
+            If not None, computes the products with a `linear_operator`
+            that is an array or a sparse matrix.
         """
         # noneD - linear_operator is None
         # sparseD - linear_operator is sparse
@@ -67,6 +78,7 @@ class affine_transform(object):
         else:
             self.affine_offset = affine_offset
         self.linear_operator = linear_operator
+        self.backend = backend
 
         if linear_operator is None:
             self.noneD = True
@@ -120,6 +132,7 @@ class affine_transform(object):
                 self.diagD = False
                 self.affineD = False
 
+    @instrumented('linear_map')
     def linear_map(self, x, copy=True):
         r"""Apply linear part of transform to `x`
 
@@ -152,11 +165,13 @@ class affine_transform(object):
             return x
         elif self.affineD:
             return self.linear_operator.linear_map(x)
-        elif self.sparseD:
-            return self.linear_operator * x
         elif self.diagD:
             # Deal with 1D or 2D input or linear operator
             return broadcast_first(self.linear_operator, x, mul)
+        elif self.backend is not None:
+            return self.backend.dot(self.linear_operator, x)
+        elif self.sparseD:
+            return self.linear_operator * x
         return np.dot(self.linear_operator, x)
 
     def affine_map(self, x, copy=True):
@@ -217,6 +232,7 @@ class affine_transform(object):
             return broadcast_first(self.affine_offset, v, add)
         return v
 
+    @instrumented('adjoint_map')
     def adjoint_map(self, u, copy=True):
         r"""Apply transpose of linear component to `u`
 
@@ -248,6 +264,8 @@ class affine_transform(object):
             if copy:
                 return u.copy()
             return u
+        if self.backend is not None and not (self.diagD or self.affineD):
+            return self.backend.adjoint_dot(self.linear_operator, u)
         if self.sparseD_csr:
             return self.linear_operator_T * u
         if self.sparseD:
@@ -263,10 +281,11 @@ class affine_transform(object):
 class linear_transform(affine_transform):
     """ A linear transform is an affine transform with no affine offset
     """
-    def __init__(self, linear_operator, diag=False, input_shape=None):
+    def __init__(self, linear_operator, diag=False, input_shape=None, backend=None):
         if linear_operator is None:
             raise AffineError('linear_operator cannot be None')
-        affine_transform.__init__(self, linear_operator, None, diag=diag, input_shape=input_shape)
+        affine_transform.__init__(self, linear_operator, None, diag=diag, input_shape=input_shape,
+                                  backend=backend)
 
 
 class selector(linear_transform):
@@ -325,6 +344,8 @@ class selector(linear_transform):
         if not hasattr(self, "_output"):
             self._output = np.zeros(self.initial_shape)
         self._output[self.index_obj] = self.affine_transform.adjoint_map(u)
+        if copy:
+            return self._output.copy()
         return self._output
 
 class reshape(linear_transform):
@@ -375,8 +396,11 @@ class normalize(object):
     Columns are normalized to have std equal to value.
     '''
 
+    # an optional backend for the matrix products, e.g. a `threaded_matvec`
+    backend = None
+
     def __init__(self, M, center=True, scale=True, value=1, inplace=False,
-                 intercept_column=None):
+                 intercept_column=None, backend=None):
         '''
         Parameters
         ----------
@@ -402,6 +426,9 @@ class normalize(object):
             Which column is the intercept if any? This column is
             not centered or scaled.
 
+        backend : None or `threaded_matvec`
+            If not None, computes the products with M.
+
         '''
         n, p = M.shape
         self.value = value
@@ -409,8 +436,11 @@ class normalize(object):
         self.input_shape = (p,)
 
         self.sparseM = sparse.isspmatrix(M)
+        # a block_design is read from disk a block at a time
+        self.blockM = isinstance(M, block_design)
         self.intercept_column = intercept_column
         self.M = M
+        self.backend = backend
 
         self.center = center
         self.scale = scale
@@ -423,7 +453,22 @@ class normalize(object):
         # we divide by n instead of n-1 in the scalings
         # so that np.std is constant
         
-        if self.center:
+        if self.blockM:
+            if self.inplace:
+                raise ValueError('a block_design can not be normalized inplace')
+            # the statistics are computed in one pass over the blocks
+            if self.center or self.scale:
+                col_sums, sumsq = M.column_moments()
+            if self.center:
+                col_means = col_sums / n
+                if self.intercept_column is not None:
+                    col_means[self.intercept_column] = 0
+                sumsq = sumsq - n * col_means**2
+            if self.scale:
+                self.col_stds = np.sqrt(sumsq / n) / np.sqrt(self.value)
+                if self.intercept_column is not None:
+                    self.col_stds[self.intercept_column] = 1. / np.sqrt(self.value)
+        elif self.center:
             if self.inplace and self.sparseM:
                 raise ValueError('resulting matrix will not be sparse if centering performed inplace')
 
@@ -459,7 +504,7 @@ class normalize(object):
             else:
                 tmp = M.copy()
                 tmp.data **= 2
-                self.col_stds = np.sqrt((tmp.sum(0)) / n) / np.sqrt(self.value)
+                self.col_stds = np.sqrt(np.asarray(tmp.sum(0)).reshape(-1) / n) / np.sqrt(self.value)
             if self.intercept_column is not None:
                 self.col_stds[self.intercept_column] = 1. / np.sqrt(self.value)
             if self.inplace:
@@ -470,6 +515,7 @@ class normalize(object):
                 self.scale = False
         self.affine_offset = None
         
+    @instrumented('linear_map')
     def linear_map(self, x):
         shift = None
         if self.intercept_column is not None:
@@ -484,10 +530,7 @@ class normalize(object):
                 x = x / self.col_stds[:,np.newaxis]
             else:
                 raise ValueError('normalize only implemented for 1D and 2D inputs')
-        if self.sparseM:
-            v = self.M * x
-        else:
-            v = np.dot(self.M, x)
+        v = self._product(x)
         if self.center:
             if x.ndim == 1:
                 v -= v.mean()
@@ -515,6 +558,7 @@ class normalize(object):
     def offset_map(self, x):
         return x
 
+    @instrumented('adjoint_map')
     def adjoint_map(self, u):
         v = np.empty(self.input_shape)
         if self.center:
@@ -526,17 +570,34 @@ class normalize(object):
                 u = u - u_mean[np.newaxis,:]
             else:
                 raise ValueError('normalize only implemented for 1D and 2D inputs')
-        if self.sparseM:
-            v = (u.T * self.M).T
-        else:
-            v = np.dot(u.T, self.M).T
+        v = self._adjoint_product(u)
         if self.scale:
             v /= self.col_stds
         if self.intercept_column is not None:
             v[self.intercept_column] = u_mean * u.shape[0]
         return v
 
-    def slice_columns(self, index_obj):
+    def _product(self, x):
+        # the product with the unnormalized matrix
+        if self.blockM:
+            return self.M.linear_map(x)
+        if self.backend is not None:
+            return self.backend.dot(self.M, x)
+        if self.sparseM:
+            return self.M * x
+        return np.dot(self.M, x)
+
+    def _adjoint_product(self, u):
+        # the product with the adjoint of the unnormalized matrix
+        if self.blockM:
+            return self.M.adjoint_map(u)
+        if self.backend is not None:
+            return self.backend.adjoint_dot(self.M, u)
+        if self.sparseM:
+            return (u.T * self.M).T
+        return np.dot(u.T, self.M).T
+
+    def slice_columns(self, index_obj, view=False):
         """
 
         Parameters
@@ -547,6 +608,10 @@ class normalize(object):
             Must be a slice object or list so scipy.sparse matrices
             can be sliced.
 
+        view : bool
+            If True, return a `normalize_columns` whose products 
+            are computed with the columns of self.M without copying them.
+
         Returns
         -------
         
@@ -580,6 +645,9 @@ class normalize(object):
 
         
         """
+        if view:
+            return normalize_columns(self, index_obj)
+
         if type(index_obj) not in [type(slice(0,4)), type([])]:
             # try to find nonzero indices if a boolean array
             if index_obj.dtype == np.bool:
@@ -587,6 +655,7 @@ class normalize(object):
         
         new_obj = normalize.__new__(normalize)
         new_obj.sparseM = self.sparseM
+        new_obj.blockM = self.blockM
 
         # explicitly assumes there is no intercept column
         new_obj.intercept_column = None
@@ -600,6 +669,9 @@ class normalize(object):
         new_obj.output_shape = (self.M.shape[0],)
         new_obj.scale = self.scale
         new_obj.center = self.center
+        new_obj.backend = self.backend
+        # for lipschitz_bound
+        new_obj._parent_ref = weakref.ref(self)
         if self.scale:
             new_obj.col_stds = self.col_stds[index_obj]
         new_obj.affine_offset = self.affine_offset
@@ -611,6 +683,168 @@ class normalize(object):
         else:
             raise ValueError('only possible to extract matrix if normalization was done inplace')
 
+class normalize_columns(normalize):
+
+    """
+    The columns index_obj of a `normalize`, as returned by its 
+    `slice_columns`, without a copy of the columns.
+
+    The products are computed against the matrix of the
+    parent: for a dense matrix, in blocks of columns taken with
+    `np.take` of at most block_bytes bytes, for a sparse matrix
+    from the entries of the columns, whose positions in
+    its data in csc format are stored. Other sparse formats are
+    converted to csc once, the conversion is shared by all views
+    of the parent. A `block_design` is sliced, its columns are
+    only read from disk when used. 2D arrays are multiplied
+    as matrices.
+
+    The columns are copied on demand, the first time
+    the attribute M is used, or after materialize_after products if it
+    is not None. The products then use the copy.
+    """
+
+    block_bytes = 2**22
+    materialize_after = None
+
+    def __init__(self, parent, index_obj):
+        if isinstance(index_obj, slice):
+            index = np.arange(parent.input_shape[0])[index_obj]
+        else:
+            index = np.asarray(index_obj)
+            if index.dtype == np.bool:
+                index = np.nonzero(index)[0]
+        self.parent = parent
+        self.index = index
+        self.index_obj = index_obj
+
+        self.sparseM = parent.sparseM
+        self.blockM = parent.blockM
+        # explicitly assumes there is no intercept column
+        self.intercept_column = None
+        self.value = parent.value
+        self.input_shape = (index.shape[0],)
+        self.output_shape = parent.output_shape
+        self.scale = parent.scale
+        self.center = parent.center
+        if self.scale:
+            self.col_stds = parent.col_stds[index]
+        self.affine_offset = parent.affine_offset
+        self.backend = parent.backend
+        self.products = 0
+        self._M = None
+
+    @property
+    def M(self):
+        """
+        The columns of the parent's matrix, copied when first used.
+        """
+        if self._M is None:
+            self._M = self.parent.slice_columns(self.index_obj).M
+        return self._M
+
+    @property
+    def materialized(self):
+        return self._M is not None
+
+    def materialize(self):
+        """
+        A `normalize` with a copy of the columns.
+        """
+        new_obj = self.parent.slice_columns(self.index_obj)
+        new_obj.intercept_column = self.intercept_column
+        return new_obj
+
+    def _use(self):
+        self.products += 1
+        if self.materialize_after is not None and self.products > self.materialize_after:
+            self.M
+        return self.materialized
+
+    @property
+    def _csc(self):
+        # the parent's sparse matrix in csc format, converted once
+        # and shared by all views of the parent
+        M = self.parent.M
+        if sparse.isspmatrix_csc(M):
+            return M
+        cached = getattr(self.parent, '_csc_M', None)
+        if cached is None or cached[0] is not M:
+            self.parent._csc_M = cached = (M, M.tocsc())
+        return cached[1]
+
+    @property
+    def _positions(self):
+        # positions in the data of the csc matrix of the
+        # entries of the columns and the number in each column
+        if not hasattr(self, '_csc_positions'):
+            indptr = self._csc.indptr
+            starts, counts = indptr[self.index], np.diff(indptr)[self.index]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            self._csc_positions = np.repeat(starts, counts) + offsets, counts
+        return self._csc_positions
+
+    def _sparse_columns(self):
+        # the columns as a csc_matrix over the data of the csc matrix,
+        # for products with 2D arrays
+        M = self._csc
+        positions, counts = self._positions
+        indptr = np.hstack([0, np.cumsum(counts)])
+        return sparse.csc_matrix((M.data[positions], M.indices[positions], indptr),
+                                 shape=(M.shape[0], counts.shape[0]))
+
+    def _column_blocks(self):
+        M = self.parent.M
+        if isinstance(self.index_obj, slice):
+            yield slice(None), M[:,self.index_obj]
+            return
+        size = max(1, self.block_bytes // max(M.shape[0] * M.itemsize, 1))
+        for start in range(0, self.index.shape[0], size):
+            block = slice(start, start + size)
+            yield block, np.take(M, self.index[block], axis=1)
+
+    def _product(self, x):
+        if self._use() or self.blockM:
+            return normalize._product(self, x)
+        if self.sparseM:
+            if x.ndim == 2:
+                return self._sparse_columns() * x
+            M = self._csc
+            positions, counts = self._positions
+            weights = M.data[positions] * np.repeat(x, counts)
+            return np.bincount(M.indices[positions], weights=weights, 
+                               minlength=M.shape[0])
+        v = np.zeros(self.output_shape + x.shape[1:])
+        for block, columns in self._column_blocks():
+            v += np.dot(columns, x[block])
+        return v
+
+    def _adjoint_product(self, u):
+        if self._use() or self.blockM:
+            return normalize._adjoint_product(self, u)
+        if self.sparseM:
+            if u.ndim == 2:
+                return self._sparse_columns().T * u
+            M = self._csc
+            positions, counts = self._positions
+            products = M.data[positions] * u[M.indices[positions]]
+            return np.bincount(np.repeat(np.arange(counts.shape[0]), counts),
+                               weights=products, minlength=counts.shape[0])
+        v = np.empty(self.input_shape + u.shape[1:])
+        for block, columns in self._column_blocks():
+            v[block] = np.dot(columns.T, u)
+        return v
+
+    def slice_columns(self, index_obj, view=False):
+        """
+        The columns index_obj of this view, as
+        `normalize.slice_columns`.
+        """
+        if type(index_obj) not in [type(slice(0,4)), type([])]:
+            if index_obj.dtype == np.bool:
+                index_obj = np.nonzero(index_obj)[0]
+        return self.parent.slice_columns(self.index[index_obj], view=view)
+
 class identity(object):
 
     def __init__(self, input_shape):
@@ -775,27 +1009,134 @@ class hstack(object):
             result[g] = t.adjoint_map(u).reshape(-1)
         return result
 
-def power_L(transform, max_its=500,tol=1e-8, debug=False):
+# estimates of power_L, keyed by id of the transform:
+# a weak reference to the transform, its lipschitz_version,
+# the estimate and the top right singular vector
+_lipschitz_cache = {}
+
+def lipschitz_version(transform):
+    """
+    The version stamp of the cached `power_L` estimate of transform. 
+    Increase the attribute ``lipschitz_version`` of a transform whose
+    matrix is modified in place to discard its estimate.
+    """
+    return getattr(transform, 'lipschitz_version', 0)
+
+def cached_lipschitz(transform):
+    """
+    The cached `power_L` estimate and top right singular vector of 
+    transform, or None. The estimate may be from an earlier 
+    version of transform.
+    """
+    cached = _lipschitz_cache.get(id(transform), None)
+    if cached is not None and cached[0]() is transform:
+        return cached[1:]
+
+def clear_lipschitz_cache(transform=None):
+    """
+    Discard the cached `power_L` estimate of transform, or all of them.
+    """
+    if transform is None:
+        _lipschitz_cache.clear()
+    else:
+        _lipschitz_cache.pop(id(transform), None)
+
+def _cache_lipschitz(transform, norm, v):
+    # arrays and sparse matrices can not carry a version, 
+    # so their estimates would go stale if modified in place
+    if not isinstance(transform, (affine_transform, normalize)):
+        return
+    key = id(transform)
+    try:
+        ref = weakref.ref(transform, lambda ref: _lipschitz_cache.pop(key, None))
+    except TypeError: # can not be weakly referenced
+        return
+    _lipschitz_cache[key] = (ref, lipschitz_version(transform), norm, v)
+
+def lipschitz_bound(transform):
+    """
+    An upper bound of `power_L` of transform from a cached estimate,
+    without iterations: the estimate of transform or, if it is a 
+    column slice of a `normalize`, that of its parent, as the columns 
+    of a matrix have smaller norm than the matrix. Returns None
+    if neither is cached.
+    """
+    cached = cached_lipschitz(transform)
+    if cached is not None and cached[0] == lipschitz_version(transform):
+        return cached[1]
+    parent = getattr(transform, 'parent', None)
+    if parent is None and getattr(transform, '_parent_ref', None) is not None:
+        parent = transform._parent_ref()
+    if parent is not None:
+        return lipschitz_bound(parent)
+
+@instrumented('power_L')
+def power_L(transform, max_its=500, tol=1e-8, debug=False, cache=False,
+            krylov_dim=20):
     """
     Approximate the largest singular value (squared) of the linear part of
-    a transform using power iterations
+    a transform using Lanczos iterations for its
+    normal operator, restarted every krylov_dim iterations.
+
+    If cache is True and transform is an `affine_transform` or a
+    `normalize`, the estimate is cached, keyed by the identity of transform and its
+    `lipschitz_version`, and returned by later calls with cache=True
+    without iterations. If the version has changed, the iterations
+    start from the cached top singular vector. The version must be
+    increased whenever the matrix of transform is modified in place.
+    Arrays and sparse matrices are never cached.
     
     TODO: should this be the largest singular value instead (i.e. not squared?)
     """
 
+    cached = None
+    if cache:
+        cached = cached_lipschitz(transform)
+        if cached is not None and cached[0] == lipschitz_version(transform):
+            return cached[1]
+
+    key_transform = transform
     transform = astransform(transform)
-    v = np.random.standard_normal(transform.input_shape)
-    old_norm = 0.
-    norm = 1.
+    shape = transform.input_shape
+    if cached is not None and cached[2].shape == (np.prod(shape),):
+        v = cached[2].copy()
+    else:
+        v = np.random.standard_normal(shape).reshape(-1)
+    v /= np.linalg.norm(v)
+
+    def normal_map(x):
+        return transform.adjoint_map(transform.linear_map(x.reshape(shape))).reshape(-1)
+
+    norm = 0.
     itercount = 0
-    while np.fabs(norm-old_norm)/norm > tol and itercount < max_its:
-        v = transform.adjoint_map(transform.linear_map(v))
-        old_norm = norm
-        norm = np.linalg.norm(v)
-        v /= norm
-        if debug:
-            print "L", norm
-        itercount += 1
+    converged = False
+    while not converged and itercount < max_its:
+        # Lanczos iterations from v, with full reorthogonalization
+        basis, alphas, betas = [v], [], []
+        while True:
+            w = normal_map(basis[-1])
+            itercount += 1
+            alphas.append(np.dot(w, basis[-1]))
+            for u in basis:
+                w -= np.dot(w, u) * u
+            beta = np.linalg.norm(w)
+            tridiagonal = (np.diag(alphas) + np.diag(betas, 1) + np.diag(betas, -1))
+            evals, evecs = np.linalg.eigh(tridiagonal)
+            old_norm, norm = norm, evals[-1]
+            if debug:
+                print "L", norm
+            converged = (np.fabs(norm - old_norm) <= tol * np.fabs(norm) or 
+                         beta <= tol * np.fabs(norm))
+            if converged or itercount >= max_its or len(basis) >= krylov_dim:
+                break
+            betas.append(beta)
+            basis.append(w / beta)
+        # restart from the Ritz vector
+        v = np.dot(evecs[:,-1], basis)
+        v /= np.linalg.norm(v)
+
+    if cache:
+        _cache_lipschitz(key_transform, norm, v)
     return norm
 
 def astransform(X):
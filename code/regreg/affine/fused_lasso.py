@@ -22,8 +22,8 @@ def difference_transform(X, order=1, sorted=False,
         Is X sorted?
 
     transform: bool
-        If True, return a linear_transform rather
-        than a sparse matrix.
+        If True, return a matrix-free `divided_difference`
+        rather than a sparse matrix.
 
     Returns
     -------
@@ -32,21 +32,94 @@ def difference_transform(X, order=1, sorted=False,
         Matrix of divided differences of sorted X.
 
     """
-    if not sorted:
-        X = np.sort(X)
-    X = np.asarray(X)
-    n = X.shape[0]
-    Dfinal = np.identity(n)
-    for j in range(1, order+1):
-        D = (-np.identity(n-j+1)+np.diag(np.ones(n-j),k=1))[:-1]
-        steps = X[j:]-X[:-j]
-        inv_steps = np.zeros(steps.shape)
-        inv_steps[steps != 0] = 1. / steps[steps != 0]
-        D = np.dot(np.diag(inv_steps), D)
-        Dfinal = np.dot(D, Dfinal)
+    D = divided_difference(X, order=order, sorted=sorted)
     if not transform:
-        return sparse.csr_matrix(Dfinal)
-    return astransform(Dfinal)
+        return D.tosparse()
+    return D
+
+class divided_difference(affine_transform):
+
+    """
+    The divided differences of order `order` of values at the
+    points knots, without forming a matrix. The differences
+    of order j are the differences of those of order j-1 
+    divided by the steps ``knots[j:] - knots[:-j]``, or 0 
+    where the step is 0. 
+
+    Both `linear_map` and `adjoint_map` take O(n * order) operations 
+    for n knots. The input may be 2D, with one column per
+    sequence of values.
+
+    >>> D = divided_difference(np.array([0, 1, 3, 4.]), order=2)
+    >>> D.linear_map(np.array([0, 1, 9, 16.]))
+    array([ 1.,  1.])
+    >>> D.tosparse().toarray()
+    array([[ 0.33333333, -0.5       ,  0.16666667,  0.        ],
+           [ 0.        ,  0.16666667, -0.5       ,  0.33333333]])
+    """
+
+    def __init__(self, knots, order=1, sorted=False):
+        knots = np.asarray(knots, np.float)
+        if not sorted:
+            knots = np.sort(knots)
+        self.knots = knots
+        self.order = order
+        n = knots.shape[0]
+        if order >= n:
+            raise ValueError('order must be smaller than the number of knots')
+
+        self.inv_steps = []
+        for j in range(1, order+1):
+            steps = knots[j:] - knots[:-j]
+            inv_steps = np.zeros(steps.shape)
+            inv_steps[steps != 0] = 1. / steps[steps != 0]
+            self.inv_steps.append(inv_steps)
+
+        self.affine_offset = None
+        self.input_shape = (n,)
+        self.output_shape = (n - order,)
+
+    def linear_map(self, x, copy=False):
+        x = np.asarray(x)
+        for inv_steps in self.inv_steps:
+            if x.ndim == 2:
+                x = np.diff(x, axis=0) * inv_steps[:,np.newaxis]
+            else:
+                x = np.diff(x) * inv_steps
+        return x
+
+    def affine_map(self, x, copy=False):
+        return self.linear_map(x)
+
+    def offset_map(self, x, copy=False):
+        return x
+
+    def adjoint_map(self, u, copy=False):
+        u = np.asarray(u)
+        for inv_steps in self.inv_steps[::-1]:
+            if u.ndim == 2:
+                u = u * inv_steps[:,np.newaxis]
+            else:
+                u = u * inv_steps
+            # the adjoint of np.diff
+            v = np.zeros((u.shape[0] + 1,) + u.shape[1:])
+            v[:-1] -= u
+            v[1:] += u
+            u = v
+        return u
+
+    def tosparse(self):
+        """
+        The banded matrix of the transform, with order+1 diagonals,
+        as a `scipy.sparse.csr_matrix`.
+        """
+        n = self.input_shape[0]
+        D = sparse.identity(n, format='csr')
+        for j, inv_steps in enumerate(self.inv_steps):
+            m = n - j - 1
+            Dj = sparse.diags([-inv_steps, inv_steps], [0, 1], shape=(m, m + 1))
+            D = Dj * D
+        return sparse.csr_matrix(D)
 
 class trend_filter(affine_transform):
 
@@ -61,8 +134,7 @@ class trend_filter(affine_transform):
         self.knots = knots
         self.steps = knots[1:] - knots[:-1]
 
-        self.linear_transform = difference_transform(knots, order=order, sorted=True,
-                                                     transform=True)
+        self.linear_transform = divided_difference(knots, order=order, sorted=True)
         self.affine_offset = None
         self.input_shape = self.linear_transform.input_shape
         self.output_shape = self.linear_transform.output_shape
@@ -79,6 +151,12 @@ class trend_filter(affine_transform):
     def adjoint_map(self, x):
         return self.linear_transform.adjoint_map(x)
 
+    def tosparse(self):
+        """
+        The banded matrix of the transform as a `scipy.sparse.csr_matrix`.
+        """
+        return self.linear_transform.tosparse()
+
 
 class trend_filter_inverse(affine_transform):
 
@@ -95,8 +173,7 @@ class trend_filter_inverse(affine_transform):
         self.knots = knots
         self.steps = knots[1:] - knots[:-1]
             
-        dtransform = difference_transform(knots, order=order, sorted=True,
-                                          transform=True)
+        dtransform = divided_difference(knots, order=order, sorted=True)
 
         self.affine_offset = None
         self.output_shape = dtransform.input_shape
@@ -210,15 +210,31 @@ def formD(m, n):
 
 class image2d_differences(affine_transform):
 
+    """
+    The differences of formD across the edges of a 2D lattice, 
+    computed with slices of the image instead of a sparse matrix.
+    The matrix is only formed when the attribute D is used.
+    """
+
     def __init__(self, image_shape, affine_offset=None):
         self.image_shape = image_shape
-        self.D = formD(*image_shape)
-        self.DT = self.D.T.tocsr()
         self.input_shape = image_shape
         m, n = self.input_shape
         self.output_shape = (m*n-1,2)
         self.affine_offset = affine_offset
 
+    @property
+    def D(self):
+        if not hasattr(self, "_D"):
+            self._D = formD(*self.image_shape)
+        return self._D
+
+    @property
+    def DT(self):
+        if not hasattr(self, "_DT"):
+            self._DT = self.D.T.tocsr()
+        return self._DT
+
     def linear_map(self, x, copy=True):
         r"""Apply linear part of transform to `x`
 
@@ -237,8 +253,21 @@ class image2d_differences(affine_transform):
         Dx : ndarray
             `x` transformed with linear component
         """
-        v = self.D * x.reshape(-1)
-        return v.reshape(self.output_shape[::-1]).T
+        m, n = self.image_shape
+        x = x.reshape(self.image_shape)
+        # vertical and horizontal differences
+        d0 = x[:-1] - x[1:]
+        d1 = x[:,:-1] - x[:,1:]
+        v = np.zeros(self.output_shape)
+        # first row of formD: interior vertices, the top edges
+        # of the right hand vertices and the right hand edge
+        k = (m-1)*(n-1)
+        v[:k,0] = d0[:,:-1].reshape(-1)
+        v[k:k+n-1,0] = d1[-1]
+        v[k+n-1:,0] = d0[:,-1]
+        # second row: interior vertices
+        v[:k,1] = d1[:-1].reshape(-1)
+        return v
 
     def affine_map(self, x, copy=True):
         r"""Apply linear part of transform to `x`
@@ -280,5 +309,121 @@ class image2d_differences(affine_transform):
         D.T*u : ndarray
             `u` transformed with linear component
         """
-        v = self.DT * u.T.reshape(-1)
-        return v.reshape(self.input_shape)
+        m, n = self.image_shape
+        u = u.reshape(self.output_shape)
+        k = (m-1)*(n-1)
+        w0 = np.empty((m-1,n))
+        w0[:,:-1] = u[:k,0].reshape((m-1,n-1))
+        w0[:,-1] = u[k+n-1:,0]
+        w1 = np.empty((m,n-1))
+        w1[:-1] = u[:k,1].reshape((m-1,n-1))
+        w1[-1] = u[k:k+n-1,0]
+
+        v = np.zeros(self.input_shape)
+        v[:-1] += w0
+        v[1:] -= w0
+        v[:,:-1] += w1
+        v[:,1:] -= w1
+        return v
+
+class image_differences(affine_transform):
+
+    """
+    The forward differences of an image of any dimension, e.g.
+    2D, 3D or 4D for a sequence of volumes, along each of its
+    axes, computed with slices of the image.
+
+    The output has one row per voxel and one column per
+    axis. The difference along an axis is 0 at the last voxel
+    along it, so the rows are the (forward) gradients at each 
+    voxel, the groups of an `l1_l2` penalty for total variation.
+
+    If mask, a boolean array of shape image_shape, is not None,
+    the input holds the values of the voxels in mask, 
+    the output has rows for these voxels only and
+    differences across the boundary of mask are 0.
+
+    >>> D = image_differences((2,3))
+    >>> D.linear_map(np.array([[0, 1, 3], [2, 2, 2.]]))
+    array([[ 2.,  1.],
+           [ 1.,  2.],
+           [-1.,  0.],
+           [ 0.,  0.],
+           [ 0.,  0.],
+           [ 0.,  0.]])
+    """
+
+    def __init__(self, image_shape, mask=None, affine_offset=None):
+        self.image_shape = tuple(image_shape)
+        self.ndim = len(self.image_shape)
+        self.mask = mask
+        if mask is not None:
+            mask = np.asarray(mask, np.bool)
+            if mask.shape != self.image_shape:
+                raise ValueError('mask should have shape image_shape')
+            self.mask = mask
+            nvoxel = mask.sum()
+            self.input_shape = (nvoxel,)
+            # edges with both voxels in mask
+            self.edges = []
+            for axis in range(self.ndim):
+                edge = np.zeros(mask.shape, np.bool)
+                edge[self._slice(axis, 0, -1)] = (mask[self._slice(axis, 0, -1)] *
+                                                  mask[self._slice(axis, 1, None)])
+                self.edges.append(edge)
+        else:
+            nvoxel = np.prod(self.image_shape)
+            self.input_shape = self.image_shape
+        self.output_shape = (nvoxel, self.ndim)
+        self.affine_offset = affine_offset
+
+    def _slice(self, axis, start, stop):
+        index = [slice(None)] * self.ndim
+        index[axis] = slice(start, stop)
+        return tuple(index)
+
+    def linear_map(self, x, copy=True):
+        if self.mask is not None:
+            image = np.zeros(self.image_shape)
+            image[self.mask] = x.reshape(-1)
+        else:
+            image = x.reshape(self.image_shape)
+        v = np.zeros(self.output_shape)
+        difference = np.empty(self.image_shape)
+        for axis in range(self.ndim):
+            head, tail = self._slice(axis, 0, -1), self._slice(axis, 1, None)
+            difference[head] = image[tail] - image[head]
+            difference[self._slice(axis, -1, None)] = 0
+            if self.mask is not None:
+                difference *= self.edges[axis]
+                v[:,axis] = difference[self.mask]
+            else:
+                v[:,axis] = difference.reshape(-1)
+        return v
+
+    def affine_map(self, x, copy=True):
+        if self.affine_offset is not None:
+            return self.linear_map(x) + self.affine_offset
+        return self.linear_map(x)
+
+    def offset_map(self, x, copy=True):
+        if self.affine_offset is not None:
+            return x + self.affine_offset
+        return x
+
+    def adjoint_map(self, u, copy=True):
+        u = u.reshape(self.output_shape)
+        v = np.zeros(self.image_shape)
+        difference = np.zeros(self.image_shape)
+        for axis in range(self.ndim):
+            if self.mask is not None:
+                difference[self.mask] = u[:,axis]
+                difference *= self.edges[axis]
+            else:
+                difference = u[:,axis].reshape(self.image_shape)
+            head, tail = self._slice(axis, 0, -1), self._slice(axis, 1, None)
+            v[tail] += difference[head]
+            v[head] -= difference[head]
+        if self.mask is not None:
+            return v[self.mask]
+        return v
@@ -0,0 +1,297 @@
+"""
+Design matrices that are kept on disk and read in blocks of rows.
+
+A `block_design` has the `affine_transform` API: `linear_map` computes
+the product one block of rows at a time and `adjoint_map` accumulates
+the products of the blocks' transposes, so only one block is in memory
+at a time. It can be used as the matrix of a `normalize`, whose
+centering and scaling statistics are then computed in a single
+pass over the blocks by `column_moments`.
+"""
+
+import zipfile
+
+import numpy as np
+
+class block_design(object):
+
+    """
+    A matrix stored in blocks of rows, each returned by calling one
+    of loaders, a list of functions without arguments. The shapes of the
+    blocks are given by shapes.
+
+    If intercept is True, a column of ones is added as the first
+    column. If columns is not None, only the columns indexed by it,
+    counting the column of ones, are used.
+
+    Use the constructors `from_array`, `from_npy` and `from_npz`.
+
+    >>> X = np.arange(12.).reshape((4,3))
+    >>> design = block_design.from_array(X, block_rows=3)
+    >>> design.linear_map(np.ones(3))
+    array([  3.,  12.,  21.,  30.])
+    >>> design.adjoint_map(np.ones(4))
+    array([ 18.,  22.,  26.])
+    """
+
+    def __init__(self, loaders, shapes, intercept=False, columns=None):
+        self.loaders = loaders
+        self.shapes = [tuple(shape) for shape in shapes]
+        if len(set([shape[1] for shape in self.shapes])) != 1:
+            raise ValueError('all blocks must have the same number of columns')
+        self.intercept = intercept
+        self.columns = columns
+
+        self.row_bounds = np.cumsum([0] + [shape[0] for shape in self.shapes])
+        p = self.shapes[0][1] + int(intercept)
+        if columns is not None:
+            p = np.arange(p)[columns].shape[0]
+        self.input_shape = (p,)
+        self.output_shape = (self.row_bounds[-1],)
+        self.shape = self.output_shape + self.input_shape
+        self.affine_offset = None
+
+    @classmethod
+    def from_array(cls, X, block_rows=None):
+        """
+        Blocks of block_rows rows of X, an ndarray, `np.memmap` or
+        the name of a .npy file, which is memory mapped.
+        The default block_rows gives blocks of about 64MB.
+        """
+        if not hasattr(X, 'shape'):
+            X = np.load(X, mmap_mode='r')
+        n, p = X.shape
+        if block_rows is None:
+            block_rows = max(1, 2**26 // max(p * X.itemsize, 1))
+        bounds = list(range(0, n, block_rows)) + [n]
+        loaders = [lambda start=start, stop=stop: X[start:stop]
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        shapes = [(stop - start, p) for start, stop in zip(bounds[:-1], bounds[1:])]
+        return cls(loaders, shapes)
+
+    @classmethod
+    def from_npy(cls, filenames):
+        """
+        Blocks stored in the .npy files filenames, each
+        memory mapped when used.
+        """
+        loaders = [lambda filename=filename: np.load(filename, mmap_mode='r')
+                   for filename in filenames]
+        shapes = [np.load(filename, mmap_mode='r').shape for filename in filenames]
+        return cls(loaders, shapes)
+
+    @classmethod
+    def from_npz(cls, filename, keys=None):
+        """
+        Blocks stored as the arrays keys of the .npz file
+        filename, each read when used. The default keys are those
+        of `np.savez` with positional arguments, in order.
+        """
+        if keys is None:
+            names = zipfile.ZipFile(filename).namelist()
+            keys = sorted([name[:-4] for name in names if name.startswith('arr_')],
+                          key=lambda key: int(key[4:]))
+        shapes = [npz_shape(filename, key) for key in keys]
+        loaders = [lambda key=key: npz_array(filename, key) for key in keys]
+        return cls(loaders, shapes)
+
+    def with_intercept(self):
+        """
+        The design with a column of ones added before its columns.
+        """
+        if self.intercept or self.columns is not None:
+            raise ValueError('expecting a design without intercept or column subset')
+        return self._subset(True, None)
+
+    def __getitem__(self, index):
+        """
+        Only column subsets, i.e. index = (slice(None), columns),
+        are supported. The columns are read when used.
+        """
+        if (not isinstance(index, tuple) or len(index) != 2
+            or index[0] != slice(None)):
+            raise IndexError('only column subsets X[:,columns] of a block_design are supported')
+        columns = np.arange(self.input_shape[0])[index[1]]
+        if self.columns is not None:
+            columns = np.arange(self.shapes[0][1] + int(self.intercept))[self.columns][columns]
+        return self._subset(self.intercept, columns)
+
+    def _subset(self, intercept, columns):
+        # the design with the same blocks, intercept and columns
+        return self.__class__(self.loaders, self.shapes, intercept=intercept,
+                              columns=columns)
+
+    def block(self, i):
+        """
+        The i-th block of rows, as an ndarray.
+        """
+        B = np.asarray(self.loaders[i](), np.float)
+        if self.intercept:
+            B = np.hstack([np.ones((B.shape[0], 1)), B])
+        if self.columns is not None:
+            B = B[:,self.columns]
+        return B
+
+    def blocks(self):
+        """
+        Iterate over the bounds of the blocks' rows and the blocks.
+        """
+        for i in range(len(self.loaders)):
+            yield slice(self.row_bounds[i], self.row_bounds[i+1]), self.block(i)
+
+    def toarray(self):
+        """
+        The matrix as an ndarray, read in one pass over the blocks.
+        Use it for column subsets that fit in memory.
+        """
+        X = np.empty(self.shape)
+        for rows, B in self.blocks():
+            X[rows] = B
+        return X
+
+    def linear_map(self, x, copy=True):
+        if x.ndim == 1:
+            v = np.empty(self.output_shape)
+        else:
+            v = np.empty(self.output_shape + x.shape[1:])
+        for rows, B in self.blocks():
+            v[rows] = np.dot(B, x)
+        return v
+
+    def affine_map(self, x, copy=True):
+        return self.linear_map(x)
+
+    def offset_map(self, x, copy=True):
+        return x
+
+    def adjoint_map(self, u, copy=True):
+        v = np.zeros(self.input_shape + u.shape[1:])
+        for rows, B in self.blocks():
+            v += np.dot(B.T, u[rows])
+        return v
+
+    def column_moments(self):
+        """
+        The sums and the sums of squares of the columns,
+        in one pass over the blocks.
+        """
+        sums = np.zeros(self.input_shape)
+        sumsq = np.zeros(self.input_shape)
+        for rows, B in self.blocks():
+            sums += B.sum(0)
+            sumsq += (B**2).sum(0)
+        return sums, sumsq
+
+class row_subset(block_design):
+
+    """
+    The rows of X, an ndarray or `np.memmap`, indexed by rows, an 
+    integer or boolean index, e.g. the training cases of a fold 
+    of cross-validation. 
+
+    X is not copied: the products are those of X, computed for all
+    its rows and restricted to rows, and the column moments are those
+    of X weighted by the indicator of rows. Only column subsets,
+    made in memory by `toarray`, are copied.
+
+    >>> X = np.arange(12.).reshape((4,3))
+    >>> design = row_subset(X, [0,2])
+    >>> design.linear_map(np.ones(3))
+    array([  3.,  21.])
+    >>> design.adjoint_map(np.ones(2))
+    array([  6.,   8.,  10.])
+    """
+
+    def __init__(self, X, rows, intercept=False, columns=None):
+        self.X = X
+        self.rows = np.arange(X.shape[0])[rows]
+        self.mask = np.zeros(X.shape[0])
+        self.mask[self.rows] = 1
+        block_design.__init__(self, [lambda: X[self.rows]], 
+                              [(self.rows.shape[0], X.shape[1])],
+                              intercept=intercept, columns=columns)
+
+    def _subset(self, intercept, columns):
+        return self.__class__(self.X, self.rows, intercept=intercept,
+                              columns=columns)
+
+    def block(self, i):
+        """
+        The rows, as an ndarray. Only the columns used are copied.
+        """
+        if self.columns is None:
+            return block_design.block(self, i)
+        columns = np.asarray(self.columns)
+        B = np.empty((self.rows.shape[0], columns.shape[0]))
+        if self.intercept:
+            B[:,columns == 0] = 1
+            B[:,columns > 0] = self.X[np.ix_(self.rows, columns[columns > 0] - 1)]
+        else:
+            B[:] = self.X[np.ix_(self.rows, columns)]
+        return B
+
+    def _full(self, x):
+        # the intercept and the coefficients of the columns of X
+        # for the coefficients x of the design
+        p = self.X.shape[1] + int(self.intercept)
+        if self.columns is not None:
+            full = np.zeros((p,) + x.shape[1:])
+            full[self.columns] = x
+            x = full
+        if self.intercept:
+            return x[0], x[1:]
+        return 0, x
+
+    def _restrict(self, v):
+        # the entries of v, a function of the intercept and the
+        # columns of X, for the columns of the design
+        if self.columns is not None:
+            return v[self.columns]
+        return v
+
+    def linear_map(self, x, copy=True):
+        intercept, x = self._full(x)
+        return np.dot(self.X, x)[self.rows] + intercept
+
+    def adjoint_map(self, u, copy=True):
+        u_full = np.zeros(self.X.shape[:1] + u.shape[1:])
+        u_full[self.rows] = u
+        v = np.dot(self.X.T, u_full)
+        if self.intercept:
+            v = np.concatenate([u.sum(0)[np.newaxis], v])
+        return self._restrict(v)
+
+    def column_moments(self):
+        sums = np.dot(self.mask, self.X)
+        sumsq = np.einsum('i,ij,ij->j', self.mask, self.X, self.X)
+        if self.intercept:
+            n = self.rows.shape[0]
+            sums, sumsq = np.hstack([n, sums]), np.hstack([n, sumsq])
+        return self._restrict(sums), self._restrict(sumsq)
+
+def npz_array(filename, key):
+    """
+    The array key of the .npz file filename.
+    """
+    archive = np.load(filename)
+    try:
+        return archive[key]
+    finally:
+        archive.close()
+
+def npz_shape(filename, key):
+    """
+    The shape of the array key of the .npz file filename,
+    read from its header.
+    """
+    archive = zipfile.ZipFile(filename)
+    try:
+        member = archive.open(key + '.npy')
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(member)
+        else:
+            header = np.lib.format.read_array_header_2_0(member)
+        return header[0]
+    finally:
+        archive.close()
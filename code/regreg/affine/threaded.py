@@ -0,0 +1,153 @@
+"""
+A backend for the matrix products of `affine_transform` and `normalize`
+that computes them in blocks on a pool of threads.
+
+The blocks are views of the matrix, no data is copied:
+
+* a dense array is split in blocks of rows for :math:`Xv` and
+  in blocks of columns for :math:`X^Tu`;
+
+* a `scipy.sparse.csr_matrix` is split in blocks of rows, the
+  blocks' products with :math:`u` are summed for :math:`X^Tu`;
+
+* a `scipy.sparse.csc_matrix` is split in blocks of columns, the
+  blocks' products with :math:`v` are summed for :math:`Xv`.
+
+Other matrices are multiplied in the calling thread.
+The products of numpy and of scipy's sparse matrices release the GIL,
+so the blocks are multiplied in parallel.
+"""
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from scipy import sparse
+
+def row_block(M, start, stop):
+    """
+    Rows start:stop of a csr_matrix, sharing its data.
+    """
+    indptr = M.indptr[start:stop+1]
+    return sparse.csr_matrix((M.data[indptr[0]:indptr[-1]],
+                              M.indices[indptr[0]:indptr[-1]],
+                              indptr - indptr[0]),
+                             shape=(stop - start, M.shape[1]), copy=False)
+
+def column_block(M, start, stop):
+    """
+    Columns start:stop of a csc_matrix, sharing its data.
+    """
+    indptr = M.indptr[start:stop+1]
+    return sparse.csc_matrix((M.data[indptr[0]:indptr[-1]],
+                              M.indices[indptr[0]:indptr[-1]],
+                              indptr - indptr[0]),
+                             shape=(M.shape[0], stop - start), copy=False)
+
+class threaded_matvec(object):
+
+    """
+    Products of a matrix with vectors, or 2D arrays, computed
+    in n_threads blocks on a pool of threads.
+    Matrices with fewer than min_size entries, or nonzero
+    entries if sparse, are multiplied in the calling thread.
+
+    >>> X = np.arange(12.).reshape((4,3))
+    >>> backend = threaded_matvec(n_threads=2, min_size=0)
+    >>> backend.dot(X, np.ones(3))
+    array([  3.,  12.,  21.,  30.])
+    >>> backend.adjoint_dot(X, np.ones(4))
+    array([ 18.,  22.,  26.])
+    """
+
+    def __init__(self, n_threads=None, min_size=2**16):
+        if n_threads is None:
+            n_threads = multiprocessing.cpu_count()
+        self.n_threads = n_threads
+        self.min_size = min_size
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_threads)
+        return self._pool
+
+    def __getstate__(self):
+        # a pool can not be pickled, a new one is started when needed
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __del__(self):
+        self.close()
+
+    def bounds(self, size):
+        """
+        Bounds of the blocks splitting range(size).
+        """
+        nblock = max(1, min(self.n_threads, size))
+        return np.linspace(0, size, nblock + 1).astype(np.int)
+
+    def threaded(self, M):
+        """
+        Are the products of M computed in blocks?
+        """
+        if self.n_threads <= 1:
+            return False
+        if sparse.isspmatrix_csr(M) or sparse.isspmatrix_csc(M):
+            return M.nnz >= self.min_size
+        return isinstance(M, np.ndarray) and M.size >= self.min_size
+
+    def _map(self, products):
+        return self.pool.map(lambda product: product(), products)
+
+    def dot(self, M, x):
+        """
+        The product of M and x.
+        """
+        if not self.threaded(M):
+            if sparse.issparse(M):
+                return M * x
+            return np.dot(M, x)
+        if sparse.isspmatrix_csc(M):
+            bounds = self.bounds(M.shape[1])
+            products = [lambda a=a, b=b: column_block(M, a, b) * x[a:b]
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+            return np.sum(self._map(products), 0)
+        bounds = self.bounds(M.shape[0])
+        if sparse.isspmatrix_csr(M):
+            products = [lambda a=a, b=b: row_block(M, a, b) * x
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            products = [lambda a=a, b=b: np.dot(M[a:b], x)
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate(self._map(products))
+
+    def adjoint_dot(self, M, u):
+        """
+        The product of the transpose of M and u.
+        """
+        if not self.threaded(M):
+            if sparse.issparse(M):
+                return M.T * u
+            return np.dot(M.T, u)
+        if sparse.isspmatrix_csr(M):
+            bounds = self.bounds(M.shape[0])
+            products = [lambda a=a, b=b: row_block(M, a, b).T * u[a:b]
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+            return np.sum(self._map(products), 0)
+        bounds = self.bounds(M.shape[1])
+        if sparse.isspmatrix_csc(M):
+            products = [lambda a=a, b=b: column_block(M, a, b).T * u
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            products = [lambda a=a, b=b: np.dot(M[:,a:b].T, u)
+                        for a, b in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate(self._map(products))
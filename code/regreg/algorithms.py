@@ -1,7 +1,9 @@
 import numpy as np
 import warnings
+from scipy import sparse
 
 from .identity_quadratic import identity_quadratic as sq
+from .instrumentation import current_monitor, instrumented, instrumented_solve
 
 class algorithm(object):
 
@@ -24,12 +26,215 @@ class algorithm(object):
         """
         raise NotImplementedError
 
+class fista_workspace(object):
+
+    """
+    Preallocated buffers used by `FISTA.fit` when called with
+    ``workspace=True``.
+
+    The extrapolated point, the trial step and the difference
+    vectors are updated in place so that, apart from whatever
+    the composite's `smooth_objective` and `proximal` allocate,
+    an iteration of FISTA creates no new arrays.
+    """
+
+    def __init__(self, shape):
+        self.shape = shape
+        # the point at which the gradient is evaluated
+        self.r = np.zeros(shape)
+        # the trial step returned by the proximal map
+        self.beta = np.zeros(shape)
+        # scratch space for beta - r and beta - coefs
+        self.diff = np.zeros(shape)
+        # scratch space for differences of gradients
+        self.grad_diff = np.zeros(shape)
+        # reused across proximal steps, its fields are reset each time
+        self.quadratic = sq(1., self.r, 0, 0)
+
+    def prox_quadratic(self, inv_step, r, grad):
+        """
+        Return ``identity_quadratic(inv_step, r, grad, 0)`` without
+        creating a new object.
+        """
+        q = self.quadratic
+        q.coef = inv_step
+        q.center = r
+        q.linear_term = grad
+        q.constant_term = 0
+        return q
+
+class backtracking(object):
+
+    r"""
+    The default step size policy of `FISTA.fit`. Each iteration
+    starts backtracking from the previous inverse step size,
+    which is increased by a factor of alpha every time a trial step
+    is rejected. Every `decrease_every` iterations, and at every 
+    iteration after a restart until a trial step is rejected, 
+    it first tries to decrease the inverse step size by alpha.
+
+    If gradient_restart is True, the Nesterov weights are also
+    restarted whenever the momentum points away from the 
+    proximal gradient step, i.e. when 
+    :math:`(r - \beta_{new})^T(\beta_{new} - \beta_{old}) > 0`,
+    as in O'Donoghue and Candes, "Adaptive restart for accelerated
+    gradient schemes".
+    """
+
+    # does the momentum depend on the ratio of 
+    # successive inverse step sizes?
+    scale_momentum = False
+
+    def __init__(self, alpha=1.1, decrease_every=100, 
+                 attempt_decrease=False, gradient_restart=False):
+        self.alpha = alpha
+        self.decrease_every = decrease_every
+        self.attempt_decrease = attempt_decrease
+        self.gradient_restart = gradient_restart
+
+    def initial(self, inv_step, itercount, r, grad):
+        """
+        The first inverse step size tried at iteration itercount,
+        from the inverse step size of the previous iteration and the 
+        extrapolated point r and the gradient there.
+        """
+        if np.mod(itercount+1,self.decrease_every)==0 or self.attempt_decrease:
+            inv_step /= self.alpha
+            self.attempt_decrease = True
+        return inv_step
+
+    def rejected(self, inv_step):
+        """
+        The next inverse step size tried after inv_step was rejected.
+        """
+        self.attempt_decrease = False
+        return inv_step * self.alpha
+
+    def restarted(self):
+        """
+        Called when FISTA.fit restarts the Nesterov weights because
+        the objective increased.
+        """
+        self.attempt_decrease = True
+
+    def momentum(self, t_old, ratio=1.):
+        """
+        The next Nesterov weight. Here ratio is the ratio of the next
+        inverse step size to the current one.
+        """
+        return 0.5 * (1 + np.sqrt(1+4*(t_old**2)))
+
+    # the ratio of the next initial inverse step size to the current
+    # accepted one, if known in advance
+    predicted_ratio = 1.
+
+class barzilai_borwein(backtracking):
+
+    r"""
+    Start backtracking at each iteration from the Barzilai-Borwein
+    (spectral) estimate :math:`s^Ty/s^Ts` of the curvature, where 
+    :math:`s` is the change in the extrapolated point and :math:`y`
+    the change in the gradient, falling back to the previous
+    inverse step size if the estimate is not positive. The 
+    estimate is not allowed to fall below the previous inverse
+    step size divided by max_decrease.
+
+    The estimate is often well below the Lipschitz constant, so
+    rejected steps increase the inverse step size by a larger
+    factor than the default policy.
+    """
+
+    def __init__(self, alpha=1.5, max_decrease=1.5, gradient_restart=False, **keywords):
+        backtracking.__init__(self, alpha=alpha, 
+                              gradient_restart=gradient_restart)
+        self.max_decrease = max_decrease
+        self._r = self._grad = None
+
+    def initial(self, inv_step, itercount, r, grad):
+        if self._r is None:
+            self._r = r.copy()
+            self._grad = grad.copy()
+            return inv_step
+        s = (r - self._r).reshape(-1)
+        y = (grad - self._grad).reshape(-1)
+        ss, sy = np.dot(s, s), np.dot(s, y)
+        self._r[:] = r
+        self._grad[:] = grad
+        if ss > 0 and sy > 0 and np.isfinite(sy / ss):
+            return max(sy / ss, inv_step / self.max_decrease)
+        return inv_step
+
+    def restarted(self):
+        pass
+
+class scheinberg_goldfarb_bai(backtracking):
+
+    r"""
+    The backtracking of Scheinberg, Goldfarb and Bai, "Fast first-order
+    methods for composite convex optimization with backtracking".
+    Each iteration first tries the previous inverse step size
+    times `decrease` and the Nesterov weights follow the
+    changes in the step size, 
+
+    .. math::
+
+       t_{k+1} = \frac{1}{2}\left(1 + \sqrt{1 + 4 \theta_k t_k^2}\right)
+
+    where :math:`\theta_k` is the ratio of the inverse step sizes
+    of iterations :math:`k+1` and :math:`k`. As the weights depend on 
+    the step size, the extrapolated point is recomputed after every
+    rejected trial step.
+    """
+
+    scale_momentum = True
+
+    def __init__(self, alpha=1.1, decrease=0.9, gradient_restart=False, **keywords):
+        backtracking.__init__(self, alpha=alpha, 
+                              gradient_restart=gradient_restart)
+        self.decrease = self.predicted_ratio = decrease
+
+    def initial(self, inv_step, itercount, r, grad):
+        return inv_step * self.decrease
+
+    def restarted(self):
+        pass
+
+    def momentum(self, t_old, ratio=1.):
+        return 0.5 * (1 + np.sqrt(1+4*ratio*(t_old**2)))
+
+class adaptive_restart(backtracking):
+
+    """
+    The default backtracking with gradient based adaptive restart 
+    of the Nesterov weights.
+    """
+
+    def __init__(self, alpha=1.1, **keywords):
+        keywords['gradient_restart'] = True
+        backtracking.__init__(self, alpha=alpha, **keywords)
+
+step_policies = {'backtracking':backtracking,
+                 'bb':barzilai_borwein,
+                 'sgb':scheinberg_goldfarb_bai,
+                 'restart':adaptive_restart}
+
 class FISTA(algorithm):
 
     """
     The FISTA generalized gradient algorithm
     """
 
+    def get_workspace(self):
+        """
+        Return a `fista_workspace` matching the shape of self.composite.coefs,
+        reusing the one from a previous fit if possible.
+        """
+        shape = self.composite.coefs.shape
+        if not hasattr(self, '_workspace') or self._workspace.shape != shape:
+            self._workspace = fista_workspace(shape)
+        return self._workspace
+
+    @instrumented_solve
     def fit(self,
             max_its=10000,
             min_its=5,
@@ -44,7 +249,12 @@ class FISTA(algorithm):
             monotonicity_restart=True,
             debug = None,
             prox_control=None,
-            attempt_decrease = False):
+            attempt_decrease = False,
+            workspace=False,
+            track_linear_predictor=False,
+            step_policy='backtracking',
+            gap_tol=None,
+            gap_every=10):
 
         """
         Use the FISTA (or ISTA) algorithm to fit the problem
@@ -79,6 +289,46 @@ class FISTA(algorithm):
               A dictionary of arguments for fit(), used when the composite.proximal_step itself is a FISTA problem
         attempt_decrease : bool
               If True, attempt to decrease inv_step on the first iteration
+        workspace : bool
+              If True, keep the iterates in the preallocated buffers of 
+              self.get_workspace() and update them in place. 
+              In this mode self.composite.coefs is also updated in place.
+        track_linear_predictor : bool
+              If True, carry the linear predictor of the iterates
+              (see `affine_smooth.linear_predictor`) along with them
+              and form the predictor at the extrapolated point
+              as a combination of the cached ones. Each iteration
+              then needs one forward product per trial step and
+              one adjoint product, instead of a forward product at
+              both the extrapolated point and the trial step.
+              Requires self.composite.has_linear_predictor.
+        step_policy : str or policy
+              How the step size is chosen when backtracking, one of
+              'backtracking' (the default, see `backtracking`),
+              'bb' (`barzilai_borwein`), 'sgb' (`scheinberg_goldfarb_bai`)
+              and 'restart' (`adaptive_restart`), or an instance of one 
+              of these classes. The 'backtracking' and 'restart'
+              policies use alpha and attempt_decrease, the others
+              their own defaults. The number of rejected
+              trial steps and of gradient based restarts of the last
+              fit are stored as self.rejected_trials and 
+              self.gradient_restarts.
+        gap_tol : float
+              If not None, stop when the duality gap 
+              (see `simple_problem.duality_gap`) relative to the objective
+              value is below gap_tol instead of using tol. The final
+              gap, which bounds the distance of the objective from its
+              minimum, is stored as self.duality_gap.
+        gap_every : int
+              Compute the duality gap every gap_every iterations.
+
+        Notes
+        -----
+        The number of iterations of the last fit is stored as
+        self.iterations. Within a `regreg.instrumentation.monitor`
+        the smooth objective evaluations, proximal steps, trial 
+        steps and restarts are counted and timed and the monitor's
+        callback is called after each iteration.
     
         Returns
         -------
@@ -92,17 +342,60 @@ class FISTA(algorithm):
             self.debug = debug
         set_prox_control = prox_control is not None
 
-        objective_hist = np.zeros(max_its)
+        if step_policy in ['backtracking', 'restart']:
+            policy = step_policies[step_policy](alpha=alpha, 
+                                                attempt_decrease=attempt_decrease)
+        elif step_policy in step_policies:
+            policy = step_policies[step_policy]()
+        elif isinstance(step_policy, backtracking):
+            policy = step_policy
+        else:
+            raise ValueError('unknown step_policy %s' % str(step_policy))
+        self.step_policy = policy
+        self.rejected_trials = 0
+        self.gradient_restarts = 0
+        monitor = current_monitor()
+        gap = None
+        if gap_tol is not None:
+            # fails early if the composite has no duality gap
+            self.composite.duality_gap(self.composite.coefs)
+
+        if workspace:
+            ws = self.get_workspace()
+        else:
+            ws = None
+
+        if return_objective_hist:
+            objective_hist = np.zeros(max_its)
+
+        if track_linear_predictor:
+            if not self.composite.has_linear_predictor:
+                raise ValueError('composite does not have a linear predictor to track')
+            eta_coefs = self.composite.linear_predictor(self.composite.coefs)
+            eta_r = eta_beta = eta_coefs
+            if ws is not None:
+                eta_out = np.empty_like(eta_coefs)
+            else:
+                eta_out = None
+        else:
+            eta_coefs = eta_r = eta_beta = None
         
         if backtrack and self.inv_step is None:
             #If inv_step is not available from last fit use start_inv_step
             self.inv_step = start_inv_step
 
-        r = self.composite.coefs
+        if ws is not None:
+            r = ws.r
+            r[:] = self.composite.coefs
+        else:
+            r = self.composite.coefs
         t_old = 1.
+        # for policies whose momentum depends on the step size: 
+        # the previous iterate and weight, None when there is no momentum
+        momentum_base = None
 
         beta = self.composite.coefs
-        current_f = self.composite.smooth_objective(r,mode='func')
+        current_f = self._smooth_objective(r, eta_r, 'func')
         current_obj = current_f + self.composite.nonsmooth_objective(self.composite.coefs, check_feasibility=True)
         
         itercount = 0
@@ -113,58 +406,88 @@ class FISTA(algorithm):
             if np.mod(itercount+1,restart)==0:
                 if self.debug:
                     print "\tRestarting weights"
-                r = self.composite.coefs
+                if monitor is not None:
+                    monitor.record('restarts')
+                if ws is not None:
+                    r[:] = self.composite.coefs
+                else:
+                    r = self.composite.coefs
+                eta_r = eta_coefs
                 t_old = 1.
+                momentum_base = None
 
-            objective_hist[itercount] = current_obj
+            if return_objective_hist:
+                objective_hist[itercount] = current_obj
 
             # Backtracking loop
             if backtrack:
-                if np.mod(itercount+1,100)==0 or attempt_decrease:
-                    self.inv_step *= 1/alpha
-                    attempt_decrease = True
-                current_f, grad = self.composite.smooth_objective(r,mode='both')
+                current_f, grad = self._smooth_objective(r, eta_r, 'both')
+                accepted_inv_step = self.inv_step
+                self.inv_step = policy.initial(self.inv_step, itercount, r, grad)
                 stop = False
                 while not stop:
-                    if set_prox_control:
-                        beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), prox_control=prox_control)
-                    else:
-                        beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0))
+                    beta = self._proximal_step(r, grad, prox_control, ws)
+                    if track_linear_predictor:
+                        eta_beta = self.composite.linear_predictor(beta)
 
-                    trial_f = self.composite.smooth_objective(beta,mode='func')
+                    trial_f = self._smooth_objective(beta, eta_beta, 'func')
+                    if monitor is not None:
+                        monitor.record('backtrack_trials')
 
                     if not np.isfinite(trial_f):
                         stop = False
-                    elif np.fabs(trial_f - current_f)/np.max([1.,trial_f]) > 1e-10:
-                        stop = trial_f <= current_f + np.dot((beta-r).reshape(-1),grad.reshape(-1)) + 0.5*self.inv_step*np.linalg.norm(beta-r)**2
                     else:
-                        trial_grad = self.composite.smooth_objective(beta,mode='grad')
-                        stop = np.fabs(np.dot((beta-r).reshape(-1),(grad-trial_grad).reshape(-1))) <= 0.5*self.inv_step*np.linalg.norm(beta-r)**2
+                        step = self._difference(beta, r, ws)
+                        if np.fabs(trial_f - current_f)/np.max([1.,trial_f]) > 1e-10:
+                            stop = trial_f <= current_f + np.dot(step.reshape(-1),grad.reshape(-1)) + 0.5*self.inv_step*np.linalg.norm(step)**2
+                        else:
+                            trial_grad = self._smooth_objective(beta, eta_beta, 'grad')
+                            if ws is not None:
+                                grad_diff = np.subtract(grad, trial_grad, ws.grad_diff)
+                            else:
+                                grad_diff = grad - trial_grad
+                            stop = np.fabs(np.dot(step.reshape(-1),grad_diff.reshape(-1))) <= 0.5*self.inv_step*np.linalg.norm(step)**2
                     if not stop:
-                        attempt_decrease = False
-                        self.inv_step *= alpha
+                        self.rejected_trials += 1
+                        if monitor is not None:
+                            monitor.record('rejected_trials')
+                        self.inv_step = policy.rejected(self.inv_step)
                         if not np.isfinite(self.inv_step):
                             raise ValueError("inv_step overflowed")
                         if self.debug:
                             print "%i    Increasing inv_step to" % itercount, self.inv_step
+                        if momentum_base is not None:
+                            # the Nesterov weight depends on the step size:
+                            # recompute the extrapolated point
+                            coefs_prev, eta_prev, t_prev = momentum_base
+                            t_old = policy.momentum(t_prev, self.inv_step / accepted_inv_step)
+                            w = (t_prev - 1) / t_old
+                            if ws is not None:
+                                r = self._extrapolate(self.composite.coefs, coefs_prev, w, r)
+                            else:
+                                r = self._extrapolate(self.composite.coefs, coefs_prev, w)
+                            if track_linear_predictor:
+                                eta_r = self._extrapolate(eta_coefs, eta_prev, w, eta_out)
+                            current_f, grad = self._smooth_objective(r, eta_r, 'both')
                      
             else:
                 #Use specified Lipschitz constant
-                grad = self.composite.smooth_objective(r,mode='grad')
+                grad = self._smooth_objective(r, eta_r, 'grad')
                 self.inv_step = self.composite.lipschitz
-                if set_prox_control:
-                    beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), prox_control=prox_control)
-                else:
-                    beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0))
-                trial_f = self.composite.smooth_objective(beta,mode='func')
+                beta = self._proximal_step(r, grad, prox_control, ws)
+                if track_linear_predictor:
+                    eta_beta = self.composite.linear_predictor(beta)
+                trial_f = self._smooth_objective(beta, eta_beta, 'func')
                 
             trial_obj = trial_f + self.composite.nonsmooth_objective(beta)
+            if monitor is not None:
+                monitor.iteration(self, itercount, trial_obj, self.inv_step)
 
             obj_change = np.fabs(trial_obj - current_obj)
             #obj_rel_change = obj_change/np.fabs(max(min(current_obj, trial_obj),0))
             obj_rel_change = obj_change/np.max([np.fabs(current_obj),1.])
             if coef_stop:
-                coef_rel_change = np.linalg.norm(self.composite.coefs - beta) / np.max([1.,np.linalg.norm(beta)])
+                coef_rel_change = np.linalg.norm(self._difference(self.composite.coefs, beta, ws)) / np.max([1.,np.linalg.norm(beta)])
 
             if self.debug:
                 if coef_stop:
@@ -173,33 +496,70 @@ class FISTA(algorithm):
                     print "%i    obj: %.6e    inv_step: %.2e    rel_obj_change: %.2e    tol: %.1e" % (itercount, current_obj, self.inv_step, obj_rel_change, tol)
 
             if itercount >= min_its:
-                if coef_stop:
+                if gap_tol is not None:
+                    if np.mod(itercount, gap_every) == 0:
+                        gap = self.composite.duality_gap(beta)
+                        if self.debug:
+                            print "%i    duality gap: %.2e" % (itercount, gap)
+                        if gap / np.max([np.fabs(trial_obj), 1.]) < gap_tol:
+                            self._accept(beta, ws)
+                            if self.debug:
+                                print 'Success: Optimization stopped because duality gap was below tolerance'
+                            break
+                        gap = None
+                elif coef_stop:
                     if coef_rel_change < tol:
-                        self.composite.coefs = beta
+                        self._accept(beta, ws)
                         if self.debug:
                             print "Success: Optimization stopped because change in coefficients was below tolerance"
                         break
                 else:
                     if obj_rel_change < tol or obj_change < tol:
-                        self.composite.coefs = beta
+                        self._accept(beta, ws)
                         if self.debug:
                             print 'Success: Optimization stopped because decrease in objective was below tolerance'
                         break
 
             if FISTA:
                 #Use Nesterov weights
-                t_new = 0.5 * (1 + np.sqrt(1+4*(t_old**2)))
-                r = beta + ((t_old-1)/(t_new)) * (beta - self.composite.coefs)
+                t_new = policy.momentum(t_old, policy.predicted_ratio)
+                w = (t_old-1)/(t_new)
+                if (policy.gradient_restart and 
+                    np.dot((r - beta).reshape(-1), (beta - self.composite.coefs).reshape(-1)) > 0):
+                    #Gradient based restart: the momentum opposes the step
+                    self.gradient_restarts += 1
+                    if monitor is not None:
+                        monitor.record('restarts')
+                    t_new = 1.
+                    w = 0
+                if policy.scale_momentum and w != 0:
+                    momentum_base = (self.composite.coefs.copy(), eta_coefs, t_old)
+                else:
+                    momentum_base = None
+                if ws is not None:
+                    # in place: r is the workspace buffer
+                    r = self._extrapolate(beta, self.composite.coefs, w, r)
+                else:
+                    r = self._extrapolate(beta, self.composite.coefs, w)
+                if track_linear_predictor:
+                    eta_r = self._extrapolate(eta_beta, eta_coefs, w, eta_out)
             else:
                 #Just do ISTA
                 t_new = 1.
-                r = beta
+                if ws is not None:
+                    r[:] = beta
+                else:
+                    r = beta
+                eta_r = eta_beta
 
             if itercount > 1 and current_obj < trial_obj and obj_rel_change > 1e-10 and monotonicity_restart:
                 #Adaptive restarting: restart if monotonicity violated
                 if self.debug:
                     print "%i Restarting weights" % itercount
-                attempt_decrease = True
+                policy.restarted()
+                momentum_base = None
+                if monitor is not None:
+                    monitor.record('restarts')
 
                 if t_old == 1.:
                     #Gradient step didn't decrease objective: tolerance composites or incorrect prox op... time to give up?
@@ -213,10 +573,15 @@ class FISTA(algorithm):
                         break
                 itercount += 1
                 t_old = 1.
-                r = self.composite.coefs
+                if ws is not None:
+                    r[:] = self.composite.coefs
+                else:
+                    r = self.composite.coefs
+                eta_r = eta_coefs
 
             else:
-                self.composite.coefs = beta
+                self._accept(beta, ws)
+                eta_coefs = eta_beta
                 t_old = t_new
                 itercount += 1
                 current_obj = trial_obj
@@ -226,7 +591,893 @@ class FISTA(algorithm):
             if itercount == max_its:
                 print "Optimization stopped because iteration limit was reached"
             print "FISTA used", itercount, "of", max_its, "iterations"
+        self.iterations = itercount
+        if gap_tol is not None:
+            if gap is None:
+                gap = self.composite.duality_gap(self.composite.coefs)
+            self.duality_gap = gap
         if return_objective_hist:
             return objective_hist[:itercount]
 
+    def fit_batched(self,
+                    initial,
+                    max_its=10000,
+                    min_its=5,
+                    tol=1e-5,
+                    alpha=1.1,
+                    start_inv_step=1.,
+                    monotonicity_restart=True,
+                    debug=None):
+
+        """
+        Use FISTA to fit a batch of problems at once, one per
+        column of `initial`. The composite must implement
+        `batch_smooth_objective`, `batch_nonsmooth_objective` and
+        `batch_proximal`.
+
+        Each column has its own step size, Nesterov weight and
+        stopping rule. Columns are dropped from the batch as soon as
+        they converge, so they no longer cost any work.
+
+        Parameters
+        ----------
+        initial : ndarray
+              Starting values of shape ``self.composite.coefs.shape + (k,)``
+        max_its : int
+              the maximum number of iterations
+        min_its : int
+              the minimum number of iterations
+        tol : float
+              the tolerance used in the stopping criterion, applied
+              to each column
+        alpha : float
+              used in backtracking, a column's inverse step size is
+              increased by a factor of alpha when too small
+        start_inv_step : float
+              starting value of the inverse step sizes
+        monotonicity_restart : bool
+              If True, a column's Nesterov weights are restarted 
+              every time its objective value increases
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+
+        Returns
+        -------
+
+        coefs : ndarray
+              Solutions, one per column. The number of iterations and 
+              final inverse step size of each column are stored as 
+              self.batch_iterations and self.batch_inv_step.
+
+        """
+
+        if debug is not None:
+            self.debug = debug
+        composite = self.composite
+
+        coefs = np.array(initial, np.float)
+        k = coefs.shape[-1]
+        iterations = np.zeros(k, np.int)
+        inv_step = np.ones(k) * start_inv_step
+        gave_up = np.zeros(k, np.bool)
+
+        # state of the columns still being fit
+        active = np.arange(k)
+        beta_old = coefs.copy()
+        r = beta_old.copy()
+        L = inv_step.copy()
+        t_old = np.ones(k)
+        badstep = np.zeros(k, np.int)
+        current_obj = (composite.batch_smooth_objective(beta_old, mode='func', 
+                                                        columns=active) +
+                       composite.batch_nonsmooth_objective(beta_old))
+
+        itercount = 0
+        while active.shape[0] > 0 and itercount < max_its:
+
+            if np.mod(itercount+1,100)==0:
+                L /= alpha
+
+            # Backtracking, only columns that fail the test are recomputed
+            current_f, grad = composite.batch_smooth_objective(r, mode='both', 
+                                                               columns=active)
+            beta = composite.batch_proximal(r, grad, L)
+            trial_f = composite.batch_smooth_objective(beta, mode='func', 
+                                                       columns=active)
+            pending = ~self._batch_sufficient_decrease(r, beta, current_f, 
+                                                       grad, trial_f, L, active)
+            while np.any(pending):
+                L[pending] *= alpha
+                if not np.all(np.isfinite(L)):
+                    raise ValueError("inv_step overflowed")
+                beta[...,pending] = composite.batch_proximal(r[...,pending], 
+                                                             grad[...,pending],
+                                                             L[pending])
+                trial_f[pending] = composite.batch_smooth_objective(beta[...,pending],
+                                                                    mode='func',
+                                                                    columns=active[pending])
+                pending[pending] = ~self._batch_sufficient_decrease(r[...,pending], 
+                                                                    beta[...,pending],
+                                                                    current_f[pending],
+                                                                    grad[...,pending],
+                                                                    trial_f[pending],
+                                                                    L[pending],
+                                                                    active[pending])
+
+            trial_obj = trial_f + composite.batch_nonsmooth_objective(beta)
+
+            obj_change = np.fabs(trial_obj - current_obj)
+            obj_rel_change = obj_change / np.maximum(np.fabs(current_obj), 1.)
+            if itercount >= min_its:
+                converged = (obj_rel_change < tol) | (obj_change < tol)
+            else:
+                converged = np.zeros(active.shape, np.bool)
+
+            #Use Nesterov weights
+            t_new = 0.5 * (1 + np.sqrt(1+4*(t_old**2)))
+            r_new = beta + ((t_old-1)/(t_new)) * (beta - beta_old)
+
+            #Adaptive restarting: restart columns whose objective increased
+            restart = ((current_obj < trial_obj) & (obj_rel_change > 1e-10) 
+                       & ~converged)
+            if itercount <= 1 or not monotonicity_restart:
+                restart[:] = False
+            badstep[restart & (t_old == 1.)] += 1
+            bad = badstep > 3
+            if self.debug:
+                print "%i    active: %d    restarting: %d    max obj: %.6e" % (itercount, active.shape[0], restart.sum(), current_obj.max())
+
+            accept = ~restart
+            beta_old[...,accept] = beta[...,accept]
+            current_obj[accept] = trial_obj[accept]
+            t_old = np.where(accept, t_new, 1.)
+            r = np.where(accept, r_new, beta_old)
+            iterations[active] += 1
+
+            finished = converged | bad
+            if np.any(finished):
+                done = active[finished]
+                coefs[...,done] = beta_old[...,finished]
+                inv_step[done] = L[finished]
+                gave_up[done] = bad[finished]
+                keep = ~finished
+                active = active[keep]
+                beta_old, r = beta_old[...,keep], r[...,keep]
+                L, t_old, badstep, current_obj = (L[keep], t_old[keep], 
+                                                  badstep[keep], current_obj[keep])
+            itercount += 1
+
+        coefs[...,active] = beta_old
+        inv_step[active] = L
+        if np.any(gave_up):
+            warnings.warn('prox is taking bad steps')
+        if self.debug:
+            print "FISTA used", itercount, "of", max_its, "iterations,", active.shape[0], "of", k, "columns did not converge"
+
+        self.batch_iterations = iterations
+        self.batch_inv_step = inv_step
+        return coefs
+
+    def _batch_sufficient_decrease(self, r, beta, current_f, grad, trial_f, 
+                                   inv_step, columns):
+        """
+        The backtracking test of `fit` applied to each column.
+        """
+        step = beta - r
+        step_norm2 = (step**2).reshape((-1, step.shape[-1])).sum(0)
+        inner = (step * grad).reshape((-1, step.shape[-1])).sum(0)
+        stop = trial_f <= current_f + inner + 0.5 * inv_step * step_norm2
+
+        flat = np.fabs(trial_f - current_f) / np.maximum(1., trial_f) <= 1e-10
+        if np.any(flat):
+            trial_grad = self.composite.batch_smooth_objective(beta[...,flat], mode='grad',
+                                                               columns=columns[flat])
+            grad_diff = grad[...,flat] - trial_grad
+            inner = (step[...,flat] * grad_diff).reshape((-1, grad_diff.shape[-1])).sum(0)
+            stop[flat] = np.fabs(inner) <= 0.5 * inv_step[flat] * step_norm2[flat]
+        return stop & np.isfinite(trial_f)
+
+    @instrumented('proximal')
+    def _proximal_step(self, r, grad, prox_control, ws):
+        """
+        The proximal step at r with gradient grad and the current inv_step.
+        With a workspace, the identity_quadratic and output array are reused.
+        """
+        if ws is not None:
+            q = ws.prox_quadratic(self.inv_step, r, grad)
+            out = ws.beta
+        else:
+            q = sq(self.inv_step, r, grad, 0)
+            out = None
+        if prox_control is not None:
+            return self.composite.proximal_step(q, prox_control=prox_control, out=out)
+        return self.composite.proximal_step(q, out=out)
+
+    def _smooth_objective(self, x, eta, mode):
+        """
+        The smooth objective at x, computed from its linear predictor
+        eta if it is not None.
+        """
+        monitor = current_monitor()
+        if monitor is not None:
+            return monitor.call('smooth_objective[%s]' % mode,
+                                self._evaluate_smooth, (x, eta, mode), {})
+        return self._evaluate_smooth(x, eta, mode)
+
+    def _evaluate_smooth(self, x, eta, mode):
+        if eta is not None:
+            return self.composite.smooth_objective_predictor(eta, mode=mode)
+        return self.composite.smooth_objective(x, mode=mode)
+
+    def _extrapolate(self, new, old, w, out=None):
+        """
+        Return ``new + w * (new - old)``, computed in place in out if
+        it is not None.
+        """
+        if out is not None:
+            np.subtract(new, old, out)
+            out *= w
+            out += new
+            return out
+        return new + w * (new - old)
+
+    def _difference(self, a, b, ws):
+        """
+        Return a - b, computed in the workspace's scratch buffer if available.
+        """
+        if ws is not None:
+            return np.subtract(a, b, ws.diff)
+        return a - b
+
+    def _accept(self, beta, ws):
+        """
+        Make beta the current value of self.composite.coefs.
+        """
+        if ws is not None:
+            self.composite.coefs[:] = beta
+        else:
+            self.composite.coefs = beta
+
+
+
+class coordinate_descent(algorithm):
+
+    """
+    Covariance mode coordinate descent for a `simple_problem` with a
+    squared error loss and a `mixed_lasso` penalty made up of 
+    L1_PENALTY, UNPENALIZED, POSITIVE_PART and NONNEGATIVE coordinates.
+
+    The gradient of the loss is kept up to date as coordinates
+    change. Updating it after a change in coordinate j needs the 
+    Gram column :math:`X^TXe_j`, which is computed the first time
+    coordinate j moves away from 0 and cached. Coordinates that stay 
+    at 0 cost only a check of their KKT condition.
+    """
+
+    def __init__(self, composite):
+        from .atoms.mixed_lasso import (mixed_lasso, L1_PENALTY, UNPENALIZED,
+                                        POSITIVE_PART, NONNEGATIVE)
+        from .smooth import affine_smooth
+        from .smooth.quadratic import quadratic
+
+        algorithm.__init__(self, composite)
+
+        loss = composite.smooth_atom
+        penalty = composite.proximal_atom
+        if not (isinstance(loss, affine_smooth) and 
+                isinstance(loss.sm_atom, quadratic) and
+                loss.sm_atom.Q is None):
+            raise ValueError('coordinate descent needs a squared error loss')
+        if not (isinstance(penalty, mixed_lasso) and 
+                np.all(penalty._groups < 0) and
+                penalty.offset is None):
+            raise ValueError('coordinate descent needs a mixed_lasso penalty without groups')
+        if not (penalty.quadratic.isconstant and loss.quadratic.isconstant and
+                composite.quadratic.isconstant):
+            raise ValueError('coordinate descent does not handle quadratic terms')
+
+        self._L1_PENALTY, self._UNPENALIZED = L1_PENALTY, UNPENALIZED
+        self._POSITIVE_PART, self._NONNEGATIVE = POSITIVE_PART, NONNEGATIVE
+        self.penalty_structure = np.asarray(penalty.penalty_structure)
+        self.transform = loss.affine_transform
+        self.gram = {}
+        self._gradient_at = None
+
+    def gram_column(self, j):
+        """
+        Return the Gram column :math:`X^TXe_j`, computing it if needed.
+        """
+        if j not in self.gram:
+            e_j = np.zeros(self.composite.coefs.shape)
+            e_j[j] = 1
+            self.gram[j] = self.transform.adjoint_map(self.transform.linear_map(e_j))
+        return self.gram[j]
+
+    @property
+    def gradient(self):
+        """
+        The gradient of the loss at self.composite.coefs.
+        """
+        coefs = self.composite.coefs
+        if self._gradient_at is None or not np.all(self._gradient_at == coefs):
+            self._gradient = self.composite.smooth_objective(coefs, mode='grad')
+            self._gradient_at = coefs.copy()
+        return self._gradient
+
+    @instrumented_solve
+    def fit(self, max_its=10000, tol=1e-5, coordinates=None, debug=None):
+        """
+        Run coordinate descent from self.composite.coefs, updating them
+        in place. Following glmnet, each pass over all coordinates is
+        followed by passes over the nonzero ones only until these
+        converge.
+
+        Parameters
+        ----------
+        max_its : int
+              the maximum number of passes over the coordinates
+        tol : float
+              a pass has converged when the largest change in any
+              coordinate, scaled by the square root of its curvature, 
+              is below tol
+        coordinates : ndarray
+              A boolean mask or index of the coordinates to update,
+              the others are held fixed. Defaults to all coordinates.
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+        """
+        if debug is not None:
+            self.debug = debug
+
+        coefs = self.composite.coefs
+        if coordinates is None:
+            coordinates = np.arange(coefs.shape[0])
+        else:
+            coordinates = np.asarray(coordinates)
+            if coordinates.dtype == np.bool:
+                coordinates = np.nonzero(coordinates)[0]
+
+        itercount = 0
+        while itercount < max_its:
+            change = self._sweep(coordinates)
+            itercount += 1
+            if self.debug:
+                print "%i    full pass    change: %.2e    gram columns: %d" % (itercount, change, len(self.gram))
+            if change < tol:
+                break
+            while itercount < max_its:
+                change = self._sweep(coordinates[coefs[coordinates] != 0])
+                itercount += 1
+                if change < tol:
+                    break
+
+        self.iterations = itercount
+
+    def _sweep(self, coordinates):
+        """
+        One pass of coordinate descent over coordinates.
+        Returns the largest change, scaled by the square root
+        of the coordinate's curvature.
+        """
+        coefs = self.composite.coefs
+        grad = self.gradient
+        lagrange = self.composite.proximal_atom.lagrange
+        coef = self.composite.smooth_atom.sm_atom.coef
+        structure = self.penalty_structure
+
+        max_change = 0
+        for j in coordinates:
+            beta_j, grad_j, penalty_j = coefs[j], grad[j], structure[j]
+
+            # coordinates at 0 whose KKT conditions hold stay there
+            if beta_j == 0:
+                if penalty_j == self._L1_PENALTY and np.fabs(grad_j) <= lagrange:
+                    continue
+                if penalty_j == self._POSITIVE_PART and grad_j >= -lagrange:
+                    continue
+                if penalty_j == self._NONNEGATIVE and grad_j >= 0:
+                    continue
+                if penalty_j == self._UNPENALIZED and grad_j == 0:
+                    continue
+
+            gram_j = self.gram_column(j)
+            curvature = coef * gram_j[j]
+            if curvature <= 0:
+                continue
+            z = beta_j - grad_j / curvature
+            cut = lagrange / curvature
+            if penalty_j == self._L1_PENALTY:
+                new_j = np.sign(z) * max(np.fabs(z) - cut, 0)
+            elif penalty_j == self._POSITIVE_PART:
+                new_j = max(z - cut, 0)
+            elif penalty_j == self._NONNEGATIVE:
+                new_j = max(z, 0)
+            else:
+                new_j = z
+
+            delta = new_j - beta_j
+            if delta != 0:
+                coefs[j] = new_j
+                grad += (coef * delta) * gram_j
+                max_change = max(max_change, np.fabs(delta) * np.sqrt(curvature))
+        self._gradient_at = coefs.copy()
+        return max_change
+
+class proximal_newton(algorithm):
+
+    r"""
+    Proximal Newton (IRLS-like) iterations for a `simple_problem`
+    whose smooth atom is an `affine_smooth` with an atom that has
+    a diagonal Hessian, such as `logistic_deviance` or
+    `poisson_deviance`. The proximal atom can be any atom.
+
+    With :math:`W` the Hessian of the atom at :math:`X\beta` and
+    :math:`g` the gradient, each iteration minimizes
+
+    .. math::
+
+       g^T(b-\beta) + \frac{1}{2} (b-\beta)^T H (b-\beta) + h(b)
+
+    with FISTA over a working set :math:`S` of coordinates (the nonzero 
+    ones and those a proximal gradient step would make nonzero), the
+    others held at 0, where :math:`H=X_S^TWX_S`. A backtracking line 
+    search along the solution of this problem gives the next iterate. 
+    The inner iterations only involve the :math:`|S| \times |S|` matrix
+    :math:`H`, so for tall problems they are much cheaper than iterations
+    of FISTA on the original problem. The design can be an array, a
+    sparse matrix or a linear operator, of which only the columns
+    :math:`X_S` are formed.
+
+    If the proximal map of the atom moves coordinates held at 0, 
+    e.g. if the atom has an offset, the working set is all coordinates.
+    """
+
+    def __init__(self, composite):
+        algorithm.__init__(self, composite)
+        loss = composite.smooth_atom
+        if not hasattr(loss, 'sm_atom'):
+            raise ValueError('proximal Newton needs a smooth atom of the form affine_smooth(atom, X)')
+        self.loss = loss
+        self.transform = loss.affine_transform
+        self.inner_inv_step = None
+        # is the model restricted to a working set?
+        self.restrict = True
+
+    @property
+    def design(self):
+        """
+        The linear part of the loss's affine transform: an
+        (n,p) array, a csc_matrix or, for other linear operators
+        such as a `normalize` or a `block_design`, an object with
+        the affine_transform API, which is never made dense.
+        """
+        if not hasattr(self, '_design'):
+            t = self.transform
+            if t.noneD or t.diagD:
+                self._design = t
+            elif sparse.issparse(t.linear_operator):
+                self._design = sparse.csc_matrix(t.linear_operator)
+            else:
+                self._design = t.linear_operator
+        return self._design
+
+    def working_columns(self, working_set):
+        """
+        The columns working_set, an integer index, of the design 
+        as an (n,|S|) array or sparse matrix.
+        """
+        X = self.design
+        if sparse.issparse(X) or isinstance(X, np.ndarray):
+            return X[:,working_set]
+        E = np.zeros((self.composite.coefs.shape[0], working_set.shape[0]))
+        E[working_set, np.arange(working_set.shape[0])] = 1
+        return np.asarray(X.linear_map(E))
+
+    def weighted_diagonal(self, weights):
+        """
+        The diagonal of :math:`X^TWX`, or None if the design is 
+        a linear operator other than an array or sparse matrix.
+        """
+        X = self.design
+        if sparse.issparse(X):
+            return np.asarray(X.multiply(X).T * weights).reshape(-1)
+        if isinstance(X, np.ndarray):
+            return np.einsum('i,ij,ij->j', weights, X, X)
+
+    @property
+    def design_lipschitz(self):
+        """
+        The largest eigenvalue of :math:`X^TX`, which bounds the 
+        diagonal of :math:`X^TWX` by its product with the largest weight
+        when the diagonal is not computed.
+        """
+        if not hasattr(self, '_design_lipschitz'):
+            from .affine import power_L
+            self._design_lipschitz = power_L(self.transform)
+        return self._design_lipschitz
+
+    def weighted_gram(self, weights, working_set):
+        """
+        The :math:`|S| \\times |S|` matrix of the quadratic model, 
+        the Gram matrix :math:`X_S^TWX_S` of the columns working_set,
+        an integer index.
+        """
+        XS = self.working_columns(working_set)
+        if sparse.issparse(XS):
+            return (XS.T * sparse.diags(weights) * XS).toarray()
+        return np.dot(XS.T, weights[:,np.newaxis] * XS)
+
+    @instrumented_solve
+    def fit(self,
+            max_its=100,
+            min_its=1,
+            tol=1e-8,
+            inner_tol=1e-8,
+            inner_max_its=5000,
+            sufficient_decrease=1.e-4,
+            backtrack_factor=0.5,
+            max_backtrack=30,
+            return_objective_hist=True,
+            debug=None):
+
+        """
+        Fit the problem with proximal Newton iterations.
+
+        Parameters
+        ----------
+        max_its : int
+              the maximum number of (outer) Newton iterations
+        min_its : int
+              the minimum number of Newton iterations
+        tol : float
+              stop when the relative decrease in the objective is below tol
+        inner_tol : float
+              tolerance passed to FISTA for the quadratic models
+        inner_max_its : int
+              maximum number of FISTA iterations for the quadratic models
+        sufficient_decrease : float
+              Armijo constant of the line search
+        backtrack_factor : float
+              the step length is multiplied by this factor when
+              the line search fails
+        max_backtrack : int
+              give up after this many failed line search steps
+        return_objective_hist : bool
+              Return the sequence of objective values?
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+
+        Notes
+        -----
+        Within a `regreg.instrumentation.monitor` the monitor's
+        callback is called after each Newton iteration, as well
+        as after each iteration of the FISTA fits of the quadratic models.
+
+        Returns
+        -------
+
+        objective_hist : ndarray
+              A vector of objective values. Only return if return_objective_hist is True.
+        """
+        from .smooth.quadratic import quadratic
+        from .problems.simple import working_set_problem, WorkingSetError
+
+        if debug is not None:
+            self.debug = debug
+
+        composite = self.composite
+        loss = self.loss
+        monitor = current_monitor()
+        beta = composite.coefs.copy()
+        current_obj = composite.objective(beta)
+        objective_hist = [current_obj]
+
+        itercount = 0
+        while itercount < max_its:
+            eta = loss.linear_predictor(beta)
+            grad = loss.smooth_objective_predictor(eta, mode='grad')
+            weights = loss.sm_atom.hessian_diag(eta)
+
+            # working set: nonzero coordinates and those
+            # a proximal gradient step would make nonzero
+            diag = self.weighted_diagonal(weights)
+            if diag is not None:
+                step = np.max(diag)
+            else:
+                step = np.max(weights) * self.design_lipschitz
+            if step <= 0:
+                step = 1.
+            prox_grad = composite.proximal(sq(step, beta, grad, 0))
+            if self.restrict:
+                working_set = np.nonzero((beta != 0) | (prox_grad != 0))[0]
+            else:
+                working_set = np.arange(beta.shape[0])
+            if working_set.shape[0] == 0:
+                break
+
+            # the quadratic model on the working set plus the penalty
+            H = self.weighted_gram(weights, working_set)
+            model = quadratic(working_set.shape, Q=H, offset=beta[working_set],
+                              quadratic=sq(0, 0, grad[working_set], 0))
+            subproblem = working_set_problem(model, composite.proximal_atom, working_set)
+            subproblem.coefs[:] = beta[working_set]
+            inner = FISTA(subproblem)
+            inner.inv_step = self.inner_inv_step
+            try:
+                inner.fit(tol=inner_tol, max_its=inner_max_its, 
+                          start_inv_step=step,
+                          return_objective_hist=False)
+            except WorkingSetError:
+                if not self.restrict:
+                    raise
+                # the proximal map moves coordinates outside the working set
+                self.restrict = False
+                continue
+            self.inner_inv_step = inner.inv_step
+            direction = np.zeros(beta.shape)
+            direction[working_set] = subproblem.coefs - beta[working_set]
+
+            # backtracking line search
+            decrease = (np.dot(grad.reshape(-1), direction.reshape(-1)) + 
+                        composite.nonsmooth_objective(beta + direction) - 
+                        composite.nonsmooth_objective(beta))
+            if decrease >= 0:
+                if self.debug:
+                    print "%i    model does not decrease the objective" % itercount
+                break
+
+            t = 1.
+            for _ in range(max_backtrack):
+                trial = beta + t * direction
+                trial_obj = composite.objective(trial)
+                if trial_obj <= current_obj + sufficient_decrease * t * decrease:
+                    break
+                t *= backtrack_factor
+            else:
+                warnings.warn('line search failed in proximal Newton')
+                break
+
+            obj_change = np.fabs(current_obj - trial_obj)
+            obj_rel_change = obj_change / np.max([np.fabs(current_obj), 1.])
+            if self.debug:
+                print "%i    obj: %.6e    step: %.2e    working set: %d    rel_obj_change: %.2e" % (itercount, trial_obj, t, working_set.shape[0], obj_rel_change)
+
+            beta = trial
+            current_obj = trial_obj
+            objective_hist.append(current_obj)
+            if monitor is not None:
+                monitor.iteration(self, itercount, current_obj)
+            itercount += 1
+            if itercount >= min_its and obj_rel_change < tol:
+                break
+
+        composite.coefs[:] = beta
+        self.iterations = itercount
+        if return_objective_hist:
+            return np.array(objective_hist)
+
+class variance_reduced(algorithm):
+
+    """
+    Base class for variance reduced stochastic proximal gradient
+    methods on a `simple_problem` whose smooth atom is an 
+    `affine_smooth` of an atom that is a sum over the entries of
+    its argument, e.g. squared error, logistic or Poisson deviance. 
+    Each step reads a minibatch of rows of the design and
+    uses the proximal map of the problem for the nonsmooth part.
+
+    The iterations are grouped in epochs of nrows / batch_size
+    steps, each with a uniform sample of rows. Every `checkpoint` epochs
+    the full gradient is computed and the fit stops when the
+    proximal gradient step from the current point with this
+    gradient is small.
+    """
+
+    def __init__(self, composite, batch_size=100, step=None, seed=None):
+        algorithm.__init__(self, composite)
+        loss = composite.smooth_atom
+        if not hasattr(loss, 'sm_atom'):
+            raise ValueError('%s needs a smooth atom of the form affine_smooth(atom, X)' % self.__class__.__name__)
+        self.loss = loss
+        self.nrows = loss.affine_transform.output_shape[0]
+        self.batch_size = min(batch_size, self.nrows)
+        self.step = step
+        self.random_state = np.random.RandomState(seed)
+
+    def full_derivatives(self, beta):
+        """
+        The smooth objective at beta, the gradient of self.loss.sm_atom
+        at the linear predictor (one derivative per row) and the
+        gradient of the smooth objective.
+        """
+        eta = self.loss.linear_predictor(beta)
+        value, derivatives = self.loss.sm_atom.smooth_objective(eta, mode='both')
+        grad = self.loss.affine_transform.adjoint_map(derivatives).reshape(beta.shape)
+        return value, derivatives, grad
+
+    def estimate_lipschitz(self, beta, power_its=10):
+        """
+        Estimate the Lipschitz constant of the gradient of the smooth
+        objective and the largest Lipschitz constant of the gradient of
+        nrows times one of its terms, using the curvature at beta.
+        """
+        loss = self.loss
+        transform = loss.affine_transform
+        curvature = loss.sm_atom.hessian_diag(loss.linear_predictor(beta))
+
+        X, _ = loss.design_rows(slice(None))
+        if sparse.issparse(X):
+            row_norms = np.asarray(X.multiply(X).sum(1)).reshape(-1)
+        else:
+            row_norms = np.einsum('ij,ij->i', X, X)
+        L_max = self.nrows * np.max(curvature * row_norms)
+
+        v = self.random_state.standard_normal(beta.shape)
+        L = 0
+        for _ in range(power_its):
+            v /= np.linalg.norm(v)
+            v = transform.adjoint_map(curvature * transform.linear_map(v)).reshape(beta.shape)
+            L = np.linalg.norm(v)
+        return L, L_max
+
+    def default_step(self, beta):
+        """
+        The step size used if self.step is None: 1/(3 L_b) where
+        L_b interpolates between the Lipschitz constant of the full
+        gradient and the largest one of the rows, depending on the size
+        of the minibatch.
+        """
+        L, L_max = self.estimate_lipschitz(beta)
+        n, b = self.nrows, self.batch_size
+        if n == 1:
+            return 1. / (3 * L_max)
+        L_b = (n * (b - 1.) / (b * (n - 1.))) * L + ((n - b) / (b * (n - 1.))) * L_max
+        return 1. / (3 * L_b)
+
+    def minibatches(self):
+        """
+        Row indices of the minibatches in one epoch: nrows / batch_size
+        minibatches, each the distinct rows of a uniform sample
+        of batch_size rows, in increasing order.
+        """
+        for _ in range(int(np.ceil(self.nrows / float(self.batch_size)))):
+            yield np.unique(self.random_state.randint(0, self.nrows, self.batch_size))
+
+    def minibatch_derivatives(self, beta, rows):
+        """
+        The rows of the design in rows and the derivatives of 
+        the terms of self.loss.sm_atom in rows at beta.
+        """
+        X, offset = self.loss.design_rows(rows)
+        eta = X.dot(beta)
+        if offset is not None:
+            eta += offset
+        return X, self.loss.sm_atom.subset_smooth_objective(eta, rows, mode='grad')
+
+    def checkpoint(self, beta, value, grad, step):
+        """
+        The objective value and the relative size of the proximal
+        gradient step with the full gradient.
+        """
+        objective = value + self.composite.nonsmooth_objective(beta)
+        prox_grad = self.composite.proximal(sq(1. / step, beta, grad, 0))
+        residual = np.linalg.norm(prox_grad - beta) / max(np.linalg.norm(beta), 1.)
+        return objective, residual
+
+    @instrumented_solve
+    def fit(self, max_epochs=100, tol=1.e-6, checkpoint=1,
+            return_objective_hist=True, debug=None):
+        """
+        Fit the problem.
+
+        Parameters
+        ----------
+        max_epochs : int
+              the maximum number of passes through the data
+        tol : float
+              stop when the proximal gradient step with the full gradient,
+              relative to the norm of the coefficients, is below tol
+        checkpoint : int
+              compute the full gradient every `checkpoint` epochs
+        return_objective_hist : bool
+              Return the objective values at the checkpoints?
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+
+        Notes
+        -----
+        Within a `regreg.instrumentation.monitor` the monitor's
+        callback is called after each epoch, with the objective
+        value None between checkpoints.
+
+        Returns
+        -------
+
+        objective_hist : ndarray
+              Objective values at the checkpoints. Only returned if 
+              return_objective_hist is True.
+        """
+        if debug is not None:
+            self.debug = debug
+
+        beta = self.composite.coefs.copy()
+        step = self.step
+        if step is None:
+            step = self.default_step(beta)
+        self.step_size = step
+
+        value, derivatives, grad = self.full_derivatives(beta)
+        objective, residual = self.checkpoint(beta, value, grad, step)
+        objective_hist = [objective]
+        self.residuals = [residual]
+
+        monitor = current_monitor()
+        epoch = 0
+        while epoch < max_epochs and residual > tol:
+            beta = self.epoch(beta, derivatives, grad, step)
+            epoch += 1
+            objective = None
+            if epoch % checkpoint == 0 or epoch == max_epochs:
+                value, derivatives, grad = self.full_derivatives(beta)
+                objective, residual = self.checkpoint(beta, value, grad, step)
+                objective_hist.append(objective)
+                self.residuals.append(residual)
+                if self.debug:
+                    print "%i    obj: %.6e    residual: %.2e" % (epoch, objective, residual)
+            elif self.needs_full_gradient:
+                value, derivatives, grad = self.full_derivatives(beta)
+            if monitor is not None:
+                monitor.iteration(self, epoch - 1, objective, 1. / step)
+
+        self.composite.coefs[:] = beta
+        self.epochs = epoch
+        if return_objective_hist:
+            return np.array(objective_hist)
+
+    def epoch(self, beta, derivatives, grad, step):
+        """
+        One pass through the data, starting from beta with 
+        the derivatives and gradient last computed.
+        """
+        raise NotImplementedError
+
+class saga(variance_reduced):
+
+    """
+    Proximal SAGA with minibatches. The derivatives of the terms
+    of the loss at the rows last sampled are kept in a table, one
+    number per row, and refreshed at each checkpoint.
+    """
+
+    needs_full_gradient = False
+
+    def epoch(self, beta, derivatives, grad, step):
+        # derivatives and grad are updated in place, so that the table
+        # carries over between epochs when there is no checkpoint
+        for rows in self.minibatches():
+            X, minibatch = self.minibatch_derivatives(beta, rows)
+            change = X.T.dot(minibatch - derivatives[rows]).reshape(beta.shape)
+            estimate = grad + (self.nrows / float(len(rows))) * change
+            derivatives[rows] = minibatch
+            grad += change
+            beta = self.composite.proximal(sq(1. / step, beta, estimate, 0))
+        return beta
+
+class svrg(variance_reduced):
+
+    """
+    Proximal SVRG with minibatches. The full gradient at a snapshot,
+    taken at the start of each epoch, corrects the minibatch 
+    gradients.
+    """
+
+    needs_full_gradient = True
 
+    def epoch(self, beta, derivatives, grad, step):
+        # beta is the snapshot, derivatives and grad are computed there
+        for rows in self.minibatches():
+            X, minibatch = self.minibatch_derivatives(beta, rows)
+            change = X.T.dot(minibatch - derivatives[rows]).reshape(beta.shape)
+            estimate = grad + (self.nrows / float(len(rows))) * change
+            beta = self.composite.proximal(sq(1. / step, beta, estimate, 0))
+        return beta
@@ -7,7 +7,8 @@ A collection of commonly used RegReg functions and objects
 from .atoms import affine_atom as linear_atom
 from .atoms.seminorms import (l1norm, l2norm, supnorm, 
                    positive_part, constrained_max,
-                   constrained_positive_part, max_positive_part)
+                   constrained_positive_part, max_positive_part,
+                   sorted_l1norm, sorted_l1norm_dual)
 from .atoms.cones import (nonnegative, nonpositive,
                    zero, zero_constraint, 
                    l1_epigraph, l1_epigraph_polar,
@@ -21,6 +22,7 @@ from .atoms.svd_norms import (nuclear_norm, operator_norm,
 from .atoms.linear_constraints import (projection, projection_complement)
 from .atoms.mixed_lasso import mixed_lasso, mixed_lasso_conjugate
 from .atoms.group_lasso import group_lasso, group_lasso_dual
+from .atoms.tv1d import tv1d, tv1d_dual
 from .atoms.weighted_atoms import (l1norm as weighted_l1norm,
                                    supnorm as weighted_supnorm)
 
@@ -29,6 +31,8 @@ from .atoms.weighted_atoms import (l1norm as weighted_l1norm,
 from affine import (identity, selector, affine_transform, normalize, linear_transform, composition as affine_composition, affine_sum,
                     power_L)
 from affine.factored_matrix import (factored_matrix, compute_iterative_svd, soft_threshold_svd)
+from affine.threaded import threaded_matvec
+from affine.out_of_core import block_design
 
 # Smooth imports
 
@@ -40,7 +44,9 @@ from smooth.quadratic import quadratic, cholesky, signal_approximator, squared_e
 from problems.separable import separable, separable_problem
 from problems.simple import simple_problem, gengrad, nesta, tfocs
 from problems.container import container
-from algorithms import FISTA
+from algorithms import (FISTA, coordinate_descent, proximal_newton, saga, svrg,
+                        backtracking, barzilai_borwein, scheinberg_goldfarb_bai,
+                        adaptive_restart)
 
 from problems.conjugate import conjugate
 from problems.composite import (composite, nonsmooth as nonsmooth_composite,
@@ -50,5 +56,7 @@ from problems.dual_problem import dual_problem
 
 from identity_quadratic import identity_quadratic
 
-from paths import lasso, nesta as nesta_path, UNPENALIZED, L1_PENALTY, POSITIVE_PART, NONNEGATIVE
+from instrumentation import monitor
+
+from paths import lasso, cv_lasso, slope, nesta as nesta_path, UNPENALIZED, L1_PENALTY, POSITIVE_PART, NONNEGATIVE
 
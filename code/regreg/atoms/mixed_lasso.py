@@ -180,6 +180,31 @@ class mixed_lasso(nonsmooth):
                                  int(check_feasibility))
         return v * self.lagrange
 
+    def dual_seminorm(self, x):
+        r"""
+        The dual seminorm of x, the smallest :math:`t` such that
+        :math:`x^T\beta \leq t \cdot h(\beta)` for all :math:`\beta`,
+        where :math:`h` is the penalty with lagrange 1. This is
+        infinite if x is nonzero on an unpenalized coordinate or
+        positive on a nonnegative one.
+        """
+        x = np.asarray(x)
+        if (np.any(x[self._unpenalized] != 0) or 
+            np.any(x[self._nonnegative] > 0)):
+            return np.inf
+        value = 0.
+        if self._l1_penalty.shape[0]:
+            value = max(value, np.fabs(x[self._l1_penalty]).max())
+        if self._positive_part.shape[0]:
+            value = max(value, x[self._positive_part].max())
+        grouped = self._groups >= 0
+        if np.any(grouped):
+            norms = np.sqrt(np.bincount(self._groups[grouped], 
+                                        weights=x[grouped]**2,
+                                        minlength=self._weight_array.shape[0]))
+            value = max(value, (norms / self._weight_array).max())
+        return value
+
     def proximal(self, proxq, prox_control=None):
         r"""
         The proximal operator. If the atom is in
@@ -329,11 +354,34 @@ class mixed_lasso_conjugate(mixed_lasso):
 
     def nonsmooth_objective(self, x, check_feasibility=False):
         x_offset = self.apply_offset(x)
-        if check_feasibility:
-            v = self.constraint(x_offset, self.bound)
+        v = 0
+        if (check_feasibility and 
+            self.seminorm(x_offset) > self.bound * (1 + self.tol)):
+            v = np.inf
         v += self.quadratic.objective(x, 'func')
         return v
 
+    def dual_seminorm(self, x):
+        r"""
+        The dual seminorm of x, the support function of the set 
+        the proximal map projects onto, divided by the bound. This is the
+        seminorm of the conjugate `mixed_lasso` with lagrange 1,
+        infinite if x is negative on a nonnegative or positive part
+        coordinate, where the set is not bounded below.
+        """
+        x = np.asarray(x, np.float)
+        if (np.any(x[self._nonnegative] < 0) or
+            np.any(x[self._positive_part] < 0)):
+            return np.inf
+        return seminorm_mixed_lasso(x,
+                                    self._l1_penalty,
+                                    self._unpenalized,
+                                    self._positive_part,
+                                    self._nonnegative,
+                                    self._groups, 
+                                    self._weight_array,
+                                    0)
+
     def seminorm(self, x, lagrange=1, check_feasibility=False):
         x_offset = self.apply_offset(x)
         v = seminorm_mixed_lasso_conjugate(x_offset,
@@ -374,6 +422,7 @@ class mixed_lasso_conjugate(mixed_lasso):
                                   self._l1_penalty,
                                   self._unpenalized,
                                   self._positive_part,
+                                  self._nonnegative,
                                   self._groups, 
                                   self._weight_array)
 
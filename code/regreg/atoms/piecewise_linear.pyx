@@ -7,6 +7,22 @@ ctypedef np.float_t DTYPE_float_t
 DTYPE_int = np.int
 ctypedef np.int_t DTYPE_int_t
 
+# how the solutions are found: 'condat', in expected linear time,
+# or 'sort', sorting the knots
+method = 'condat'
+
+def set_method(new_method):
+    """
+    Set how `find_solution_piecewise_linear` and
+    `find_solution_piecewise_linear_c`, hence the l1 ball and
+    epigraph projections, find their solutions: 'condat' or 'sort'.
+    Returns the previous method.
+    """
+    global method
+    if new_method not in ['condat', 'sort']:
+        raise ValueError("method should be one of ['condat', 'sort']")
+    old_method, method = method, new_method
+    return old_method
 
 def find_solution_piecewise_linear(DTYPE_float_t b,
                                    DTYPE_float_t slope,
@@ -35,6 +51,52 @@ def find_solution_piecewise_linear(DTYPE_float_t b,
     part of the epigraph. If this
     returns np.inf, one is already within the epigraph.
 
+    The solution is found by `find_solution_piecewise_linear_condat`
+    or `find_solution_piecewise_linear_sort`, see `set_method`.
+    """
+    if method == 'sort':
+        return find_solution_piecewise_linear_sort(b, slope, norms, weights)
+    return find_solution_piecewise_linear_condat(b, slope, norms, weights)
+
+def find_solution_piecewise_linear_c(DTYPE_float_t b,
+                                     DTYPE_float_t slope,
+                                     np.ndarray[DTYPE_float_t, ndim=1] norms):
+    """
+    Given a piecewise linear function of the form
+
+       f(t) = ((t < norms[i]) * (norms[i] - t)).sum()
+
+    Return the t>=0 such that f(t)=slope*t+b, if one exists. 
+    Else, it returns np.inf.
+
+    That is, it returns
+
+    inf (t >= 0: f(t) >= slope*t + b)
+
+    This function is used in projecting onto 
+    l1 balls of size s and epigraphs. The ball projection uses slope=0,
+    b=s,
+    and if this returns np.inf, one is already within the ball.
+
+    The epigraph projection uses slope=1 and b=the norm
+    part of the epigraph. If this
+    returns np.inf, one is already within the epigraph.
+
+    The solution is found by `find_solution_piecewise_linear_condat`
+    or `find_solution_piecewise_linear_c_sort`, see `set_method`.
+    """
+    if method == 'sort':
+        return find_solution_piecewise_linear_c_sort(b, slope, norms)
+    return find_solution_piecewise_linear_condat(b, slope, norms)
+
+
+def find_solution_piecewise_linear_sort(DTYPE_float_t b,
+                                        DTYPE_float_t slope,
+                                        np.ndarray[DTYPE_float_t, ndim=1] norms,
+                                        np.ndarray[DTYPE_float_t, ndim=1] weights):
+    """
+    Find the solution of `find_solution_piecewise_linear` by
+    sorting the knots norms / weights, in O(q log q) operations.
     """
 
     cdef int q = norms.shape[0]
@@ -56,6 +118,10 @@ def find_solution_piecewise_linear(DTYPE_float_t b,
     # if f(0) < b, then the set is empty
     # \inf of empty set is +\infty
     
+    # the solution is past the largest knot, where f is 0
+    if slope < 0 and curV > b:
+        return b / slope
+
     for j in range(q-1):
         slope -= weights[order[q-j-1]]**2
         nextX = knots[order[q-j-2]]
@@ -77,30 +143,12 @@ def find_solution_piecewise_linear(DTYPE_float_t b,
         solution = (b - intercept) / slope
     return solution
 
-def find_solution_piecewise_linear_c(DTYPE_float_t b,
-                                   DTYPE_float_t slope,
-                                   np.ndarray[DTYPE_float_t, ndim=1] norms):
+def find_solution_piecewise_linear_c_sort(DTYPE_float_t b,
+                                          DTYPE_float_t slope,
+                                          np.ndarray[DTYPE_float_t, ndim=1] norms):
     """
-    Given a piecewise linear function of the form
-
-       f(t) = ((t < norms[i]) * (norms[i] - t)).sum()
-
-    Return the t>=0 such that f(t)=slope*t+b, if one exists. 
-    Else, it returns np.inf.
-
-    That is, it returns
-
-    inf (t >= 0: f(t) >= slope*t + b)
-
-    This function is used in projecting onto 
-    l1 balls of size s and epigraphs. The ball projection uses slope=0,
-    b=s,
-    and if this returns np.inf, one is already within the ball.
-
-    The epigraph projection uses slope=1 and b=the norm
-    part of the epigraph. If this
-    returns np.inf, one is already within the epigraph.
-
+    Find the solution of `find_solution_piecewise_linear_c` by
+    sorting the knots norms, in O(q log q) operations.
     """
 
     cdef int q = norms.shape[0]
@@ -122,6 +170,10 @@ def find_solution_piecewise_linear_c(DTYPE_float_t b,
     # if f(0) < b, then the set is empty
     # \inf of empty set is +\infty
     
+    # the solution is past the largest knot, where f is 0
+    if slope < 0 and curV > b:
+        return b / slope
+
     for j in range(q-1):
         slope -= 1.
         nextX = knots[order[q-j-2]]
@@ -143,3 +195,119 @@ def find_solution_piecewise_linear_c(DTYPE_float_t b,
         solution = (b - intercept) / slope
     return solution
 
+def find_solution_piecewise_linear_condat(DTYPE_float_t b,
+                                          DTYPE_float_t slope,
+                                          np.ndarray[DTYPE_float_t, ndim=1] norms,
+                                          np.ndarray[DTYPE_float_t, ndim=1] weights=None):
+    """
+    Find the solution of `find_solution_piecewise_linear`, or of
+    `find_solution_piecewise_linear_c` if weights is None, without
+    sorting, in expected O(q) operations.
+
+    For any set A of knots, the solution of
+
+       (weights[A] * (norms[A] - weights[A] * t)).sum() = slope*t + b
+
+    is at most the solution t*, with equality if A is the set of knots
+    norms / weights above t*. So t* is the largest of these solutions,
+    found as in Algorithm 1 of
+
+    title = {Fast projection onto the simplex and the l1 ball}
+    author = {Condat, Laurent}
+
+    with a weight for each knot and a linear piece: the knots are
+    scanned once, keeping a set A whose solution increases, then the
+    knots below the current solution are removed from A until
+    none are left. Knots with nonpositive weights are ignored.
+    """
+
+    cdef int q = norms.shape[0]
+    cdef int weighted = weights is not None
+    cdef np.ndarray[DTYPE_int_t, ndim=1] active = np.empty(q, np.int)
+    cdef np.ndarray[DTYPE_int_t, ndim=1] waiting = np.empty(q, np.int)
+    cdef int nactive = 0, nwaiting = 0, size, i, k
+    cdef double w = 1., n, total = 0, sum_wn = 0, sum_ww = 0
+    cdef double solution = 0, single, candidate
+
+    for i in range(q):
+        if weighted:
+            total += weights[i] * norms[i]
+        else:
+            total += norms[i]
+    if total < b:
+        return np.inf
+
+    # one pass, a knot above the solution of A is added to A
+    # unless it has a larger solution on its own
+
+    for i in range(q):
+        if weighted:
+            w = weights[i]
+            if w <= 0:
+                continue
+        n = norms[i]
+        if nactive == 0:
+            active[0] = i
+            nactive = 1
+            sum_wn = w * n
+            sum_ww = w * w
+            solution = (sum_wn - b) / (sum_ww + slope)
+        elif n > w * solution:
+            single = (w * n - b) / (w * w + slope)
+            candidate = (sum_wn + w * n - b) / (sum_ww + w * w + slope)
+            if candidate > single:
+                active[nactive] = i
+                nactive += 1
+                sum_wn += w * n
+                sum_ww += w * w
+                solution = candidate
+            else:
+                for k in range(nactive):
+                    waiting[nwaiting] = active[k]
+                    nwaiting += 1
+                active[0] = i
+                nactive = 1
+                sum_wn = w * n
+                sum_ww = w * w
+                solution = single
+
+    # the knots set aside may still be above the solution
+
+    for k in range(nwaiting):
+        i = waiting[k]
+        if weighted:
+            w = weights[i]
+        n = norms[i]
+        if n > w * solution:
+            active[nactive] = i
+            nactive += 1
+            sum_wn += w * n
+            sum_ww += w * w
+            solution = (sum_wn - b) / (sum_ww + slope)
+
+    # remove the knots below the solution, which increases it
+
+    size = -1
+    while size != nactive and nactive > 0:
+        size = nactive
+        nactive = 0
+        for k in range(size):
+            i = active[k]
+            if weighted:
+                w = weights[i]
+            n = norms[i]
+            if n < w * solution:
+                sum_wn -= w * n
+                sum_ww -= w * w
+                if sum_ww + slope > 0:
+                    solution = (sum_wn - b) / (sum_ww + slope)
+            else:
+                active[nactive] = i
+                nactive += 1
+
+    # the solution is past all the knots, where f is 0
+    if nactive == 0:
+        if slope > 0:
+            return -b / slope
+        return 0.
+    return solution
@@ -9,6 +9,12 @@ Implements (expected) linear time projections onto $\ell_1$ ball as described in
 title = {Efficient projections onto the l1-ball for learning in high dimensions}
 author = {Duchi, John and Shalev-Shwartz, Shai and Singer, Yoram and Chandra,
 Tushar}
+
+and
+title = {Fast projection onto the simplex and the l1 ball}
+author = {Condat, Laurent}
+
+the threshold being found as set by `piecewise_linear.set_method`.
 """
 
 DTYPE_float = np.float
@@ -18,9 +24,9 @@ ctypedef np.int_t DTYPE_int_t
 
 def projl1(np.ndarray[DTYPE_float_t, ndim=1]  x, 
            DTYPE_float_t bound=1.):
-
-    cdef np.ndarray[DTYPE_float_t, ndim=1] sorted_x = np.sort(np.fabs(x))
-    cdef int p = x.shape[0]
+    """
+    Project x onto the l1 ball of radius bound.
+    """
     cdef double cut = find_solution_piecewise_linear_c(bound, 0, np.fabs(x))
 
     if cut < np.inf:
@@ -28,6 +34,45 @@ def projl1(np.ndarray[DTYPE_float_t, ndim=1]  x,
     else:
         return x
 
+def projl1_weighted(np.ndarray[DTYPE_float_t, ndim=1] x, 
+                    DTYPE_float_t bound,
+                    np.ndarray[DTYPE_float_t, ndim=1] weights):
+    """
+    Project x onto the weighted l1 ball
+
+       np.fabs(weights * x).sum() <= bound
+
+    for weights >= 0, an infinite weight forcing its
+    coordinate to be 0. The projection soft-thresholds
+    each np.fabs(x[i]) at weights[i] * cut.
+    """
+    cdef int p = x.shape[0]
+    cdef np.ndarray[DTYPE_float_t, ndim=1] result = x.copy()
+    cdef double cut, xi, wi, threshold
+    cdef double inf = np.inf
+    cdef int i
+
+    result[~np.isfinite(weights)] = 0
+    penalized = (weights > 0) * (weights < inf)
+    if not penalized.sum():
+        return result
+    cut = find_solution_piecewise_linear(bound, 0, np.fabs(x[penalized]),
+                                         weights[penalized])
+
+    if cut < np.inf:
+        for i in range(p):
+            wi = weights[i]
+            if wi > 0 and wi < inf:
+                xi = x[i]
+                threshold = wi * cut
+                if xi > threshold:
+                    result[i] = xi - threshold
+                elif xi < -threshold:
+                    result[i] = xi + threshold
+                else:
+                    result[i] = 0.
+    return result
+
 cdef soft_threshold(np.ndarray[DTYPE_float_t, ndim=1] x,
                     DTYPE_float_t lagrange):
 
@@ -63,8 +108,6 @@ def projl1_epigraph(np.ndarray[DTYPE_float_t, ndim=1] center):
     cdef np.ndarray[DTYPE_float_t, ndim=1] result = np.zeros_like(center)
     cdef DTYPE_float_t norm = center[0]
     cdef double cut = find_solution_piecewise_linear_c(norm, 1, np.fabs(x))
-    cdef double cut2 = find_solution_piecewise_linear(norm, 1, np.fabs(x),
-                                                      np.ones_like(x))
 
     if cut < np.inf:
         result[0] = norm + cut
@@ -74,3 +117,67 @@ def projl1_epigraph(np.ndarray[DTYPE_float_t, ndim=1] center):
     return result
 
 
+
+def prox_sorted_l1(np.ndarray[DTYPE_float_t, ndim=1] x,
+                   np.ndarray[DTYPE_float_t, ndim=1] thresholds):
+    """
+    Return the minimizer of
+
+       0.5 * ((x - b)**2).sum() + (thresholds * np.sort(np.fabs(b))[::-1]).sum()
+
+    for thresholds nonincreasing and nonnegative, the proximal map
+    of the sorted l1 norm. After sorting np.fabs(x) in decreasing
+    order, this is a nonincreasing fit to np.fabs(x) - thresholds, 
+    found with a stack of blocks that are merged while their averages
+    increase (pool adjacent violators), clipped at 0. 
+
+    Algorithm 3 of
+    title = {SLOPE -- adaptive variable selection via convex optimization}
+    author = {Bogdan, Malgorzata and van den Berg, Ewout and Sabatti,
+    Chiara and Su, Weijie and Candes, Emmanuel}
+    """
+    cdef int p = x.shape[0]
+    cdef np.ndarray[DTYPE_float_t, ndim=1] absx = np.fabs(x)
+    cdef np.ndarray[DTYPE_int_t, ndim=1] order = np.argsort(-absx).astype(np.int)
+    cdef np.ndarray[DTYPE_float_t, ndim=1] fit = prox_sorted_l1_sorted(absx[order], thresholds)
+    cdef np.ndarray[DTYPE_float_t, ndim=1] result = np.empty(p)
+
+    result[order] = fit
+    return np.where(x >= 0, result, -result)
+
+def prox_sorted_l1_sorted(np.ndarray[DTYPE_float_t, ndim=1] sorted_absx,
+                          np.ndarray[DTYPE_float_t, ndim=1] thresholds):
+    """
+    The nonincreasing fit to sorted_absx - thresholds, clipped at 0,
+    for sorted_absx nonnegative and nonincreasing: the absolute values 
+    of `prox_sorted_l1` in the order of sorted_absx, so that 
+    callers evaluating it for many thresholds sort only once.
+    """
+    cdef int p = sorted_absx.shape[0]
+    cdef np.ndarray[DTYPE_float_t, ndim=1] v = sorted_absx - thresholds
+    cdef np.ndarray[DTYPE_float_t, ndim=1] result = np.empty(p)
+
+    cdef np.ndarray[DTYPE_int_t, ndim=1] start = np.empty(p, np.int)
+    cdef np.ndarray[DTYPE_int_t, ndim=1] end = np.empty(p, np.int)
+    cdef np.ndarray[DTYPE_float_t, ndim=1] total = np.empty(p)
+    cdef int i, j, top = -1
+    cdef double value
+
+    for i in range(p):
+        top += 1
+        start[top] = i
+        end[top] = i
+        total[top] = v[i]
+        while (top > 0 and total[top] * (end[top-1] - start[top-1] + 1)
+               >= total[top-1] * (end[top] - start[top] + 1)):
+            total[top-1] += total[top]
+            end[top-1] = end[top]
+            top -= 1
+
+    for j in range(top+1):
+        value = total[j] / (end[j] - start[j] + 1)
+        if value < 0:
+            value = 0
+        for i in range(start[j], end[j]+1):
+            result[i] = value
+    return result
@@ -9,7 +9,7 @@ from ..objdoctemplates import objective_doc_templater
 from ..doctemplates import (doc_template_user, doc_template_provider)
 from ..problems.composite import smooth_conjugate
 from ..atoms import atom, _work_out_conjugate, affine_atom
-from .projl1_cython import projl1
+from .projl1_cython import projl1, prox_sorted_l1, prox_sorted_l1_sorted
 from .piecewise_linear import find_solution_piecewise_linear_c
 
 @objective_doc_templater()
@@ -183,6 +183,20 @@ class seminorm(atom):
         return self._conjugate
     conjugate = property(get_conjugate)
 
+    def dual_seminorm(self, x):
+        r"""
+        The dual seminorm of x, the smallest :math:`t` such that
+        :math:`x^T\beta \leq t \cdot h(\beta)` for all :math:`\beta`,
+        where :math:`h` is the seminorm with lagrange 1. Computed
+        as the seminorm of the conjugate atom.
+
+        >>> penalty = l1norm(3, lagrange=3.4)
+        >>> penalty.dual_seminorm(np.array([1., -2., 0.5]))
+        2.0
+
+        """
+        return self.conjugate.seminorm(x, lagrange=1., check_feasibility=True)
+
     def get_lagrange(self):
         """
         Get method of the lagrange property.
@@ -242,9 +256,11 @@ class seminorm(atom):
             raise AttributeError("atom is in bound mode")
     bound = property(get_bound, set_bound)
 
+    proximal_writes_out = True
+
     #XXX why does this docstring not get formatted?
     @doc_template_provider
-    def proximal(self, proxq, prox_control=None):
+    def proximal(self, proxq, prox_control=None, out=None):
         r"""
         The proximal operator. If the atom is in
         Lagrange mode, this has the form
@@ -268,12 +284,15 @@ class seminorm(atom):
            v^{\lambda}(x) = \text{argmin}_{v \in \mathbb{R}^p} \frac{L}{2}
            \|x-v\|^2_2 + \langle v, \eta \rangle \text{s.t.} \   h(v+\alpha) \leq \lambda
 
+        If `out` is not None, the minimizer is written into it
+        and `out` is returned.
+
         """
         offset, totalq = (self.quadratic + proxq).recenter(self.offset)
         if totalq.coef == 0:
             raise ValueError('lipschitz + quadratic coef must be positive')
 
-        prox_arg = -totalq.linear_term / totalq.coef
+        prox_arg = np.divide(totalq.linear_term, -totalq.coef)
 
         debug = False
         if debug:
@@ -291,6 +310,13 @@ class seminorm(atom):
                                      lipschitz=totalq.coef, 
                                      lagrange=self.lagrange)
 
+        if out is not None:
+            if offset is None:
+                out[:] = eta
+            else:
+                np.subtract(eta, offset, out)
+            return out
+
         if offset is None:
             return eta
         else:
@@ -440,7 +466,11 @@ class l1norm(seminorm):
     @doc_template_user
     def lagrange_prox(self, arg,  lipschitz=1, lagrange=None):
         lagrange = seminorm.lagrange_prox(self, arg, lipschitz, lagrange)
-        return np.sign(arg) * np.maximum(np.fabs(arg)-lagrange/lipschitz, 0)
+        # soft-threshold with a single temporary
+        v = np.fabs(arg)
+        v -= lagrange / lipschitz
+        np.maximum(v, 0, v)
+        return np.copysign(v, arg, v)
 
     @doc_template_user
     def bound_prox(self, arg, bound=None):
@@ -452,6 +482,22 @@ class l1norm(seminorm):
             return np.sign(arg) * (absarg - cut) * (absarg > cut)
         return arg
 
+    def batch_proximal(self, center, grad, inv_step):
+        # in Lagrange form the prox is elementwise, so all
+        # columns are soft-thresholded at once
+        if (self.lagrange is None or self.offset is not None 
+            or not self.quadratic.isconstant):
+            return seminorm.batch_proximal(self, center, grad, inv_step)
+        prox_arg = center - grad / inv_step
+        return self.lagrange_prox(prox_arg, lipschitz=inv_step)
+
+    def batch_nonsmooth_objective(self, x):
+        if (self.lagrange is None or self.offset is not None 
+            or not self.quadratic.isconstant):
+            return seminorm.batch_nonsmooth_objective(self, x)
+        return (self.lagrange * np.fabs(x).reshape((-1, x.shape[-1])).sum(0) 
+                + self.quadratic.constant_term)
+
 @objective_doc_templater()
 class supnorm(seminorm):
 
@@ -744,12 +790,263 @@ class max_positive_part(seminorm):
             v[pos] = projl1(v[pos], lagrange / lipschitz)
         return arg - v.reshape(arg.shape)
 
+@objective_doc_templater()
+class sorted_l1norm(seminorm):
+
+    r"""
+    The sorted l1 norm, the penalty of SLOPE, 
+    :math:`\sum_i w_i |\beta|_{(i)}` where :math:`|\beta|_{(1)} \geq
+    |\beta|_{(2)} \geq \dots` are the sorted absolute values and
+    the weights :math:`w_1 \geq w_2 \geq \dots \geq 0`.
+    The default weights are all 1, the l1 norm.
+
+    >>> penalty = sorted_l1norm(3, weights=[3, 2, 1.], lagrange=1.)
+    >>> penalty.seminorm(np.array([1, -4, 2.]))
+    17.0
+    >>> penalty.lagrange_prox(np.array([1, -4, 2.]))
+    array([ 0., -1.,  0.])
+    """
+
+    objective_template = r"""\sum_{i=1}^{%(shape)s} w_i |%(var)s|_{(i)}"""
+
+    prox_tol = 1.0e-12
+
+    def __init__(self, shape, weights=None, lagrange=None, bound=None,
+                 offset=None, quadratic=None, initial=None):
+
+        seminorm.__init__(self, shape, lagrange=lagrange, bound=bound,
+                          offset=offset, quadratic=quadratic,
+                          initial=initial)
+        self.weights = weights
+        if weights is None:
+            self._weight_array = np.ones(np.product(self.shape))
+        else:
+            self._weight_array = np.asarray(weights, np.float).reshape(-1)
+            if self._weight_array.shape != (np.product(self.shape),):
+                raise ValueError('weights should have one entry per coordinate')
+            if (np.any(np.diff(self._weight_array) > 0) 
+                or np.any(self._weight_array < 0)):
+                raise ValueError('weights should be nonincreasing and non-negative')
+
+    def __eq__(self, other):
+        if self.__class__ == other.__class__:
+            weights_equal = np.all(np.equal(self._weight_array, other._weight_array))
+            if self.bound is not None:
+                return self.bound == other.bound and weights_equal
+            return self.lagrange == other.lagrange and weights_equal
+        return False
+
+    def __copy__(self):
+        return self.__class__(copy(self.shape),
+                              weights=copy(self.weights),
+                              bound=copy(self.bound),
+                              lagrange=copy(self.lagrange),
+                              offset=copy(self.offset),
+                              quadratic=copy(self.quadratic))
+
+    def get_conjugate(self):
+        if self.quadratic.coef == 0:
+            offset, outq = _work_out_conjugate(self.offset, self.quadratic)
+
+            cls = conjugate_seminorm_pairs[self.__class__]
+            if self.bound is None:
+                conjugate_atom = cls(self.shape,
+                                     weights=self.weights,
+                                     bound=self.lagrange,
+                                     lagrange=None,
+                                     quadratic=outq,
+                                     offset=offset)
+            else:
+                conjugate_atom = cls(self.shape,
+                                     weights=self.weights,
+                                     lagrange=self.bound,
+                                     bound=None,
+                                     quadratic=outq,
+                                     offset=offset)
+        else:
+            conjugate_atom = smooth_conjugate(self)
+        self._conjugate = conjugate_atom
+        self._conjugate._conjugate = self
+        return self._conjugate
+    conjugate = property(get_conjugate)
+
+    @doc_template_user
+    def seminorm(self, arg, lagrange=None, check_feasibility=False):
+        lagrange = seminorm.seminorm(self, arg, 
+                                 check_feasibility=check_feasibility, 
+                                 lagrange=lagrange)
+        sorted_arg = np.sort(np.fabs(arg).reshape(-1))[::-1]
+        return lagrange * (self._weight_array * sorted_arg).sum()
+
+    @doc_template_user
+    def constraint(self, arg, bound=None):
+        bound = seminorm.constraint(self, arg, bound=bound)
+        inbox = self.seminorm(arg, lagrange=1) <= bound * (1 + self.tol)
+        if inbox:
+            return 0
+        else:
+            return np.inf
+
+    @doc_template_user
+    def lagrange_prox(self, arg,  lipschitz=1, lagrange=None):
+        lagrange = seminorm.lagrange_prox(self, arg, lipschitz, lagrange)
+        arg = np.asarray(arg, np.float)
+        v = prox_sorted_l1(arg.reshape(-1), self._weight_array * (lagrange / lipschitz))
+        return v.reshape(arg.shape)
+
+    @doc_template_user
+    def bound_prox(self, arg, bound=None):
+        bound = seminorm.bound_prox(self, arg, bound)
+        arg = np.asarray(arg, np.float)
+        v = project_sorted_l1(arg.reshape(-1), bound, self._weight_array,
+                              tol=self.prox_tol)
+        return v.reshape(arg.shape)
+
+
+@objective_doc_templater()
+class sorted_l1norm_dual(sorted_l1norm):
+
+    r"""
+    The conjugate seminorm of `sorted_l1norm`, 
+    :math:`\max_k \sum_{i \leq k} |\beta|_{(i)} / \sum_{i \leq k} w_i`.
+    """
+
+    objective_template = (r"""\max_k \frac{\sum_{i \leq k} |%(var)s|_{(i)}}"""
+                          + r"""{\sum_{i \leq k} w_i}""")
+
+    @doc_template_user
+    def seminorm(self, arg, lagrange=None, check_feasibility=False):
+        lagrange = seminorm.seminorm(self, arg, 
+                                 check_feasibility=check_feasibility, 
+                                 lagrange=lagrange)
+        return lagrange * sorted_l1_dual(arg, self._weight_array,
+                                         check_feasibility=check_feasibility,
+                                         tol=self.tol)
+
+    @doc_template_user
+    def constraint(self, arg, bound=None):
+        bound = seminorm.constraint(self, arg, bound=bound)
+        inbox = self.seminorm(arg, lagrange=1,
+                              check_feasibility=True) <= bound * (1 + self.tol)
+        if inbox:
+            return 0
+        else:
+            return np.inf
+
+    @doc_template_user
+    def lagrange_prox(self, arg,  lipschitz=1, lagrange=None):
+        lagrange = seminorm.lagrange_prox(self, arg, lipschitz, lagrange)
+        arg = np.asarray(arg, np.float)
+        v = project_sorted_l1(arg.reshape(-1), lagrange / lipschitz, 
+                              self._weight_array, tol=self.prox_tol)
+        return arg - v.reshape(arg.shape)
+
+    @doc_template_user
+    def bound_prox(self, arg, bound=None):
+        bound = seminorm.bound_prox(self, arg, bound)
+        arg = np.asarray(arg, np.float)
+        v = prox_sorted_l1(arg.reshape(-1), self._weight_array * bound)
+        return arg - v.reshape(arg.shape)
+
+
+def sorted_l1_dual(arg, weights, check_feasibility=False, tol=1.e-5):
+    """
+    The dual norm of the sorted l1 norm with weights at arg.
+    Where the partial sums of weights are 0, the partial sums
+    of the sorted np.fabs(arg) must be 0, if check_feasibility
+    is True it returns np.inf if they are not.
+    """
+    sorted_arg = np.sort(np.fabs(arg).reshape(-1))[::-1]
+    numerator = np.cumsum(sorted_arg)
+    denominator = np.cumsum(weights)
+    positive = denominator > 0
+    if (check_feasibility and 
+        np.any(numerator[~positive] > tol * max(sorted_arg.sum(), 1))):
+        return np.inf
+    if not positive.any():
+        return 0.
+    return (numerator[positive] / denominator[positive]).max()
+
+def project_sorted_l1(arg, bound, weights, tol=1.e-12):
+    """
+    Project arg onto the ball of radius bound of the sorted
+    l1 norm with weights.
+
+    The projection is the proximal map of the sorted l1 norm
+    times a multiplier, found by bisection up to a relative
+    tolerance tol. The proximal map is 0 for multipliers above
+    the dual norm of arg. np.fabs(arg) is sorted once and 
+    the bisection evaluates the proximal map on the sorted values.
+    """
+    absarg = np.fabs(arg)
+    order = np.argsort(-absarg)
+    sorted_arg = absarg[order]
+    if (weights * sorted_arg).sum() <= bound:
+        return arg.copy()
+
+    # the dual norm of arg, as in sorted_l1_dual
+    denominator = np.cumsum(weights)
+    positive = denominator > 0
+    lo, hi = 0., (np.cumsum(sorted_arg)[positive] / denominator[positive]).max()
+    while hi - lo > tol * hi:
+        mid = 0.5 * (lo + hi)
+        # the fit is nonincreasing, so its sorted l1 norm is a dot product
+        if (weights * prox_sorted_l1_sorted(sorted_arg, mid * weights)).sum() > bound:
+            lo = mid
+        else:
+            hi = mid
+    result = np.empty(arg.shape)
+    result[order] = prox_sorted_l1_sorted(sorted_arg, hi * weights)
+    return np.sign(arg) * result
+
+def sorted_l1_support(arg, thresholds):
+    """
+    The coordinates of arg, sorted by decreasing absolute value, up to 
+    the last maximum of the partial sums of their absolute values minus 
+    thresholds, those predicted nonzero by the strong rule of SLOPE.
+
+    Algorithm 1 of
+    title = {The strong screening rule for SLOPE}
+    author = {Larsson, Johan and Bogdan, Malgorzata and Wallin, Jonas}
+    """
+    absarg = np.fabs(arg)
+    order = np.argsort(-absarg)
+    partial_sums = np.hstack([0, np.cumsum(absarg[order] - thresholds)])
+    size = partial_sums.shape[0] - 1 - np.argmax(partial_sums[::-1])
+    support = np.zeros(absarg.shape, np.bool)
+    support[order[:size]] = True
+    return support
+
+def sorted_l1_strong_set(grad, lagrange_cur, lagrange_new, weights,
+                         slope_estimate=1):
+    """
+    The strong set of a sorted l1 norm with weights when lagrange
+    goes from lagrange_cur to lagrange_new, grad being the gradient
+    at the solution for lagrange_cur.
+    """
+    # the increments are nonincreasing, so they keep the order
+    # of np.fabs(grad)
+    order = np.argsort(-np.fabs(grad))
+    shifted = np.empty(grad.shape)
+    shifted[order] = (np.fabs(grad)[order] + 
+                      slope_estimate * (lagrange_cur - lagrange_new) * weights)
+    return sorted_l1_support(shifted, lagrange_new * weights)
+
+def sorted_l1_check_KKT(grad, solution, lagrange, weights, tol=1.e-2):
+    """
+    The coordinates that are 0 in solution but, from grad, 
+    should be nonzero for a sorted l1 norm with weights.
+    """
+    support = sorted_l1_support(grad, lagrange * weights * (1 + tol))
+    return support * (solution == 0)
+
 
 conjugate_seminorm_pairs = {}
 for n1, n2 in [(l1norm,supnorm),
                (l2norm,l2norm),
                (positive_part, constrained_max),
-               (constrained_positive_part, max_positive_part)]:
+               (constrained_positive_part, max_positive_part),
+               (sorted_l1norm, sorted_l1norm_dual)]:
     conjugate_seminorm_pairs[n1] = n2
     conjugate_seminorm_pairs[n2] = n1
 
@@ -19,6 +19,9 @@ def configuration(parent_package='',top_path=None):
     config.add_extension('piecewise_linear',
                          sources = ["piecewise_linear.c"],
                          )
+    config.add_extension('tv1d_cython',
+                         sources = ["tv1d_cython.c"],
+                         )
     return config
 
 if __name__ == '__main__':
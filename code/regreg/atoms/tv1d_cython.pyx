@@ -0,0 +1,100 @@
+import numpy as np
+cimport numpy as np
+
+"""
+Implements the direct algorithm for the proximal map of the 1D total
+variation as described in
+
+title = {A direct algorithm for 1D total variation denoising}
+author = {Condat, Laurent}
+journal = {IEEE Signal Processing Letters}
+year = {2013}
+
+with a threshold for each difference, so weighted total variation
+is handled as well.
+"""
+
+DTYPE_float = np.float
+ctypedef np.float_t DTYPE_float_t
+
+def prox_tv1d(np.ndarray[DTYPE_float_t, ndim=1] y,
+              np.ndarray[DTYPE_float_t, ndim=1] thresholds):
+    """
+    Return the minimizer of
+
+       0.5 * ((x - y)**2).sum() + (thresholds * np.fabs(np.diff(x))).sum()
+
+    for thresholds >= 0 of length y.shape[0]-1.
+
+    The dual variable, the cumulative sum of y - x, is followed
+    along the signal within bounds for the value of the current
+    segment, which is output when a jump is necessary. This
+    is linear time in practice.
+    """
+
+    cdef int n = y.shape[0]
+    cdef np.ndarray[DTYPE_float_t, ndim=1] x = np.empty(n)
+    if n <= 1:
+        x[:] = y
+        return x
+
+    # L[k] bounds the dual variable at position k, the
+    # last position uses the last threshold as a placeholder
+    cdef np.ndarray[DTYPE_float_t, ndim=1] L = np.empty(n)
+    L[:n-1] = thresholds
+    L[n-1] = thresholds[n-2]
+
+    cdef int k = 0, k0 = 0, kminus = 0, kplus = 0
+    cdef double vmin = y[0] - L[0], vmax = y[0] + L[0]
+    cdef double umin = L[0], umax = -L[0]
+    cdef int negative_jump
+
+    while True:
+        if k == n-1:
+            # the dual variable must be 0 at the right boundary
+            if umin < 0:
+                negative_jump = 1
+            elif umax > 0:
+                negative_jump = 0
+            else:
+                vmin += umin / (k - k0 + 1)
+                while k0 <= k:
+                    x[k0] = vmin
+                    k0 += 1
+                return x
+        else:
+            umin += y[k+1] - vmin
+            umax += y[k+1] - vmax
+            if umin < -L[k+1]:
+                negative_jump = 1
+            elif umax > L[k+1]:
+                negative_jump = 0
+            else:
+                # no jump, extend the segment
+                k += 1
+                if umin >= L[k]:
+                    kminus = k
+                    vmin += (umin - L[k]) / (k - k0 + 1)
+                    umin = L[k]
+                if umax <= -L[k]:
+                    kplus = k
+                    vmax += (umax + L[k]) / (k - k0 + 1)
+                    umax = -L[k]
+                continue
+
+        # output a segment and start a new one after it
+        if negative_jump:
+            while k0 <= kminus:
+                x[k0] = vmin
+                k0 += 1
+            vmin = y[k0] + L[k0-1] - L[k0]
+            vmax = y[k0] + L[k0-1] + L[k0]
+        else:
+            while k0 <= kplus:
+                x[k0] = vmax
+                k0 += 1
+            vmin = y[k0] - L[k0-1] - L[k0]
+            vmax = y[k0] - L[k0-1] + L[k0]
+        k = kminus = kplus = k0
+        umin = L[k0]
+        umax = -L[k0]
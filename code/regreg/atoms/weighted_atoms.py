@@ -4,6 +4,7 @@ from copy import copy
 import warnings
 
 from .seminorms import seminorm as unweighted_seminorm
+from .projl1_cython import projl1_weighted
 
 from ..problems.composite import composite, nonsmooth, smooth_conjugate
 from ..affine import (linear_transform, identity as identity_transform, 
@@ -181,7 +182,11 @@ class l1norm(seminorm):
 
     @doc_template_user
     def bound_prox(self, x, bound=None):
-        raise NotImplementedError
+        bound = seminorm.bound_prox(self, x, bound)
+        x = np.asarray(x, np.float)
+        weights = np.asarray(self.weights, np.float)
+        return projl1_weighted(x.reshape(-1), bound, 
+                               weights.reshape(-1)).reshape(x.shape)
 
 
 @objective_doc_templater()
@@ -218,7 +223,12 @@ class supnorm(seminorm):
 
     @doc_template_user
     def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
-        raise NotImplementedError
+        lagrange = seminorm.lagrange_prox(self, x, lipschitz, lagrange)
+        x = np.asarray(x, np.float)
+        # Moreau's identity, the conjugate is the l1 norm with weights 1/weights
+        inv_weights = 1. / np.asarray(self.weights, np.float)
+        return x - projl1_weighted(x.reshape(-1), lagrange / lipschitz,
+                                   inv_weights.reshape(-1)).reshape(x.shape)
 
     @doc_template_user
     def bound_prox(self, x, bound=None):
@@ -13,7 +13,7 @@ constant_term).
 from copy import copy
 
 from numpy.linalg import norm
-from numpy import all, asarray
+from numpy import all, asarray, isscalar, ndarray
 
 class identity_quadratic(object):
 
@@ -36,6 +36,11 @@ class identity_quadratic(object):
                     self.linear_term is None or all(self.linear_term == 0),
                     self.constant_term in [0, None]])
 
+    @property
+    def isconstant(self):
+        return all([self.coef in [0, None],
+                    self.linear_term is None or all(self.linear_term == 0)])
+
     def __copy__(self):
         return identity_quadratic(self.coef,
                                   copy(self.center),
@@ -79,20 +84,26 @@ class identity_quadratic(object):
         cons = self.constant_term
         if linear_term is None:
             linear_term = 0
-        if center is not None:
+        # avoid temporaries for the common scalar center and linear_term
+        if center is not None and not (isscalar(center) and center == 0):
             r = x - center
         else:
             r = x
+        if mode in ['both', 'func']:
+            if isscalar(linear_term):
+                linear_value = linear_term * asarray(x).sum()
+            else:
+                linear_value = (linear_term * x).sum()
         if mode == 'both':
             if linear_term is not None:
-                return (norm(r)**2 * coef / 2. + (linear_term * x).sum() 
+                return (norm(r)**2 * coef / 2. + linear_value
                         + cons, coef * r + linear_term)
             else:
                 return (norm(r)**2 * coef / 2. + cons,
                         coef * r)
         elif mode == 'func':
             if linear_term is not None:
-                return norm(r)**2 * coef / 2. + (linear_term * x).sum() + cons
+                return norm(r)**2 * coef / 2. + linear_value + cons
             else:
                 return norm(r)**2 * coef / 2. + cons
         elif mode == 'grad':
@@ -122,7 +133,8 @@ class identity_quadratic(object):
             sc = self.collapsed()
             oc = other.collapsed()
             newq = identity_quadratic(sc.coef + oc.coef, 0, 
-                                      sc.linear_term + oc.linear_term,
+                                      _add_linear_terms(sc.linear_term, 
+                                                        oc.linear_term),
                                       sc.constant_term + oc.constant_term)
             return newq 
 
@@ -176,7 +188,8 @@ class identity_quadratic(object):
         if constant_term is None: 
             constant_term = 0 
         if self.center is not None:
-            linear_term -= coef * self.center
+            # a single temporary rather than coef * center and 0 - that
+            linear_term = self.center * (-coef)
             constant_term += coef * norm(self.center)**2/2.
         if self.linear_term is not None:
             linear_term += self.linear_term
@@ -216,3 +229,20 @@ class identity_quadratic(object):
             from .cones import zero_constraint
             q = identity_quadratic(0,0,0,-a.constant_term)
             return zero_constraint(a.linear_term.shape, offset=-a.linear_term, quadratic=q)
+
+def _add_linear_terms(a, b):
+    """
+    Return a + b for the linear terms of two collapsed quadratics.
+
+    Collapsed quadratics own their linear terms, so when `a` is
+    a float array of the right shape the sum is formed in place.
+    """
+    if isscalar(b) and b == 0:
+        return a
+    if isscalar(a) and a == 0:
+        return b
+    if (isinstance(a, ndarray) and a.dtype.kind == 'f' and 
+        (isscalar(b) or a.shape == asarray(b).shape)):
+        a += b
+        return a
+    return a + b
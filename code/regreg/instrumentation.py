@@ -0,0 +1,180 @@
+"""
+Opt-in counters, timers and per-iteration callbacks for the solvers.
+
+Nothing is recorded unless a `monitor` is active::
+
+    with monitor() as m:
+        problem.solve()
+    m.as_dict()
+
+The instrumented functions are
+
+* the solver steps of `FISTA`: smooth objective evaluations
+  by mode (``'smooth_objective[func]'`` etc.), ``'proximal'`` steps,
+  ``'backtrack_trials'``, ``'rejected_trials'`` and ``'restarts'``;
+
+* the matrix vector products ``'linear_map'`` and ``'adjoint_map'``
+  of `affine_transform` and `normalize`;
+
+* ``'power_L'``, ``'container.proximal'`` and ``'lasso.main'``.
+
+Times are wall clock seconds and include the time spent in
+instrumented functions called from within, i.e. the time of
+``'proximal'`` includes that of the matrix vector products
+it needs.
+
+When no monitor is active an instrumented function only
+looks up a module level variable before doing its work.
+"""
+
+import time
+from functools import wraps
+
+# the active monitor, if any
+_monitor = None
+
+def current_monitor():
+    """
+    Return the active `monitor` or None.
+    """
+    return _monitor
+
+class monitor(object):
+
+    """
+    Collect counts and times of the instrumented functions while
+    active, i.e. within a `with` block.
+
+    Each solver fit while the monitor is active adds a dict
+    to self.solves with the counts and times of the work done
+    during that fit, including that of nested fits, such as the
+    fits of the dual problems in `container.proximal`.
+
+    Parameters
+    ----------
+    callback : callable
+          If not None, called as ``callback(solver, info)`` after
+          each iteration of a solver, where info is a dict
+          with keys 'iteration', 'objective' and 'inv_step'.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.counts = {}
+        self.times = {}
+        self.solves = []
+        self.elapsed = 0.
+        self._frames = []
+        self._previous = []
+
+    def __enter__(self):
+        global _monitor
+        self._previous.append(_monitor)
+        _monitor = self
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _monitor
+        self.elapsed += time.time() - self._start
+        _monitor = self._previous.pop()
+        return False
+
+    def record(self, name, elapsed=None, count=1):
+        """
+        Add count calls to name, taking elapsed seconds if not None,
+        to the totals and to the fits in progress.
+        """
+        for counts, times in [(self.counts, self.times)] + \
+                [(frame['counts'], frame['times']) for frame in self._frames]:
+            counts[name] = counts.get(name, 0) + count
+            if elapsed is not None:
+                times[name] = times.get(name, 0.) + elapsed
+
+    def call(self, name, f, args, kwargs):
+        """
+        Call f, recording the call and its time under name.
+        """
+        toc = time.time()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self.record(name, time.time() - toc)
+
+    def begin_solve(self, solver):
+        """
+        Start recording a fit of solver.
+        """
+        frame = {'solver': solver.__class__.__name__,
+                 'depth': len(self._frames),
+                 'counts': {},
+                 'times': {},
+                 'start': time.time()}
+        self._frames.append(frame)
+        return frame
+
+    def end_solve(self, solver, frame):
+        """
+        Finish recording a fit of solver, adding it to self.solves.
+        """
+        self._frames.remove(frame)
+        frame['elapsed'] = time.time() - frame.pop('start')
+        for attr in ['iterations', 'epochs', 'rejected_trials',
+                     'gradient_restarts']:
+            if hasattr(solver, attr):
+                frame[attr] = getattr(solver, attr)
+        self.solves.append(frame)
+
+    def iteration(self, solver, iteration, objective, inv_step=None):
+        """
+        Called by the solvers after each iteration, or after
+        each epoch of the stochastic solvers. The objective is None
+        when the solver did not compute it.
+        """
+        self.record('iterations')
+        if self.callback is not None:
+            self.callback(solver, {'iteration': iteration,
+                                   'objective': objective,
+                                   'inv_step': inv_step})
+
+    def as_dict(self):
+        """
+        The recorded counts and times as a dict with keys
+        'counts', 'times', 'elapsed' and 'solves'.
+        """
+        return {'counts': dict(self.counts),
+                'times': dict(self.times),
+                'elapsed': self.elapsed,
+                'solves': [dict(frame) for frame in self.solves]}
+
+def instrumented(name):
+    """
+    Decorator recording the calls to a function and their time
+    under name when a `monitor` is active.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if _monitor is None:
+                return f(*args, **kwargs)
+            return _monitor.call(name, f, args, kwargs)
+        return wrapper
+    return decorator
+
+def instrumented_solve(fit):
+    """
+    Decorator for the fit method of a solver, adding a dict
+    of the work done in each fit to `monitor.solves`
+    when a `monitor` is active.
+    """
+    @wraps(fit)
+    def wrapper(self, *args, **kwargs):
+        monitor = _monitor
+        if monitor is None:
+            return fit(self, *args, **kwargs)
+        frame = monitor.begin_solve(self)
+        try:
+            return fit(self, *args, **kwargs)
+        finally:
+            monitor.end_solve(self, frame)
+    return wrapper
@@ -22,121 +22,168 @@ def adj_from_3dmask(mask,num_time_points,numx=1,numy=1,numz=1,regions=None):
 
     adj: An array containing adjacency information
     """
-    adj = prepare_adj(mask,numt,numx,numy,numz,regions)
-    adj = convert_to_array(adj)
-    return adj
+    return prepare_adj(mask,numx,numy,numz,regions)
 
-def prepare_adj(mask, numx=1,numy=1,numz=1,regions=None,return_array=True):
+def neighbor_offsets(radius):
+    """
+    The offsets of the neighbors of a voxel, all integer vectors
+    whose coordinates are at most radius, a sequence, in absolute value,
+    in lexicographic order and including the zero offset.
+
+    >>> neighbor_offsets((1,0))
+    array([[-1,  0],
+           [ 0,  0],
+           [ 1,  0]])
+    """
+    radius = np.asarray(radius, np.int)
+    box = np.indices(tuple(2*radius+1)).reshape((len(radius), -1)).T
+    return box - radius
+
+def _shifted(shape, offset):
+    # slices of the voxels v and of v + offset for the voxels v
+    # for which both are inside an array of shape shape
+    source, target = [], []
+    for n, o in zip(shape, offset):
+        source.append(slice(max(-o, 0), n - max(o, 0)))
+        target.append(slice(max(o, 0), n - max(-o, 0)))
+    return tuple(source), tuple(target)
+
+def neighbor_edges(mask, radius, regions=None, offsets=None):
+    """
+    The pairs of neighboring voxels in mask, of any dimension,
+    as indices of the voxels in mask in C order. Voxels are neighbors if their
+    coordinates differ by at most radius, a sequence with one
+    entry per dimension of mask, and they have the same value in regions.
+
+    Each pair of voxels is found once per offset in offsets, which
+    defaults to `neighbor_offsets`. Returns the arrays
+    of first and second voxels of the pairs and that of the
+    indices of their offsets in offsets, sorted by first voxel and offset.
+    """
+    mask = np.asarray(mask).astype(np.bool)
+    if regions is not None:
+        regions = np.asarray(regions).reshape(mask.shape)
+    if offsets is None:
+        offsets = neighbor_offsets(radius)
+
+    vmap = -np.ones(mask.shape, np.int)
+    vmap[mask] = np.arange(mask.sum())
+
+    first, second, which = [], [], []
+    for idx, offset in enumerate(offsets):
+        source, target = _shifted(mask.shape, offset)
+        valid = mask[source] & mask[target]
+        if regions is not None:
+            valid &= regions[source] == regions[target]
+        first.append(vmap[source][valid])
+        second.append(vmap[target][valid])
+        which.append(np.ones(first[-1].shape, np.int) * idx)
+    first, second, which = [np.hstack(v) for v in [first, second, which]]
+    order = np.lexsort((which, first))
+    return first[order], second[order], which[order]
+
+def prepare_adj(mask, numx=1,numy=1,numz=1,regions=None,return_array=True,
+                radius=None):
     """
     Return adjacency list, where the voxels are considered neighbors if they
-    fall in a ball of radius numt, numx, numy, and numz for time, x position, y
+    fall in a box of radius numx, numy, and numz for x position, y
     position, and z position respectively.
 
     Parameters
     ----------
-    X :  (T, N, P, Q, R) shape ndarray
-        The first index is trial, the second index is time, the third index is x
-        position, the fourth index is y position and the fifth position is z
-        position.
-    mask : (N, P, Q, R) shape binary ndarray
-        The same size as X[0,:,:,:,:] where 1 indicates that the voxel-timepoint
-        is included and 0 indicates that it is excluded. NOTE: Usually the mask
-        is thought of as a 3-dimensional ndarray, since it is uniform across
-        time.
-    regions : (N, P, Q, R) shape ndarray
-        A multivalued array the same size as the mask that indicates different
-        regions in the spatial structure. No adjacency edges will be made across
-        region boundaries.
-    numt: int XXX NOT IN ARG LIST XXX
-        The radius of the "neighborhood ball" in the t direction
+    mask : (P, Q, R) shape binary ndarray
+        1 indicates that the voxel is included and 0 indicates that
+        it is excluded. Masks of other dimensions, e.g. 4D
+        with time as a dimension, need radius.
     numx : int, optional
-        The radius of the "neighborhood ball" in the x direction
+        The radius of the "neighborhood box" in the x direction
     numy : int, optional
-        The radius of the "neighborhood ball" in the y direction
+        The radius of the "neighborhood box" in the y direction
     numz : int, optional
-        The radius of the "neighborhood ball" in the z direction
-    regions :
+        The radius of the "neighborhood box" in the z direction
+    regions : (P, Q, R) shape ndarray
+        A multivalued array the same size as the mask that indicates different
+        regions in the spatial structure. No adjacency edges will be made across
+        region boundaries.
     return_array : {True, False}, optional
+        Return an array, as `convert_to_array`, or a list of arrays.
+    radius : sequence of int, optional
+        The radius of the box in each dimension of mask, replaces
+        numx, numy and numz.
 
     Returns
     -------
-    newX : The matrix X reshaped as a 2-dimensional array for analysis
-    adj: The adjacency list associated with newX
+    adj: The adjacency list of the voxels in mask, in C order.
+        The neighbors of a voxel are in C order of their offsets, its
+        own entry is -1.
     """
-    #Create map going from X to predictor vector indices. The entries of
-    # this array are -1 if the voxel is not included in the mask, and the 
-    # index in the new predictor corresponding to the voxel if the voxel
-    # is included in the mask.
-
-    if regions == None:
-        regions = np.zeros(mask.shape)
-    regions.shape = mask.shape
-    reg_values = np.unique(regions)
-    
-    vmap = np.cumsum(mask).reshape(mask.shape)
-    mask = np.bool_(mask.copy())
-    vmap[~mask] = -1
-    vmap -= 1 # now vmap's values run from 0 to mask.sum()-1
-
-    # Create adjacency list
-    
-    adj = []
-
-    nx,ny,nz = mask.shape
-
-    for i in range(nx):
-        for j in range(ny):
-            for k in range(nz):
-                if mask[i,j,k]:
-                    local_map = vmap[max((i-numx),0):(i+numx+1),
-                                     max((j-numy),0):(j+numy+1),
-                                     max((k-numz),0):(k+numz+1)]
-                    local_reg = regions[max((i-numx),0):(i+numx+1),
-                                        max((j-numy),0):(j+numy+1),
-                                        max((k-numz),0):(k+numz+1)]
-                    region = regions[i,j,k]
-                    ind = (local_map>-1)*(local_reg == region)
-                    ind = np.bool_(ind)
-                    nbrs = np.array(local_map[ind],dtype=int)
-                    adj.append(nbrs)
-
-
-
-    for i, a in enumerate(adj):
-        a[np.equal(a,i)] = -1
-
-
-    if return_array:
-        return convert_to_array(adj)
-    else:
-        return adj
-
+    mask = np.asarray(mask).astype(np.bool)
+    if radius is None:
+        radius = (numx, numy, numz)
+    if len(radius) != mask.ndim:
+        raise ValueError('radius should have one entry per dimension of mask')
+
+    first, second, which = neighbor_edges(mask, radius, regions)
+    second[first == second] = -1
+
+    counts = np.bincount(first, minlength=mask.sum())
+    if not return_array:
+        return np.split(second, np.cumsum(counts)[:-1])
+    return _fill_rows(second, counts)
+
+def _fill_rows(values, counts):
+    # an array with a row for each entry of counts holding
+    # that many of values, padded with -1
+    width = max(counts.max(), 1) if counts.shape[0] else 1
+    adjarray = -np.ones((counts.shape[0], width), dtype=np.int)
+    starts = np.cumsum(counts) - counts
+    rows = np.repeat(np.arange(counts.shape[0]), counts)
+    columns = np.arange(values.shape[0]) - np.repeat(starts, counts)
+    adjarray[rows, columns] = values
+    return adjarray
 
 def create_D(adj):
     """
-    Create a matrix D based on the adj data structure
+    Create a matrix D based on the adj data structure, with a row
+    for each edge (i, j) of adj with j > i, 1 in column i and -1 in
+    column j. The rows are in order of i and the position of j in adj[i].
     """
 
+    adj = np.asarray(adj)
     p, d =  adj.shape
-    D = sparse.lil_matrix((np.sum(adj>-1)/2,p))
-    count = 0
-    for i in range(p):
-        for j in range(d):
-            nbr = adj[i,j]
-            if nbr > i:
-                D[count,i] = 1
-                D[count,nbr] = -1
-                count += 1
-    return D
+    rows, positions = np.nonzero(adj > np.arange(p)[:,np.newaxis])
+    return _edge_matrix(rows, adj[rows, positions], p)
+
+def _edge_matrix(first, second, p):
+    nedge = first.shape[0]
+    edge = np.arange(nedge)
+    return sparse.coo_matrix((np.hstack([np.ones(nedge), -np.ones(nedge)]),
+                              (np.hstack([edge, edge]), np.hstack([first, second]))),
+                             shape=(nedge, p)).tocsr()
+
+def graph_D(mask, radius=None, regions=None):
+    """
+    The matrix D of `create_D` for the neighbors of the
+    voxels in mask as in `prepare_adj`, without forming the adjacency array.
+    radius defaults to 1 in each dimension of mask.
+
+    Returns a `scipy.sparse.csr_matrix`.
+    """
+    mask = np.asarray(mask).astype(np.bool)
+    if radius is None:
+        radius = (1,) * mask.ndim
+    offsets = neighbor_offsets(radius)
+    # the offsets that come after 0 in C order,
+    # each edge is found once
+    offsets = offsets[offsets.shape[0] // 2 + 1:]
+    first, second = neighbor_edges(mask, radius, regions, offsets=offsets)[:2]
+    return _edge_matrix(first, second, mask.sum())
 
 def convert_to_array(adj):
-    num_ind = np.max([len(a) for a in adj])
-    adjarray = -np.ones((len(adj),num_ind),dtype=np.int)
-    for i in range(len(adj)):
-        for j in range(len(adj[i])):
-            adjarray[i,j] = adj[i][j]
-    return adjarray
-   
+    counts = np.array([len(a) for a in adj], np.int)
+    values = np.hstack([np.asarray(a, np.int) for a in adj] + [np.zeros(0, np.int)])
+    return _fill_rows(values, counts)
+
 def test_prep(nt=0,nx=1,ny=1,nz=1):
     """
     Let's make this into a proper test...... what should newa, adj be in this case?
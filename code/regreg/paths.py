@@ -1,17 +1,30 @@
 from warnings import warn
-import gc
+from collections import OrderedDict
+import copy
+import os
+import shutil
+import tempfile
+import time
+import ctypes
+import multiprocessing
+import multiprocessing.sharedctypes
 
 import numpy as np
 import scipy.sparse
 
-from .affine import power_L, normalize, selector, identity, adjoint
-from .atoms.seminorms import l1norm, constrained_positive_part
+from .affine import (power_L, lipschitz_bound, normalize, selector, identity, 
+                     adjoint, astransform)
+from .affine.out_of_core import block_design, row_subset
+from .atoms.seminorms import (l1norm, constrained_positive_part, sorted_l1norm,
+                              sorted_l1_dual, sorted_l1_strong_set, sorted_l1_check_KKT)
 from .smooth import logistic_loss, sum as smooth_sum, affine_smooth
 from .smooth.quadratic import squared_error
 from .problems.separable import separable_problem, separable
 from .problems.simple import simple_problem
 from .identity_quadratic import identity_quadratic as iq
 from .atoms.mixed_lasso import mixed_lasso, strong_set as strong_set_ml, check_KKT
+from .algorithms import coordinate_descent
+from .instrumentation import instrumented
 
 # Constants used below
 
@@ -20,6 +33,304 @@ L1_PENALTY = -2
 POSITIVE_PART = -3
 NONNEGATIVE = -4
 
+class path_store(object):
+
+    """
+    Storage for a path of sparse solutions, appended one at a time.
+
+    Only the nonzero entries of each solution are kept, in buffers
+    that double in size when full, so appending costs time proportional
+    to the number of nonzeros. `finalize` returns the path as a
+    `scipy.sparse.csc_matrix` with one column per solution.
+
+    Once the buffers would use more than max_memory bytes, they
+    are moved to memory mapped files in a temporary directory 
+    under directory, which are removed when the store is garbage
+    collected. The matrix returned by `finalize` is then
+    backed by these files.
+
+    >>> store = path_store(3)
+    >>> store.append(np.array([0, 1.5, 0]))
+    >>> store.append(np.array([-1, 2, 0]))
+    >>> store.finalize().toarray()
+    array([[ 0. , -1. ],
+           [ 1.5,  2. ],
+           [ 0. ,  0. ]])
+    """
+
+    def __init__(self, p, initial_size=None, max_memory=np.inf, directory=None):
+        self.p = p
+        if p >= np.iinfo(np.int32).max:
+            self.index_dtype = np.int64
+        else:
+            self.index_dtype = np.int32
+        self.max_memory = max_memory
+        self.directory = directory
+        self.tempdir = None
+        if initial_size is None:
+            initial_size = max(p, 16)
+        self.nnz = 0
+        self.indptr = [0]
+        self.indices = np.empty(initial_size, self.index_dtype)
+        self.data = np.empty(initial_size, np.float)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def spilled(self):
+        """
+        Are the buffers memory mapped files?
+        """
+        return self.tempdir is not None
+
+    def append(self, solution):
+        """
+        Add a solution to the end of the path.
+        """
+        solution = np.asarray(solution).reshape(-1)
+        if solution.shape != (self.p,):
+            raise ValueError('expecting a solution of shape %s' % str((self.p,)))
+        nonzero = np.flatnonzero(solution)
+        new_nnz = self.nnz + nonzero.shape[0]
+        if new_nnz > self.data.shape[0]:
+            self._grow(max(new_nnz, 2 * self.data.shape[0]))
+        self.indices[self.nnz:new_nnz] = nonzero
+        self.data[self.nnz:new_nnz] = solution[nonzero]
+        self.nnz = new_nnz
+        self.indptr.append(new_nnz)
+
+    def extend(self, path):
+        """
+        Add the columns of path, a `scipy.sparse` matrix such as
+        returned by `finalize`, to the end of the path.
+        """
+        path = scipy.sparse.csc_matrix(path)
+        if path.shape[0] != self.p:
+            raise ValueError('expecting a path with %d rows' % self.p)
+        path.sort_indices()
+        new_nnz = self.nnz + path.nnz
+        if new_nnz > self.data.shape[0]:
+            self._grow(max(new_nnz, 2 * self.data.shape[0]))
+        self.indices[self.nnz:new_nnz] = path.indices[:path.nnz]
+        self.data[self.nnz:new_nnz] = path.data[:path.nnz]
+        self.indptr.extend(self.nnz + path.indptr[1:])
+        self.nnz = new_nnz
+
+    def finalize(self):
+        """
+        The path as a `scipy.sparse.csc_matrix` of shape
+        (p, len(self)). The matrix shares its data
+        with the store.
+        """
+        indptr = np.array(self.indptr, self.index_dtype)
+        return scipy.sparse.csc_matrix((self.data[:self.nnz], 
+                                        self.indices[:self.nnz],
+                                        indptr),
+                                       shape=(self.p, len(self)),
+                                       copy=False)
+
+    def _grow(self, size):
+        nbytes = size * (self.data.itemsize + self.indices.itemsize)
+        if self.spilled or nbytes > self.max_memory:
+            if self.tempdir is None:
+                self.tempdir = tempfile.mkdtemp(prefix='regreg_path_', 
+                                                dir=self.directory)
+            self._generation = getattr(self, '_generation', 0) + 1
+            new_indices = self._memmap('indices', self.index_dtype, size)
+            new_data = self._memmap('data', np.float, size)
+        else:
+            new_indices = np.empty(size, self.index_dtype)
+            new_data = np.empty(size, np.float)
+        new_indices[:self.nnz] = self.indices[:self.nnz]
+        new_data[:self.nnz] = self.data[:self.nnz]
+        self._release()
+        self.indices, self.data = new_indices, new_data
+
+    def _memmap(self, name, dtype, size):
+        filename = os.path.join(self.tempdir, '%s_%d.dat' % (name, self._generation))
+        return np.memmap(filename, dtype=dtype, mode='w+', shape=(size,))
+
+    def _release(self):
+        # remove the files of the previous memory mapped buffers
+        # the mappings stay valid on POSIX systems while still referenced
+        for buf in [self.indices, self.data]:
+            if isinstance(buf, np.memmap) and os.path.exists(buf.filename):
+                os.remove(buf.filename)
+
+    def __del__(self):
+        if self.tempdir is not None:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+
+class subproblem_cache(object):
+
+    """
+    Cache of the restricted problems of a `lasso`, keyed by 
+    their candidate set.
+
+    An entry holds the sliced design, the loss and the
+    restricted problem of a candidate set, along with
+    its selector. Entries are evicted, least recently used 
+    first, while there are more than max_entries of them
+    or their sliced designs use more than max_memory bytes.
+
+    >>> cache = subproblem_cache(max_entries=1)
+    >>> cache.put(np.array([True, False, True]), 'first', 16)
+    >>> cache.get(np.array([True, False, True]))
+    'first'
+    >>> cache.put(np.array([True, True, True]), 'second', 24)
+    >>> cache.get(np.array([True, False, True])) is None
+    True
+    """
+
+    def __init__(self, max_entries=20, max_memory=2**28):
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, candidate_set):
+        return np.packbits(np.asarray(candidate_set, np.bool)).tostring()
+
+    def get(self, candidate_set):
+        """
+        The entry of candidate_set, or None if it is not cached.
+        """
+        key = self.key(candidate_set)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        # move to the end, i.e. most recently used
+        cached = self.entries.pop(key)
+        self.entries[key] = cached
+        self.hits += 1
+        return cached[1]
+
+    def put(self, candidate_set, entry, nbytes):
+        """
+        Cache entry for candidate_set, whose sliced
+        design uses nbytes bytes.
+        """
+        key = self.key(candidate_set)
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[2]
+        if nbytes > self.max_memory:
+            return
+        self.entries[key] = (np.asarray(candidate_set, np.bool).copy(), entry, nbytes)
+        self.nbytes += nbytes
+        while len(self.entries) > self.max_entries or self.nbytes > self.max_memory:
+            self.nbytes -= self.entries.popitem(last=False)[1][2]
+
+    def nearest_subset(self, candidate_set, max_extra):
+        """
+        The candidate set and entry of the cached candidate set, 
+        contained in candidate_set, that lacks the fewest of its
+        columns, if it lacks at most max_extra of them.
+        Returns None if there is no such candidate set.
+        """
+        nearest, nearest_extra = None, max_extra + 1
+        for columns, entry, nbytes in self.entries.values():
+            if columns.shape != candidate_set.shape or np.any(columns & ~candidate_set):
+                continue
+            extra = (candidate_set & ~columns).sum()
+            if extra < nearest_extra:
+                nearest, nearest_extra = (columns, entry), extra
+        return nearest
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+def in_memory(X):
+    """
+    X, or its matrix if X is a `normalize`, read into an ndarray if
+    it is a `block_design`, so that the products of a restricted problem's
+    design do not read the full blocks of rows from disk.
+    """
+    if isinstance(X, block_design):
+        return X.toarray()
+    if getattr(X, 'blockM', False):
+        X.M = X.M.toarray()
+        X.blockM = False
+    return X
+
+def design_nbytes(X):
+    """
+    Bytes used by the data of X, an ndarray, `scipy.sparse` matrix
+    or a `normalize` of one of these, as returned by `in_memory`.
+    """
+    if isinstance(X, normalize):
+        return design_nbytes(X.M)
+    if scipy.sparse.issparse(X):
+        return sum([getattr(X, name).nbytes for name in ['data', 'indices', 'indptr']
+                    if hasattr(X, name)])
+    return np.asarray(X).nbytes
+
+def merge_columns(A, A_position, B, B_position):
+    """
+    The matrix whose columns at A_position are those of A and
+    whose columns at B_position are those of B, either
+    ndarrays or `scipy.sparse` matrices. 
+    """
+    if scipy.sparse.issparse(A):
+        merged = scipy.sparse.hstack([A, B], format='csc')
+        order = np.argsort(np.hstack([A_position, B_position]))
+        return merged[:,order].asformat(A.format)
+    merged = np.empty((A.shape[0], A.shape[1] + B.shape[1]), 
+                      np.result_type(A.dtype, B.dtype))
+    merged[:,A_position] = A
+    merged[:,B_position] = B
+    return merged
+
+def shared_copy(X):
+    """
+    A copy of X, an ndarray or `scipy.sparse` matrix, whose data
+    is in shared memory, so that worker processes 
+    forked by `multiprocessing` use it without a copy.
+    """
+    if scipy.sparse.issparse(X):
+        if not (scipy.sparse.isspmatrix_csc(X) or scipy.sparse.isspmatrix_csr(X)):
+            X = X.tocsc()
+        return X.__class__((shared_copy(X.data), 
+                            shared_copy(X.indices),
+                            shared_copy(X.indptr)), shape=X.shape)
+    X = np.asarray(X)
+    raw = multiprocessing.sharedctypes.RawArray(ctypes.c_char, max(X.nbytes, 1))
+    shared = np.frombuffer(raw, dtype=X.dtype, count=X.size).reshape(X.shape)
+    shared[...] = X
+    return shared
+
+# the lasso whose path segments are computed in a worker process,
+# set when the worker starts
+_worker_lasso = None
+
+def _init_path_worker(path_lasso):
+    global _worker_lasso
+    _worker_lasso = path_lasso
+
+def _path_segment_worker(task):
+    """
+    Compute a segment of the path of the lasso of the worker process,
+    returning its solutions as a `scipy.sparse.csc_matrix`,
+    the values of the loss, the degrees of freedom and the 
+    screening counts (see `lasso._path_step`) as well
+    as the final value of ever_active and final_inv_step.
+    """
+    lagrange_values, lagrange_start, solution, ever_active, final_inv_step, inner_tol = task
+    path_lasso = _worker_lasso
+    path_lasso.solution[:] = solution
+    path_lasso.ever_active = ever_active
+    path_lasso.final_inv_step = final_inv_step
+    path = path_store(path_lasso.nonzero.adjoint_map(solution).shape[0])
+    objective, dfs, steps = path_lasso._path_segment(lagrange_values, lagrange_start, 
+                                                     inner_tol, path)
+    return (path.finalize(), objective, dfs, steps, path_lasso.ever_active, 
+            path_lasso.final_inv_step)
+
 class lasso(object):
 
     def __init__(self, loss_factory, X, penalty_structure=None, 
@@ -53,6 +364,8 @@ class lasso(object):
 
             if scipy.sparse.issparse(X):
                 self._X1 = scipy.sparse.hstack([np.ones((X.shape[0], 1)), X]).tocsc() 
+            elif isinstance(X, block_design):
+                self._X1 = X.with_intercept()
             else:
                 self._X1 = np.hstack([np.ones((X.shape[0], 1)), X])
             if self.scale or self.center:
@@ -75,6 +388,8 @@ class lasso(object):
                 which_0 = np.zeros(self._Xn.shape)
 
         if np.any(which_0):
+            # the penalty structure is that of the columns kept
+            self.penalty_structure = self.penalty_structure[~which_0]
             self._selector = selector(~which_0, self._Xn.input_shape)
             if self.scale or self.center:
                 self._Xn = self._Xn.slice_columns(~which_0)
@@ -138,7 +453,7 @@ class lasso(object):
         if not hasattr(self, "_lagrange_max"):
             null_soln = self.null_solution
             null_grad = self.loss.smooth_objective(null_soln, 'grad')
-            self.penalty = mixed_lasso(self.penalty_structure, 1., weights=self.group_weights)
+            self.penalty = self.restricted_penalty(np.ones(self.penalty_structure.shape, np.bool), 1.)
             conj = self.penalty.conjugate
             self._lagrange_max = conj.seminorm(null_grad)
 
@@ -183,25 +498,123 @@ class lasso(object):
     @property
     def lipschitz(self):
         if not hasattr(self, "_lipschitz"):
-            self._lipschitz = power_L(self.Xn)
+            # cached, as a bound for the restricted problems' designs
+            self._lipschitz = power_L(self.Xn, cache=True)
         return self._lipschitz
 
-    def grad(self, loss=None):
+    def grad(self, loss=None, columns=None, out=None):
         '''
         Gradient at current value. This includes the gradient
         of the smooth loss as well as the gradient of the elastic net part.
         This is used for determining whether the KKT conditions are met
         and which coefficients are in the strong set.
+
+        If columns, a boolean array, is not None, only the entries
+        in columns are computed and stored in out, whose 
+        other entries are left as they are. For an `affine_smooth` loss
+        this costs a product with the columns of self.Xn in columns,
+        using the linear predictor maintained by `linear_predictor`.
         '''
         if loss is None:
             loss = self.loss
-        gsmooth = self.loss.smooth_objective(self.solution, 'grad')
         penalized = self.penalty_structure != UNPENALIZED
-        # XXX the elastic net is probably not quite right here if the elastic net has a non-zero center
-        gquad = self.elastic_net.objective(self.solution[penalized], 'grad')
-        gsmooth[penalized] += gquad
+        if columns is None:
+            gsmooth = self.loss.smooth_objective(self.solution, 'grad')
+            # XXX the elastic net is probably not quite right here if the elastic net has a non-zero center
+            gquad = self.elastic_net.objective(self.solution[penalized], 'grad')
+            gsmooth[penalized] += gquad
+            return gsmooth
+
+        if out is None:
+            out = np.zeros(self.solution.shape)
+        if not columns.any():
+            return out
+        if not isinstance(self.loss, affine_smooth):
+            out[columns] = self.grad()[columns]
+            return out
+
+        residual = self.residual()
+        if columns.sum() > self.partial_grad_fraction * columns.shape[0]:
+            gsmooth = self.loss.affine_transform.adjoint_map(residual)[columns]
+        else:
+            gsmooth = self.column_transform(columns).adjoint_map(residual)
+        if not self._elastic_net.iszero:
+            gquad = np.zeros(self.solution.shape)
+            gquad[penalized] = self.elastic_net.objective(self.solution[penalized], 'grad')
+            gsmooth = gsmooth + gquad[columns]
+        out[columns] = gsmooth
+        return out
+
+    # grad computes the entries in columns with one product with
+    # self.Xn when columns holds more than this fraction of them
+    partial_grad_fraction = 0.5
+
+    def linear_predictor(self):
+        """
+        The linear predictor of self.loss at self.solution. 
+        It is updated from the solution it was last computed at,
+        with a product with the columns whose coefficients have changed.
+        """
+        solution = self.solution
+        if getattr(self, '_predictor_solution', None) is None:
+            self._linear_predictor = self.loss.linear_predictor(solution)
+        else:
+            changed = solution != self._predictor_solution
+            if not changed.any():
+                return self._linear_predictor
+            if changed.sum() > self.partial_grad_fraction * changed.shape[0]:
+                self._linear_predictor = self.loss.linear_predictor(solution)
+            else:
+                delta = solution[changed] - self._predictor_solution[changed]
+                self._linear_predictor = (self._linear_predictor + 
+                                          self.column_transform(changed, cache=False).linear_map(delta))
+        self._predictor_solution = solution.copy()
+        self._residual = None
+        return self._linear_predictor
+
+    def residual(self):
+        """
+        The gradient of the loss with respect to its linear predictor
+        at self.solution, a multiple of the residuals for squared error.
+        The gradient of the loss is its product with the adjoint of self.Xn.
+        """
+        eta = self.linear_predictor()
+        if getattr(self, '_residual', None) is None:
+            self._residual = self.loss.sm_atom.smooth_objective(eta, 'grad')
+        return self._residual
+
+    def column_transform(self, columns, cache=True):
+        """
+        The columns of self.Xn in the boolean array columns as 
+        a linear transform, a view without a copy of the columns if 
+        self.Xn is a `normalize`. If cache is True, the transform is 
+        kept until it is asked for with different columns.
+        """
+        cached = getattr(self, '_column_transform', None)
+        if cached is not None and np.array_equal(cached[0], columns):
+            return cached[1]
+        if isinstance(self.Xn, normalize):
+            Xslice = self.Xn.slice_columns(columns, view=True)
+        else:
+            Xslice = self.slice_columns(columns)
+        if self.intercept and columns[0] and isinstance(Xslice, normalize):
+            Xslice.intercept_column = 0
+        Xslice = astransform(Xslice)
+        if cache:
+            self._column_transform = (columns.copy(), Xslice)
+        return Xslice
 
-        return gsmooth
+    def strong_penalty(self, strong, lagrange):
+        """
+        The penalty of the restricted problem on the strong set,
+        kept until it is asked for with a different strong set.
+        """
+        cached = getattr(self, '_strong_penalty', None)
+        if cached is None or not np.array_equal(cached[0], strong):
+            penalty = self.restricted_penalty(strong, lagrange)
+            self._strong_penalty = cached = (strong.copy(), penalty)
+        cached[1].lagrange = lagrange
+        return cached[1]
 
     def strong_set(self, lagrange_cur, lagrange_new, grad=None,
                    slope_estimate=1):
@@ -217,33 +630,166 @@ class lasso(object):
             Xslice = self.Xn[:,columns]
         return Xslice
 
+    # are restricted problems kept in self.subproblem_cache?
+    cache_subproblems = True
+
+    # a sliced design is extended from a cached one lacking
+    # at most this fraction of its columns
+    cache_extend_fraction = 0.25
+
+    @property
+    def subproblem_cache(self):
+        """
+        The `subproblem_cache` of the restricted problems solved
+        by solve_subproblem, reset by main.
+        """
+        if not hasattr(self, "_subproblem_cache"):
+            self._subproblem_cache = subproblem_cache()
+        return self._subproblem_cache
+
+    def sliced_design(self, candidate_set):
+        """
+        The columns of self.Xn in candidate_set. If self.subproblem_cache
+        holds a design with all but a few of these columns,
+        the missing columns are added to it instead of slicing
+        self.Xn again.
+        """
+        candidate_set = np.asarray(candidate_set, np.bool)
+        nearest = None
+        if self.cache_subproblems:
+            max_extra = int(self.cache_extend_fraction * candidate_set.sum())
+            nearest = self.subproblem_cache.nearest_subset(candidate_set, max_extra)
+        if nearest is None:
+            return in_memory(self.slice_columns(candidate_set))
+
+        columns, (Xcached, loss, problem, candidate_selector) = nearest
+        extra = candidate_set & ~columns
+        if not extra.any():
+            if isinstance(Xcached, normalize):
+                # construct_loss sets the intercept_column of the copy
+                return copy.copy(Xcached)
+            return Xcached
+        Xextra = in_memory(self.slice_columns(extra))
+        position = np.cumsum(candidate_set) - 1
+        if isinstance(Xextra, normalize):
+            Xslice = copy.copy(Xextra)
+            Xslice.M = merge_columns(Xcached.M, position[columns], 
+                                     Xextra.M, position[extra])
+            Xslice.input_shape = (Xslice.M.shape[1],)
+            if Xslice.scale:
+                Xslice.col_stds = self.Xn.col_stds[candidate_set]
+            return Xslice
+        return merge_columns(Xcached, position[columns], Xextra, position[extra])
+
     def construct_loss(self, candidate_set, lagrange):
-        Xslice = self.slice_columns(candidate_set)
+        Xslice = self.sliced_design(candidate_set)
         loss = self.loss_factory(Xslice)
         if self.intercept:
             Xslice.intercept_column = 0
         return Xslice, loss
 
-    def restricted_problem(self, candidate_set, lagrange):
+    def restricted_penalty(self, candidate_set, lagrange):
+        """
+        The penalty of the problem restricted to candidate_set.
+        """
+        return mixed_lasso(self.penalty_structure[candidate_set], lagrange, 
+                           weights=self.group_weights)
+
+    def kkt_failing(self, penalty, grad, solution, lagrange):
+        """
+        The coordinates of solution failing the KKT conditions
+        of penalty, a penalty of `restricted_penalty`, given grad.
+        """
+        return check_KKT(penalty, grad, solution, lagrange)
+
+    def restricted_problem(self, candidate_set, lagrange, cache=False):
         '''
         Assumes the candidate set includes intercept as first column.
-        '''
 
-        Xslice, loss = self.construct_loss(candidate_set, lagrange)
+        If cache is True and self.cache_subproblems, the problem 
+        is looked up in self.subproblem_cache, and added to it if 
+        it was not found. A cached problem is shared by all
+        calls with the same candidate set.
+        '''
 
         restricted_penalty_structure = self.penalty_structure[candidate_set]
         rps = restricted_penalty_structure # shorthand
 
-        sliced_penalty = mixed_lasso(rps, lagrange, weights=self.group_weights)
+        cache = cache and self.cache_subproblems
+        if cache:
+            entry = self.subproblem_cache.get(candidate_set)
+            if entry is not None:
+                problem_sliced, candidate_selector = entry[2:]
+                problem_sliced.proximal_atom.lagrange = lagrange
+                return problem_sliced, candidate_selector, restricted_penalty_structure
+
+        Xslice, loss = self.construct_loss(candidate_set, lagrange)
+
+        sliced_penalty = self.restricted_penalty(candidate_set, lagrange)
         problem_sliced = simple_problem(loss, sliced_penalty)
         candidate_selector = selector(candidate_set, self.shape[1])
+        if cache:
+            self.subproblem_cache.put(candidate_set, 
+                                      (Xslice, loss, problem_sliced, candidate_selector),
+                                      design_nbytes(Xslice))
         return problem_sliced, candidate_selector, restricted_penalty_structure
 
+    def restricted_lipschitz(self, loss):
+        """
+        An upper bound of the Lipschitz constant of the gradient of
+        loss, the loss of a restricted problem, from `lipschitz_bound` of
+        its design, a column slice of self.Xn. None if the smooth atom of 
+        loss does not implement `gradient_lipschitz`.
+        """
+        try:
+            curvature = loss.sm_atom.gradient_lipschitz()
+        except (AttributeError, NotImplementedError):
+            return None
+        X = loss.affine_transform
+        if X.affineD:
+            X = X.linear_operator
+        bound = lipschitz_bound(X)
+        if bound is None:
+            bound = self.lipschitz
+        return curvature * bound
+
+    # how solve_subproblem solves the restricted problems,
+    # set by main
+    solver = 'FISTA'
+
+    @property
+    def coordinate_descent(self):
+        """
+        A `coordinate_descent` solver for self.problem, shared 
+        along the path so its cached Gram columns are reused.
+        """
+        if not hasattr(self, "_coordinate_descent"):
+            self._coordinate_descent = coordinate_descent(self.problem)
+        return self._coordinate_descent
+
     def solve_subproblem(self, candidate_set, lagrange_new, **solve_args):
     
+        if self.solver == 'coordinate_descent':
+            # coordinates outside of candidate_set are held fixed 
+            # in the full problem, which gives the restricted problem
+            penalty_structure = self.penalty_structure[candidate_set]
+            solver = self.coordinate_descent
+            solver.fit(tol=solve_args.get('tol', 1.e-5), 
+                       coordinates=candidate_set,
+                       debug=solve_args.get('debug', None))
+            grad = solver.gradient[candidate_set]
+            sub_soln = self.solution[candidate_set]
+            return self.final_inv_step, grad, sub_soln, penalty_structure
+
         # try to solve the problem with the active set
-        subproblem, selector, penalty_structure = self.restricted_problem(candidate_set, lagrange_new)
+        subproblem, selector, penalty_structure = self.restricted_problem(candidate_set, lagrange_new,
+                                                                          cache=True)
         subproblem.coefs[:] = selector.linear_map(self.solution)
+        # backtracking never needs to start above the Lipschitz
+        # constant of the restricted problem
+        bound = self.restricted_lipschitz(subproblem.smooth_atom)
+        if bound is not None and solve_args.get('start_inv_step', None) is not None:
+            solve_args['start_inv_step'] = min(solve_args['start_inv_step'], bound)
         sub_soln = subproblem.solve(**solve_args)
         self.solution[:] = selector.adjoint_map(sub_soln)
 
@@ -251,120 +797,390 @@ class lasso(object):
         self.final_inv_step = subproblem.final_inv_step
         return self.final_inv_step, grad, sub_soln, penalty_structure
 
-    def main(self, inner_tol=1.e-5, verbose=False):
+    @instrumented('lasso.main')
+    def main(self, inner_tol=1.e-5, verbose=False, solver='FISTA',
+             max_path_memory=np.inf, path_directory=None,
+             n_jobs=1, coarse_tol=1.e-3, screening=None,
+             max_cache_memory=2**28):
+        """
+        Compute the solution path over self.lagrange_sequence.
+
+        Parameters
+        ----------
+        inner_tol : float
+              Tolerance for the restricted problems.
+        verbose : bool
+              Print progress along the path?
+        solver : str
+              How the restricted problems are solved, either 'FISTA' or,
+              for squared error losses and penalties without groups,
+              'coordinate_descent'. 
+        max_path_memory : float
+              Number of bytes of memory the nonzero coefficients
+              of the path may use before they are moved
+              to memory mapped files (see `path_store`).
+        path_directory : str
+              Where the memory mapped files are created, 
+              defaults to the system's temporary directory.
+        n_jobs : int
+              Number of worker processes. If larger than 1, the
+              lagrange sequence is split into n_jobs contiguous
+              segments. A coarse path, solved with tolerance
+              coarse_tol at the first value of each segment,
+              gives warm starts from which the workers compute the 
+              segments. The workers share self.Xn, see `share_design`.
+        coarse_tol : float
+              Tolerance for the coarse path when n_jobs > 1.
+        screening : str
+              If not None, one of 'static', 'sequential' or
+              'dynamic': the gap safe screening rule (see `safe_screen`) 
+              used in addition to the strong rules. Coordinates screened
+              at a lagrange value are left out of the restricted
+              problems at that value. The rule tests
+              the null solution ('static'), the solution at the previous
+              lagrange value ('sequential') or, in addition,
+              each solution of a restricted problem ('dynamic').
+              The output then also has keys 'screened', the number
+              of coordinates screened at each lagrange value, 
+              'kkt_retries', the number of restricted problems solved 
+              again after a failed KKT check, and 'kkt_checks_avoided',
+              the number of coordinates outside the strong set left
+              out of the KKT checks because they were screened, summed
+              over the checks at each lagrange value.
+        max_cache_memory : float
+              Number of bytes of memory the sliced designs 
+              of the restricted problems kept in 
+              self.subproblem_cache may use.
+        """
+
+        if solver not in ['FISTA', 'coordinate_descent']:
+            raise ValueError("solver should be one of 'FISTA' or 'coordinate_descent'")
+        self.solver = solver
+        if screening not in [None, 'static', 'sequential', 'dynamic']:
+            raise ValueError("screening should be one of None, 'static', 'sequential' or 'dynamic'")
+        if screening is not None and not self._elastic_net.iszero:
+            raise ValueError('screening is not implemented with an elastic net term')
+        self.screening = screening
+        self._subproblem_cache = subproblem_cache(max_memory=max_cache_memory)
 
         # scaling will be needed to get coefficients on original scale   
         if self.scale:
             scalings = np.asarray(self.Xn.col_stds).reshape(-1)
         else:
             scalings = np.ones(self.shape[1])
-        scalings = self.nonzero.adjoint_map(scalings)
+        scalings = self.nonzero.adjoint_map(scalings, copy=True)
 
         # take a guess at the inverse step size
-        self.final_inv_step = self.lipschitz / 1000
+        if solver == 'FISTA':
+            self.final_inv_step = self.lipschitz / 1000
+        else:
+            self.final_inv_step = None
         lseq = self.lagrange_sequence # shorthand
 
         # first solution corresponding to all zeros except intercept 
 
         self.solution[:] = self.null_solution.copy()
 
-        grad_solution = self.grad().copy()
-        strong, strong_selector = self.strong_set(lseq[0], lseq[1], grad=grad_solution)
-
-        p = self.shape[0]
-
-        rescaled_solutions = scipy.sparse.csr_matrix(self.nonzero.adjoint_map(self.solution) 
-                                                     / scalings)
+        path = path_store(scalings.shape[0], max_memory=max_path_memory,
+                          directory=path_directory)
+        # the dropped columns of zeros have scaling 0
+        path.append(self.nonzero.adjoint_map(self.solution) / np.where(scalings > 0, scalings, 1))
 
         objective = [self.loss.smooth_objective(self.solution, 'func')]
         # not quite right -- should check tight constraints
         dfs = [np.sum(self.initial_active)]
-        retry_counter = 0
-
-        all_failing = np.zeros(grad_solution.shape, np.bool)
+        steps = [(0, 0, 0)]
+
+        if n_jobs > 1 and lseq.shape[0] > 2:
+            for beta, segment_objective, segment_dfs, segment_steps in self._parallel_path(n_jobs, inner_tol, coarse_tol):
+                path.extend(beta)
+                objective.extend(segment_objective)
+                dfs.extend(segment_dfs)
+                steps.extend(segment_steps)
+        else:
+            segment_objective, segment_dfs, segment_steps = self._path_segment(lseq[1:], lseq[0], inner_tol, path, 
+                                                                               verbose=verbose)
+            objective.extend(segment_objective)
+            dfs.extend(segment_dfs)
+            steps.extend(segment_steps)
 
-        for lagrange_new, lagrange_cur in zip(lseq[1:], lseq[:-1]):
-            self.lagrange = lagrange_new
-            tol = inner_tol
-            active_old = self.active.copy()
-            num_tries = 0
-            debug = False
-            coef_stop = True
-            while True:
-                strong, strong_selector = self.strong_set(lagrange_cur, 
-                                                          lagrange_new, grad=grad_solution)
-
-                subproblem_set = self.ever_active + all_failing
-                final_inv_step, grad, sub_soln, penalty_structure \
-                    = self.solve_subproblem(subproblem_set,
-                                            lagrange_new,
-                                            tol=tol,
-                                            start_inv_step=self.final_inv_step,
-                                            debug=debug and verbose,
-                                            coef_stop=coef_stop)
-
-                p = self.shape[1]
-
-                self.solution[subproblem_set][:] = sub_soln
-                # this only corrects the gradient on the subproblem_set
-                grad_solution[subproblem_set][:] = grad
-
-                strong_problem = self.restricted_problem(strong, lagrange_new)[0]
-                strong_soln = self.solution[strong]
-                strong_grad = (strong_problem.smooth_objective(strong_soln, mode='grad') + 
-                               self.elastic_net[strong].objective(strong_soln, mode='grad'))
-                strong_penalty = strong_problem.proximal_atom
-
-                strong_failing = check_KKT(strong_penalty, strong_grad, strong_soln, lagrange_new) 
-
-                if np.any(strong_failing):
-                    all_failing += strong_selector.adjoint_map(strong_failing)
-                else:
-                    self.solution[subproblem_set][:] = sub_soln
-                    grad_solution = self.grad()
-                    all_failing = check_KKT(self.penalty, grad_solution, self.solution, lagrange_new)
-
-                    if not all_failing.sum():
-                        self.ever_active += self.solution != 0
-                        self.final_inv_step = final_inv_step
-                        break
-                    else:
-                        if verbose:
-                            print 'failing:', np.nonzero(all_failing)[0]
-                        retry_counter += 1
-                        self.ever_active += all_failing
+        objective = np.array(objective)
+        output = {'devratio': 1 - objective / objective.max(),
+                  'df': dfs,
+                  'lagrange': self.lagrange_sequence,
+                  'scalings': scalings,
+                  'beta':path.finalize()}
+        if screening is not None:
+            steps = np.array(steps)
+            output['screened'] = steps[:,0]
+            output['kkt_retries'] = steps[:,1]
+            output['kkt_checks_avoided'] = steps[:,2]
 
-                tol /= 2.
-                num_tries += 1
-                if num_tries % 5 == 0:
+        return output
 
-                    self.solution[subproblem_set][:] = sub_soln
-                    self.solution[~subproblem_set][:] = 0
-                    grad_solution = self.grad()
+    def _path_segment(self, lagrange_values, lagrange_start, inner_tol, path, verbose=False):
+        """
+        Continue the path from self.solution, taken to be the solution
+        at lagrange_start, over lagrange_values, appending the
+        solutions to path. Returns the values of the loss, 
+        the degrees of freedom and the screening counts
+        of `_path_step` along the segment.
+        """
+        grad_solution = self.grad().copy()
+        all_failing = np.zeros(grad_solution.shape, np.bool)
+        if verbose:
+            null_objective = self.loss.smooth_objective(self.null_solution, mode='func')
 
-                    debug = True
-                    tol = inner_tol
-                    if num_tries >= 10:
-                        warn('convergence not achieved for lagrange=%0.4e' % lagrange_new)
-                        break
+        objective, dfs, steps = [], [], []
+        lagrange_cur = lagrange_start
+        for lagrange_new in lagrange_values:
+            grad_solution, all_failing, counts = self._path_step(lagrange_cur, lagrange_new,
+                                                                 grad_solution, all_failing,
+                                                                 inner_tol, verbose)
+            steps.append(counts)
 
             rescaled_solution = self.nonzero.adjoint_map(self.solution)
-            rescaled_solutions = scipy.sparse.vstack([rescaled_solutions, rescaled_solution])
+            path.append(rescaled_solution)
             objective.append(self.loss.smooth_objective(self.solution, mode='func'))
             dfs.append(self.ever_active.shape[0])
-            gc.collect()
 
             if verbose:
-                print lagrange_cur / self.lagrange_max, lagrange_new, (self.solution != 0).sum(), 1. - objective[-1] / objective[0], list(self.lagrange_sequence).index(lagrange_new), np.fabs(rescaled_solution).sum()
+                print lagrange_cur / self.lagrange_max, lagrange_new, (self.solution != 0).sum(), 1. - objective[-1] / null_objective, list(self.lagrange_sequence).index(lagrange_new), np.fabs(rescaled_solution).sum()
+            lagrange_cur = lagrange_new
+        return objective, dfs, steps
+
+    def _path_step(self, lagrange_cur, lagrange_new, grad_solution, all_failing,
+                   inner_tol, verbose=False):
+        """
+        Move self.solution from the solution at lagrange_cur to
+        the solution at lagrange_new, adding coordinates that fail
+        the KKT conditions until there are none. Returns the
+        gradient at the new solution, the coordinates failing
+        the KKT conditions, if convergence was not achieved,
+        and a tuple of the number of coordinates screened, 
+        the number of KKT retries and the number of coordinates
+        outside the strong set whose KKT checks were avoided by screening.
+        """
+        self.lagrange = lagrange_new
+        screening = getattr(self, 'screening', None)
+        if screening == 'static':
+            screened = self.safe_screen(self.null_solution)
+        elif screening in ['sequential', 'dynamic']:
+            screened = self.safe_screen(self.solution)
+        else:
+            screened = np.zeros(self.solution.shape, np.bool)
+        checks_avoided = 0
+
+        tol = inner_tol
+        num_tries = 0
+        debug = False
+        coef_stop = True
+        while True:
+            strong, strong_selector = self.strong_set(lagrange_cur, 
+                                                      lagrange_new, grad=grad_solution)
+            if screened.any():
+                strong = strong * ~screened
+                strong_selector = selector(strong, strong.shape)
+
+            subproblem_set = (self.ever_active + all_failing) * ~screened
+            final_inv_step, grad, sub_soln, penalty_structure \
+                = self.solve_subproblem(subproblem_set,
+                                        lagrange_new,
+                                        tol=tol,
+                                        start_inv_step=self.final_inv_step,
+                                        debug=debug and verbose,
+                                        coef_stop=coef_stop)
+
+            if screening == 'dynamic':
+                screened += self.safe_screen(self.solution)
+                self.solution[screened] = 0
+
+            # only the gradient on the strong set is needed to check it
+            self.grad(columns=strong, out=grad_solution)
+            strong_soln = self.solution[strong]
+            strong_penalty = self.strong_penalty(strong, lagrange_new)
+
+            strong_failing = self.kkt_failing(strong_penalty, grad_solution[strong], strong_soln, lagrange_new) 
+
+            if np.any(strong_failing):
+                all_failing += strong_selector.adjoint_map(strong_failing).astype(np.bool)
+            else:
+                # the gradient on the strong set is current and 
+                # screened coordinates, 0 at the solution, are not checked:
+                # their entries of grad_solution are left as they were
+                self.grad(columns=~strong * ~screened, out=grad_solution)
+                all_failing = self.kkt_failing(self.penalty, grad_solution, self.solution, lagrange_new)
+                if screened.any():
+                    checks_avoided += (~strong * screened).sum()
+                    all_failing = all_failing * ~screened
+
+                if not all_failing.sum():
+                    self.ever_active += self.solution != 0
+                    self.final_inv_step = final_inv_step
+                    break
+                else:
+                    if verbose:
+                        print 'failing:', np.nonzero(all_failing)[0]
+                    # coordinates added by the strong set check stay in
+                    # the next subproblem once they are nonzero
+                    self.ever_active += all_failing + (self.solution != 0)
+
+            tol /= 2.
+            num_tries += 1
+            if num_tries % 5 == 0:
+
+                self.solution[subproblem_set] = sub_soln
+                self.solution[~subproblem_set] = 0
+                grad_solution = self.grad()
+
+                debug = True
+                tol = inner_tol
+                if num_tries >= 10:
+                    warn('convergence not achieved for lagrange=%0.4e' % lagrange_new)
+                    break
+        return grad_solution, all_failing, (screened.sum(), num_tries, checks_avoided)
+
+    def _parallel_path(self, n_jobs, inner_tol, coarse_tol):
+        """
+        Compute the path after its first value, self.solution,
+        in n_jobs segments, each in a worker process.
+        Returns a list of the results of `_path_segment_worker`.
+        """
+        lseq = self.lagrange_sequence
+        n_segments = min(n_jobs, lseq.shape[0] - 1)
+        bounds = np.linspace(1, lseq.shape[0], n_segments + 1).astype(np.int)
+
+        # the coarse path: warm starts for the first value of each segment
+        grad_solution = self.grad().copy()
+        all_failing = np.zeros(grad_solution.shape, np.bool)
+        lagrange_start = lseq[0]
+        tasks = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if start > 1:
+                grad_solution, all_failing = self._path_step(lagrange_start, lseq[start],
+                                                             grad_solution, all_failing,
+                                                             coarse_tol)[:2]
+                lagrange_start = lseq[start]
+            # the strong rules use the preceding value as in the serial path:
+            # at lagrange_start itself they drop active coordinates
+            tasks.append((lseq[start:stop], lseq[start-1], self.solution.copy(),
+                          self.ever_active.copy(), self.final_inv_step, inner_tol))
+
+        self.share_design()
+        pool = multiprocessing.Pool(n_segments, initializer=_init_path_worker,
+                                    initargs=(self,))
+        try:
+            results = pool.map(_path_segment_worker, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        # leave self at the end of the path as in the serial case
+        last = np.asarray(results[-1][0][:,-1].todense()).reshape(-1)
+        self.solution[:] = self.nonzero.linear_map(last)
+        for result in results:
+            self.ever_active += result[4]
+        self.final_inv_step = results[-1][5]
+        return [result[:4] for result in results]
+
+    def share_design(self):
+        """
+        Move the data of self.Xn to shared memory, so that worker 
+        processes use it without a copy.
+        """
+        if getattr(self, '_shared_design', False):
+            return
+        if isinstance(self._Xn, block_design) or getattr(self._Xn, 'blockM', False):
+            # the workers read the blocks from disk
+            pass
+        elif isinstance(self._Xn, normalize):
+            self._Xn.M = shared_copy(self._Xn.M)
+        else:
+            self._Xn = shared_copy(self._Xn)
+            # rebuild the loss with the shared design
+            if hasattr(self, '_loss'):
+                del(self._loss)
+        self._shared_design = True
 
-        objective = np.array(objective)
-        output = {'devratio': 1 - objective / objective.max(),
-                  'df': dfs,
-                  'lagrange': self.lagrange_sequence,
-                  'scalings': scalings,
-                  'beta':rescaled_solutions.T}
+    # relative margin of the dual constraints in safe_screen
+    screening_margin = 1.e-6
 
-        return output
+    @property
+    def column_norms(self):
+        """
+        The Euclidean norms of the columns of self.Xn.
+        """
+        if not hasattr(self, "_column_norms"):
+            Xn = self.Xn
+            if isinstance(Xn, normalize):
+                M = Xn.M
+                n = M.shape[0]
+                if isinstance(M, block_design):
+                    col_sums, sumsq = M.column_moments()
+                elif scipy.sparse.issparse(M):
+                    sumsq = np.asarray(M.multiply(M).sum(0)).reshape(-1)
+                else:
+                    sumsq = (M**2).sum(0)
+                if Xn.center:
+                    if isinstance(M, block_design):
+                        col_means = col_sums / n
+                    else:
+                        col_means = np.asarray(M.mean(0)).reshape(-1)
+                    if Xn.intercept_column is not None:
+                        col_means[Xn.intercept_column] = 0
+                    sumsq = sumsq - n * col_means**2
+                if Xn.scale:
+                    sumsq = sumsq / np.asarray(Xn.col_stds).reshape(-1)**2
+            elif isinstance(Xn, block_design):
+                sumsq = Xn.column_moments()[1]
+            elif scipy.sparse.issparse(Xn):
+                sumsq = np.asarray(Xn.multiply(Xn).sum(0)).reshape(-1)
+            else:
+                sumsq = (Xn**2).sum(0)
+            self._column_norms = np.sqrt(np.maximum(sumsq, 0))
+        return self._column_norms
+
+    def safe_screen(self, solution):
+        """
+        Coordinates that are 0 at the solution for the current
+        lagrange value by the gap safe sphere test: the dual
+        solution lies in a sphere around the dual point of
+        `simple_problem.dual_point` at solution whose radius 
+        is determined by the duality gap. Coordinates with an L1 or 
+        positive part penalty and groups whose dual constraint holds 
+        strictly on this sphere are 0. The loss must 
+        implement `gradient_lipschitz`.
+
+        At a solution, the dual constraints of its nonzero coordinates
+        hold with equality only up to rounding, so they must hold 
+        with a relative margin of self.screening_margin.
+        """
+        if not hasattr(self, "_screening_problem"):
+            self.lagrange_max # sets self.penalty
+            self._screening_problem = simple_problem(self.loss, self.penalty)
+        dual, gap = self._screening_problem.dual_point(solution)
+        radius = np.sqrt(2 * self.loss.sm_atom.gradient_lipschitz() * max(gap, 0))
+        correlation = -self.Xn.adjoint_map(dual)
+        slack = radius * self.column_norms
+        lagrange = self.lagrange * (1 - self.screening_margin)
+        penalty = self.penalty
+
+        screened = np.zeros(solution.shape, np.bool)
+        l1, positive_part = penalty._l1_penalty, penalty._positive_part
+        screened[l1] = np.fabs(correlation[l1]) + slack[l1] < lagrange
+        screened[positive_part] = correlation[positive_part] + slack[positive_part] < lagrange
+
+        grouped = penalty._groups >= 0
+        if np.any(grouped):
+            ngroup = penalty._weight_array.shape[0]
+            groups = penalty._groups[grouped]
+            norms = np.sqrt(np.bincount(groups, weights=correlation[grouped]**2,
+                                        minlength=ngroup))
+            # the norm of the columns of a group bounds its operator norm
+            slacks = np.sqrt(np.bincount(groups, weights=slack[grouped]**2,
+                                         minlength=ngroup))
+            screened[grouped] = (norms + slacks < lagrange * penalty._weight_array)[groups]
+        return screened
 
     # Some common loss factories
 
@@ -376,6 +1192,99 @@ class lasso(object):
     def squared_error(cls, X, Y, *args, **keyword_args):
         return cls(squared_error_factory(Y), X, *args, **keyword_args)
 
+class slope_penalty(separable):
+
+    """
+    A `sorted_l1norm` with the first weights on the coordinates in
+    penalized, the other coordinates being unpenalized. Its lagrange
+    is that of the `sorted_l1norm`.
+    """
+
+    def __init__(self, penalized, weights, lagrange):
+        self.penalized = np.asarray(penalized, np.bool)
+        size = int(self.penalized.sum())
+        self.sorted_atom = sorted_l1norm(size, weights=np.asarray(weights)[:size],
+                                         lagrange=lagrange)
+        separable.__init__(self, self.penalized.shape, [self.sorted_atom], 
+                           [self.penalized])
+
+    def get_lagrange(self):
+        return self.sorted_atom.lagrange
+
+    def set_lagrange(self, lagrange):
+        self.sorted_atom.lagrange = lagrange
+    lagrange = property(get_lagrange, set_lagrange)
+
+class slope(lasso):
+
+    """
+    The path of the sorted l1 norm (SLOPE) penalized problems: the 
+    coefficients with L1_PENALTY in penalty_structure are penalized
+    by a `sorted_l1norm` whose weights are the first entries of weights, 
+    a nonincreasing sequence. The other coefficients, e.g. the intercept, 
+    must be UNPENALIZED.
+
+    The strong sets and the KKT checks use the strong rule of 
+    SLOPE (see `sorted_l1_strong_set`). The restricted problems 
+    are solved with FISTA, without screening.
+    """
+
+    def __init__(self, loss_factory, X, weights, **lasso_keywords):
+        lasso.__init__(self, loss_factory, X, **lasso_keywords)
+
+        structure = self.penalty_structure
+        if np.any((structure != L1_PENALTY) * (structure != UNPENALIZED)):
+            raise ValueError('coefficients of slope should be L1_PENALTY or UNPENALIZED')
+        self.penalized = structure == L1_PENALTY
+        weights = np.asarray(weights, np.float)
+        if weights.shape[0] < self.penalized.sum():
+            raise ValueError('expecting a weight for each penalized coefficient')
+        self.weights = weights[:self.penalized.sum()]
+
+    def restricted_penalty(self, candidate_set, lagrange):
+        return slope_penalty(self.penalized[candidate_set], self.weights, lagrange)
+
+    def kkt_failing(self, penalty, grad, solution, lagrange):
+        penalized = penalty.penalized
+        failing = np.zeros(grad.shape, np.bool)
+        failing[penalized] = sorted_l1_check_KKT(grad[penalized], solution[penalized], 
+                                                 lagrange, penalty.sorted_atom._weight_array)
+        return failing
+
+    @property
+    def lagrange_max(self):
+        if not hasattr(self, "_lagrange_max"):
+            null_soln = self.null_solution
+            null_grad = self.loss.smooth_objective(null_soln, 'grad')
+            self.penalty = self.restricted_penalty(np.ones(self.penalized.shape, np.bool), 1.)
+            self._lagrange_max = sorted_l1_dual(null_grad[self.penalized], self.weights)
+        return self._lagrange_max
+
+    def strong_set(self, lagrange_cur, lagrange_new, grad=None,
+                   slope_estimate=1):
+        if grad is None:
+            grad = self.grad()
+        strong = ~self.penalized
+        strong[self.penalized] = sorted_l1_strong_set(grad[self.penalized], 
+                                                      lagrange_cur, lagrange_new,
+                                                      self.weights, 
+                                                      slope_estimate=slope_estimate)
+        return strong, selector(strong, strong.shape)
+
+    def main(self, inner_tol=1.e-5, verbose=False, solver='FISTA',
+             screening=None, **main_args):
+        """
+        Compute the solution path over self.lagrange_sequence,
+        see `lasso.main`. Only the 'FISTA' solver is available
+        and screening is not.
+        """
+        if solver != 'FISTA':
+            raise ValueError("the restricted problems of slope are solved with 'FISTA'")
+        if screening is not None:
+            raise ValueError('screening is not implemented for slope')
+        return lasso.main(self, inner_tol=inner_tol, verbose=verbose, 
+                          solver=solver, **main_args)
+
 class loss_factory(object):
 
     def __init__(self, response):
@@ -391,6 +1300,30 @@ class loss_factory(object):
         self._response = response
     response = property(get_response, set_response)
 
+    def subset(self, rows):
+        """
+        A loss factory for the cases in rows.
+        """
+        return self.__class__(self.response[rows])
+
+    def deviance(self, linear_predictor, response):
+        """
+        The mean deviance of response for each column of linear_predictor,
+        i.e. twice the loss with response as a function of the linear
+        predictor. The losses are scaled by the number of cases.
+
+        The loss of `squared_error_factory` is half the mean squared
+        error, of the response and minus the linear predictor as for
+        `squared_error`, and that of `logistic_factory`, with coef=0.5, 
+        half the mean binomial deviance, minus twice the log-likelihood
+        per case. The deviance is then the mean squared error or the
+        mean binomial deviance, as reported by glmnet.
+        """
+        linear_predictor = np.asarray(linear_predictor).reshape((response.shape[0], -1))
+        loss = self.__class__(response)(identity(response.shape))
+        return np.array([2 * loss.smooth_objective(eta, 'func') 
+                         for eta in linear_predictor.T])
+
 class logistic_factory(loss_factory):
 
     def __call__(self, X):
@@ -402,11 +1335,192 @@ class squared_error_factory(loss_factory):
         n = self.response.shape[0]
         return squared_error(X, self.response, coef=1./n)
 
+# the cv_lasso whose folds are fit in a worker process,
+# set when the worker starts
+_worker_cv = None
+
+def _init_cv_worker(cv):
+    global _worker_cv
+    _worker_cv = cv
+
+def _cv_fold_worker(task):
+    fold, inner_tol, solver = task
+    return _worker_cv.fit_fold(fold, inner_tol=inner_tol, solver=solver)
+
+class cv_lasso(object):
+
+    """
+    K-fold cross-validation of a `lasso` path.
+
+    The path of each fold is computed on the lagrange sequence
+    of the lasso of all the cases, self.lasso, whose
+    Lipschitz constant also serves as the initial guess of the
+    step size for the folds. With n_jobs > 1 the folds are fit 
+    in a pool of worker processes sharing the design, 
+    see `shared_copy`.
+
+    Parameters
+    ----------
+    loss_factory : loss_factory
+          Factory for the loss with the responses of all the cases,
+          which must implement `subset` and `deviance`.
+    X : ndarray or scipy.sparse
+          The design.
+    nfolds : int
+          Number of folds.
+    n_jobs : int
+          Number of worker processes.
+    seed : int
+          If not None, seed for the random assignment of cases to folds.
+    lasso_keywords : 
+          Passed to `lasso`.
+    """
+
+    def __init__(self, loss_factory, X, nfolds=10, n_jobs=1, seed=None,
+                 **lasso_keywords):
+        self.loss_factory = loss_factory
+        self.nfolds = nfolds
+        self.n_jobs = n_jobs
+        self.lasso_keywords = lasso_keywords
+
+        n = X.shape[0]
+        if nfolds < 2 or nfolds > n:
+            raise ValueError('nfolds should be between 2 and the number of cases')
+        if scipy.sparse.issparse(X):
+            # folds are sets of rows
+            X = X.tocsr()
+        self.X = X
+        self.lasso = lasso(loss_factory, X, **lasso_keywords)
+        self.folds = np.array_split(np.random.RandomState(seed).permutation(n), nfolds)
+
+    @property
+    def lagrange_sequence(self):
+        return self.lasso.lagrange_sequence
+
+    def fit_fold(self, fold, inner_tol=1.e-5, solver='FISTA'):
+        """
+        Compute the path without the cases of a fold.
+
+        Returns
+        -------
+        deviance : ndarray
+              The mean deviance of the cases of the fold along the path.
+        timing : dict
+              Seconds taken to fit the path and to compute the deviance.
+        """
+        toc = time.time()
+        test = self.folds[fold]
+        train = np.ones(self.X.shape[0], np.bool)
+        train[test] = False
+        if scipy.sparse.issparse(self.X):
+            # only the nonzero entries of the rows are copied
+            X_train = self.X[train]
+        else:
+            # the rows are not copied
+            X_train = row_subset(self.X, train)
+
+        fold_lasso = lasso(self.loss_factory.subset(train), X_train, 
+                           **self.lasso_keywords)
+        fold_lasso.lagrange_sequence = self.lagrange_sequence
+        fold_lasso._lipschitz = self.lasso.lipschitz
+        path = fold_lasso.main(inner_tol=inner_tol, solver=solver)
+        fit_time = time.time() - toc
+
+        toc = time.time()
+        eta = self._linear_predictor(fold_lasso, X_train, self.X[test], path)
+        deviance = self.loss_factory.deviance(eta, self.loss_factory.response[test])
+        return deviance, {'fit':fit_time, 'deviance':time.time() - toc}
+
+    def _linear_predictor(self, fold_lasso, X_train, X_test, path):
+        """
+        The linear predictors of the cases X_test along the path,
+        with X_test normalized like the design X_train of fold_lasso.
+        """
+        beta = np.asarray(path['beta'].todense())
+        scalings = path['scalings']
+        # the first solution of the path is reported divided by the scalings
+        beta[:,0] *= scalings
+        if fold_lasso.scale:
+            beta /= np.where(scalings > 0, scalings, 1)[:,np.newaxis]
+        if fold_lasso.intercept:
+            intercept, beta = beta[0], beta[1:]
+        else:
+            intercept = 0
+        eta = X_test * beta if scipy.sparse.issparse(X_test) else np.dot(X_test, beta)
+        if fold_lasso.center:
+            if isinstance(X_train, block_design):
+                col_means = X_train.column_moments()[0] / X_train.shape[0]
+            else:
+                col_means = np.asarray(X_train.mean(0)).reshape(-1)
+            eta -= np.dot(col_means, beta)[np.newaxis,:]
+        return eta + intercept
+
+    def fit(self, inner_tol=1.e-5, solver='FISTA'):
+        """
+        Cross-validate the path.
+
+        Returns
+        -------
+        results : dict
+              With keys 'lagrange', the lagrange sequence,
+              'cv_mean' and 'cv_se', the mean of the deviances 
+              of the folds and its standard error, 'lagrange_min'
+              where 'cv_mean' is smallest, 'lagrange_1se', the largest
+              lagrange value whose 'cv_mean' is within one 
+              standard error of the smallest, 'deviance', the 
+              deviances of the folds, and 'fold_times', 
+              the timings of the folds (see `fit_fold`).
+        """
+        # computed once, before any workers start
+        lseq = self.lagrange_sequence
+        self.lasso.lipschitz
+
+        if self.n_jobs > 1:
+            if not getattr(self, '_shared_X', False):
+                self.X = shared_copy(self.X)
+                self._shared_X = True
+            pool = multiprocessing.Pool(min(self.n_jobs, self.nfolds),
+                                        initializer=_init_cv_worker,
+                                        initargs=(self,))
+            try:
+                results = pool.map(_cv_fold_worker, 
+                                   [(fold, inner_tol, solver) for fold in range(self.nfolds)])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.fit_fold(fold, inner_tol=inner_tol, solver=solver)
+                       for fold in range(self.nfolds)]
+
+        deviance = np.array([result[0] for result in results])
+        cv_mean = deviance.mean(0)
+        cv_se = deviance.std(0) / np.sqrt(self.nfolds - 1)
+        min_idx = np.argmin(cv_mean)
+        within_1se = cv_mean <= cv_mean[min_idx] + cv_se[min_idx]
+        return {'lagrange': lseq,
+                'cv_mean': cv_mean,
+                'cv_se': cv_se,
+                'lagrange_min': lseq[min_idx],
+                'lagrange_1se': lseq[within_1se].max(),
+                'deviance': deviance,
+                'fold_times': [result[1] for result in results]}
+
+    @classmethod
+    def logistic(cls, X, Y, *args, **keyword_args):
+        return cls(logistic_factory(Y), X, *args, **keyword_args)
+
+    @classmethod
+    def squared_error(cls, X, Y, *args, **keyword_args):
+        return cls(squared_error_factory(Y), X, *args, **keyword_args)
+
 
 class nesta(lasso):
 
     # atom_factory takes candidate_set, epsilon
 
+    # the restricted problems depend on lagrange through the dual term
+    cache_subproblems = False
+
     def __init__(self, loss_factory, X, atom_factory, epsilon=None,
                  **lasso_keywords):
         self.atom_factory = atom_factory 
@@ -95,17 +95,111 @@ class composite(object):
         else:
             return argmin, lipschitz * norm(x-argmin)**2 / 2. + self.nonsmooth_objective(argmin) + self.quadratic.objective(argmin, 'func') 
 
-    def proximal_step(self, quadratic, prox_control=None):
+    # set to True by subclasses whose proximal method
+    # accepts an `out` argument to write the result into
+    proximal_writes_out = False
+
+    def proximal_step(self, quadratic, prox_control=None, out=None):
         """
         Compute the proximal optimization
 
         prox_control: If not None, then a dictionary of parameters for the prox procedure
+
+        out: If not None, an array of shape self.shape the result is written into.
+             If self.proximal_writes_out is True it is handed to
+             self.proximal, otherwise the result is copied into it.
         """
+        if out is not None and self.proximal_writes_out:
+            if prox_control is None:
+                return self.proximal(quadratic, out=out)
+            return self.proximal(quadratic, prox_control=prox_control, out=out)
+
         # This seems like a null op -- if all proximals accept optional prox_control
         if prox_control is None:
-            return self.proximal(quadratic)
+            value = self.proximal(quadratic)
         else:
-            return self.proximal(quadratic, prox_control=prox_control)
+            value = self.proximal(quadratic, prox_control=prox_control)
+
+        if out is not None:
+            out[:] = value
+            return out
+        return value
+
+    # set to True by subclasses whose smooth_objective is a
+    # function of an affine map of x, the linear predictor
+    has_linear_predictor = False
+
+    def linear_predictor(self, x):
+        """
+        The linear predictor at x, i.e. the value of the affine map
+        that the smooth objective is a function of.
+        """
+        raise NotImplementedError
+
+    def smooth_objective_predictor(self, eta, mode='both'):
+        """
+        The smooth objective and/or its gradient at the point
+        whose linear predictor is eta.
+        """
+        raise NotImplementedError
+
+    def duality_gap(self, x):
+        """
+        An upper bound on objective(x) minus the minimum of the objective.
+        """
+        raise NotImplementedError('%s does not compute a duality gap' % self.__class__.__name__)
+
+    # Batched evaluation: the methods below take arrays of shape
+    # self.shape + (k,), one problem per column. These defaults loop
+    # over the columns, subclasses can override them with vectorized
+    # versions.
+
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        """
+        The smooth objective of each column of x, an array of shape
+        ``self.shape + (k,)``. Values are returned as a vector of length k,
+        the gradient has the same shape as x.
+
+        If not None, columns indexes the problems of the batch
+        that the columns of x belong to. Only composites whose data
+        differ across the batch need it.
+        """
+        k = x.shape[-1]
+        if mode == 'func':
+            return array([self.smooth_objective(x[...,j], mode='func') 
+                          for j in range(k)])
+        g = zeros(x.shape)
+        f = zeros(k)
+        for j in range(k):
+            if mode == 'both':
+                f[j], g[...,j] = self.smooth_objective(x[...,j], mode='both')
+            elif mode == 'grad':
+                g[...,j] = self.smooth_objective(x[...,j], mode='grad')
+            else:
+                raise ValueError("mode incorrectly specified")
+        if mode == 'both':
+            return f, g
+        return g
+
+    def batch_nonsmooth_objective(self, x):
+        """
+        The nonsmooth objective of each column of x, an array of shape
+        ``self.shape + (k,)``.
+        """
+        return array([self.nonsmooth_objective(x[...,j]) 
+                      for j in range(x.shape[-1])])
+
+    def batch_proximal(self, center, grad, inv_step):
+        """
+        The proximal step for each column of center with gradient
+        the corresponding column of grad, i.e. column j is
+        ``self.proximal(identity_quadratic(inv_step[j], center[...,j], grad[...,j], 0))``.
+        """
+        out = zeros(center.shape)
+        for j in range(center.shape[-1]):
+            self.proximal_step(sq(inv_step[j], center[...,j], grad[...,j], 0),
+                               out=out[...,j])
+        return out
 
     def apply_offset(self, x):
         """
@@ -5,13 +5,14 @@ from ..algorithms import FISTA
 from ..problems.composite import (composite, nonsmooth as nonsmooth_composite,
                         smooth as smooth_composite)
 from ..affine import (vstack as afvstack, identity as afidentity, power_L,
-                     selector as afselector)
+                     selector as afselector, lipschitz_version)
 from ..problems.separable import separable
 from ..problems.dual_problem import dual_problem, stacked_dual
 from ..atoms import affine_atom as nonsmooth_affine_atom
 from ..atoms.cones import zero_constraint, zero as zero_nonsmooth, affine_cone
 
 from ..identity_quadratic import identity_quadratic
+from ..instrumentation import instrumented
 
 class container(composite):
     """
@@ -44,6 +45,7 @@ class container(composite):
 
         self.transform, self.atom = stacked_dual(self.smooth_atoms[0].shape, *self.nonsmooth_atoms)
         self.coefs = np.zeros(self.transform.input_shape)
+        self._transform_lipschitz = None
 
         # add up all the smooth_atom quadratics
         # to be added to nonsmoooth_objective
@@ -89,7 +91,21 @@ class container(composite):
         out += self.quadratic.objective(x, 'func')
         return out
 
+    def transform_lipschitz(self, debug=False):
+        """
+        The `power_L` estimate of self.transform. It is computed 
+        on the first call, and again only when the `lipschitz_version`
+        of self.transform changes.
+        """
+        version = lipschitz_version(self.transform)
+        if self._transform_lipschitz is None or self._transform_lipschitz[0] != version:
+            self._transform_lipschitz = (version, power_L(self.transform, debug=debug, 
+                                                          cache=True))
+        return self._transform_lipschitz[1]
+
     default_solver = FISTA
+
+    @instrumented('container.proximal')
     def proximal(self, proxq, prox_control=None):
         """
         The proximal function for the primal problem
@@ -120,8 +136,8 @@ class container(composite):
 
             #Approximate Lipschitz constant
             if not 'dual_reference_lipschitz' in prox_control.keys():
-                # shouldn't do this over and over
-                self.dual_reference_lipschitz = 1.05*power_L(transform, debug=prox_control['debug'])
+                # estimated once, not on every proximal step
+                self.dual_reference_lipschitz = 1.05*self.transform_lipschitz(debug=prox_control['debug'])
             else:
                 self.dual_reference_lipschitz = prox_control['dual_reference_lipschitz']
                 prox_control.pop('dual_reference_lipschitz')
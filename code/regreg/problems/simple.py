@@ -9,6 +9,9 @@ from ..problems.composite import composite
 from ..affine import identity, scalar_multiply, astransform, adjoint
 from ..atoms import atom
 from ..atoms.cones import zero as zero_cone
+from ..atoms.seminorms import l1norm, supnorm, l2norm
+from ..atoms import weighted_atoms
+from ..atoms.mixed_lasso import mixed_lasso
 from ..smooth import zero as zero_smooth, sum as smooth_sum, affine_smooth
 from ..identity_quadratic import identity_quadratic
 from ..algorithms import FISTA
@@ -33,9 +36,113 @@ class simple_problem(composite):
         vs = self.smooth_atom.nonsmooth_objective(x, check_feasibility=check_feasibility)
         return vn + vs + self.quadratic.objective(x, 'func')
 
-    def proximal(self, proxq):
+    @property
+    def has_linear_predictor(self):
+        return isinstance(self.smooth_atom, affine_smooth)
+
+    def linear_predictor(self, x):
+        return self.smooth_atom.linear_predictor(x)
+
+    def smooth_objective_predictor(self, eta, mode='both'):
+        return self.smooth_atom.smooth_objective_predictor(eta, mode)
+
+    def duality_gap(self, x):
+        """
+        A duality gap at x, i.e. an upper bound on objective(x) minus
+        the minimum of the objective. The dual point is the gradient
+        of the loss at the linear predictor of x, scaled down so 
+        that it is dual feasible. For a `mixed_lasso` it is first
+        projected orthogonal to the unpenalized columns and 
+        the nonnegative columns where x is positive.
+
+        The proximal atom must be a seminorm, a mixed_lasso or a 
+        mixed_lasso_conjugate without offset or quadratic term and
+        the smooth atom an affine_smooth (or just an atom) with a 
+        `conjugate_value` method, such as squared error, logistic or
+        Poisson losses, possibly composed with an affine transform
+        with an offset. Quadratic terms other than constants are
+        not supported.
+        """
+        return self.dual_point(x)[1]
+
+    def dual_point(self, x):
+        """
+        The dual feasible point of `duality_gap` at x, in the 
+        output space of the linear part of the smooth atom, 
+        and the duality gap.
+        """
+        penalty = self.proximal_atom
+        if (not hasattr(penalty, 'dual_seminorm') or penalty.offset is not None 
+            or not penalty.quadratic.iszero):
+            raise ValueError('duality gap needs a seminorm penalty without offset or quadratic')
+
+        if self.has_linear_predictor:
+            loss = self.smooth_atom.sm_atom
+            transform = self.smooth_atom.affine_transform
+        else:
+            loss = self.smooth_atom
+            transform = identity(x.shape)
+        for q in [self.quadratic, self.smooth_atom.quadratic, loss.quadratic]:
+            if not q.isconstant:
+                raise ValueError('duality gap needs constant quadratic terms')
+
+        value, dual = loss.smooth_objective(transform.affine_map(x), mode='both')
+
+        # coordinates whose dual constraint is an equality at x:
+        # unpenalized ones and nonnegative ones that are positive
+        equality = np.zeros(0, np.int)
+        if hasattr(penalty, '_unpenalized') and getattr(penalty, 'bound', None) is None:
+            nonnegative = penalty._nonnegative
+            equality = np.union1d(penalty._unpenalized, 
+                                  nonnegative[x[nonnegative] > 0]).astype(np.int)
+        if equality.shape[0]:
+            basis = np.zeros(x.shape + equality.shape)
+            basis[equality, np.arange(equality.shape[0])] = 1
+            columns = transform.linear_map(basis)
+            dual = dual - np.dot(columns, np.linalg.lstsq(columns, dual, rcond=-1)[0])
+        conjugate_arg = -transform.adjoint_map(dual).reshape(x.shape)
+        # zero up to rounding after the projection
+        conjugate_arg[equality] = 0
+        dual_norm = penalty.dual_seminorm(conjugate_arg)
+
+        gap = value + penalty.nonsmooth_objective(x)
+        if getattr(penalty, 'bound', None) is None:
+            if dual_norm > penalty.lagrange:
+                dual = (penalty.lagrange / dual_norm) * dual
+        else:
+            gap += penalty.bound * dual_norm
+        gap += loss.conjugate_value(dual)
+        # the loss is evaluated at X x + b, the dual objective has -dual^T b
+        if transform.affine_offset is not None:
+            gap -= np.dot(dual.reshape(-1), 
+                          np.asarray(transform.affine_offset).reshape(-1))
+        return dual, gap
+
+    proximal_writes_out = True
+
+    def proximal(self, proxq, out=None):
         proxq = proxq + self.smooth_atom.quadratic + self.quadratic
-        return self.proximal_atom.solve(proxq)
+        if out is None:
+            return self.proximal_atom.solve(proxq)
+        return self.proximal_atom.proximal_step(proxq, out=out)
+
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        return self.smooth_atom.batch_smooth_objective(x, mode, columns=columns)
+
+    def batch_nonsmooth_objective(self, x):
+        self._check_batch_quadratics()
+        return (self.proximal_atom.batch_nonsmooth_objective(x) 
+                + self.smooth_atom.quadratic.constant_term
+                + self.quadratic.constant_term)
+
+    def batch_proximal(self, center, grad, inv_step):
+        self._check_batch_quadratics()
+        return self.proximal_atom.batch_proximal(center, grad, inv_step)
+
+    def _check_batch_quadratics(self):
+        if not (self.smooth_atom.quadratic.isconstant and
+                self.quadratic.isconstant):
+            raise ValueError('batched mode requires the quadratic terms of the problem and its smooth atom to be constant')
 
     @staticmethod
     def smooth(smooth_atom):
@@ -73,6 +180,36 @@ class simple_problem(composite):
         result = '\n'.join([s.strip() for s in result.split('\n')])
         return result
 
+    def solve_batched(self, initial=None, k=None, **fit_args):
+        """
+        Solve a batch of k problems that differ only in the columns
+        of the responses of the smooth atom, e.g. ``squared_error(X, Y)`` 
+        with Y of shape (n,k), and share the proximal atom.
+
+        Parameters
+        ----------
+        initial : ndarray
+              Starting values of shape ``self.coefs.shape + (k,)``. 
+              Defaults to zeros, in which case k must be given.
+        k : int
+              Number of problems in the batch.
+        fit_args : 
+              Passed to `FISTA.fit_batched`.
+
+        Returns
+        -------
+        batch_coefs : ndarray
+              Solutions, one per column.
+        """
+        if initial is None:
+            if k is None:
+                raise ValueError('either initial or k must be specified')
+            initial = np.zeros(self.coefs.shape + (k,))
+        solver = FISTA(self)
+        self.batch_coefs = solver.fit_batched(initial, **fit_args)
+        self.batch_iterations = solver.batch_iterations
+        return self.batch_coefs
+
     def solve(self, quadratic=None, return_optimum=False, **fit_args):
         if quadratic is not None:
             oldq, self.quadratic = self.quadratic, self.quadratic + quadratic
@@ -91,7 +228,99 @@ class simple_problem(composite):
         self.quadratic = oldq
         return value
 
-    
+class WorkingSetError(ValueError):
+    """
+    Raised by `working_set_problem.proximal` when the proximal
+    map moves coordinates outside the working set.
+    """
+    pass
+
+def restricted_atom(atom, working_set):
+    """
+    The atom of the coordinates working_set, an integer index, 
+    of the variable of atom when the other coordinates are held at 0. 
+    The seminorms `l1norm`, `supnorm` and `l2norm`, their weighted
+    versions and `mixed_lasso`, without offset or quadratic, leave
+    coordinates whose quadratic is centered at 0 at 0, and their
+    restrictions are atoms of the same kind. None for other atoms.
+    """
+    if atom.offset is not None or not atom.quadratic.iszero:
+        return None
+    shape = working_set.shape
+    if type(atom) in [l1norm, supnorm, l2norm]:
+        return atom.__class__(shape, lagrange=atom.lagrange, bound=atom.bound)
+    if type(atom) in [weighted_atoms.l1norm, weighted_atoms.supnorm]:
+        return atom.__class__(shape, atom.weights[working_set], 
+                              lagrange=atom.lagrange, bound=atom.bound)
+    if type(atom) is mixed_lasso:
+        # the weights of the groups of atom, as the default
+        # weights depend on the sizes of the groups
+        structure = np.asarray(atom.penalty_structure)
+        weights = {}
+        for label, idx in zip(structure, atom._groups):
+            if idx >= 0:
+                weights[label] = atom._weight_array[idx]
+        return mixed_lasso(structure[working_set], atom.lagrange, 
+                           weights=weights)
+
+class working_set_problem(composite):
+
+    """
+    The problem of a smooth_atom of the coordinates working_set,
+    an integer index, of the variable of proximal_atom, the other
+    coordinates held at 0.
+
+    The proximal map is that of proximal_atom restricted
+    to working_set. This is right when that map leaves
+    coordinates whose quadratic is centered at 0 at 0, as for seminorms and
+    their bounds. For the atoms of `restricted_atom` it is the 
+    proximal map of the restricted atom. For other atoms it is 
+    computed on the full variable, and proximal raises a 
+    `WorkingSetError` if it moves coordinates outside working_set.
+    """
+
+    def __init__(self, smooth_atom, proximal_atom, working_set):
+        self.smooth_atom = smooth_atom
+        self.proximal_atom = proximal_atom
+        self.working_set = np.asarray(working_set)
+        self.restricted_atom = restricted_atom(proximal_atom, self.working_set)
+        self.coefs = np.zeros(self.working_set.shape)
+        self.quadratic = identity_quadratic(0,0,0,0)
+
+    def embed(self, x):
+        """
+        The variable of proximal_atom with x on working_set and 0 elsewhere.
+        """
+        v = np.zeros(self.proximal_atom.shape)
+        v[self.working_set] = x
+        return v
+
+    def smooth_objective(self, x, mode='both', check_feasibility=False):
+        return self.smooth_atom.smooth_objective(x, mode, check_feasibility)
+
+    def nonsmooth_objective(self, x, check_feasibility=False):
+        if self.restricted_atom is not None:
+            vn = self.restricted_atom.nonsmooth_objective(x, check_feasibility=check_feasibility)
+        else:
+            vn = self.proximal_atom.nonsmooth_objective(self.embed(x), check_feasibility=check_feasibility)
+        vs = self.smooth_atom.nonsmooth_objective(x, check_feasibility=check_feasibility)
+        return vn + vs + self.quadratic.objective(x, 'func')
+
+    def proximal(self, proxq):
+        proxq = proxq + self.smooth_atom.quadratic + self.quadratic
+        if self.restricted_atom is not None:
+            return self.restricted_atom.proximal(proxq)
+        center, linear_term = [np.zeros(self.working_set.shape) + v
+                               for v in [proxq.center, proxq.linear_term]]
+        value = self.proximal_atom.solve(identity_quadratic(proxq.coef,
+                                                            self.embed(center),
+                                                            self.embed(linear_term),
+                                                            proxq.constant_term))
+        restricted = value[self.working_set]
+        if np.any(np.delete(value, self.working_set)):
+            raise WorkingSetError('the proximal map does not leave the coordinates outside the working set at 0')
+        return restricted
+
 def gengrad(simple_problem, L, tol=1.0e-8, max_its=1000, debug=False,
             coef_stop=False):
     """
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy import sparse
+from scipy.special import xlogy
 import warnings
 import inspect
 
@@ -32,6 +33,20 @@ class smooth_atom(smooth_composite):
 
     def smooth_objective(self, x, mode='both', check_feasibility=False):
         raise NotImplementedError
+
+    def hessian_diag(self, x):
+        """
+        The Hessian of smooth_objective at x for atoms whose 
+        Hessian is diagonal, returned as an array of the shape of x.
+        """
+        raise NotImplementedError('%s does not have a diagonal Hessian' % self.__class__.__name__)
+
+    def gradient_lipschitz(self):
+        """
+        A bound on the Lipschitz constant of the gradient of 
+        smooth_objective over its whole domain.
+        """
+        raise NotImplementedError('%s does not have a Lipschitz gradient bound' % self.__class__.__name__)
     
     @classmethod
     def affine(cls, linear_operator, offset, coef=1, diag=False,
@@ -84,6 +99,38 @@ class smooth_atom(smooth_composite):
             return obj.copy()
         return obj
 
+    def apply_batch_offset(self, x, columns=None):
+        """
+        Subtract self.offset from each column of x. See `batch_columns`.
+        """
+        if self.offset is None:
+            return x
+        return x - batch_columns(self.offset, x, columns)
+
+    def apply_subset_offset(self, x, rows):
+        """
+        Subtract the entries of self.offset indexed by rows from x.
+        """
+        if self.offset is None:
+            return x
+        return x - self.offset[rows]
+
+    def subset_smooth_objective(self, x, rows, mode='both'):
+        """
+        For atoms that are a sum of terms, one for each entry of
+        their argument, evaluate the sum of the terms indexed by
+        the integer array rows and/or its gradient. The argument x
+        holds the entries of the full argument in rows.
+        """
+        raise NotImplementedError('%s is not a sum over the entries of its argument' % self.__class__.__name__)
+
+    def conjugate_value(self, u):
+        """
+        The value of the conjugate of smooth_objective at u,
+        ignoring self.quadratic.
+        """
+        raise NotImplementedError('%s does not have a closed form conjugate' % self.__class__.__name__)
+
     def get_conjugate(self):
         raise NotImplementedError('each smooth loss should implement its own get_conjugate')
 
@@ -92,6 +139,27 @@ class smooth_atom(smooth_composite):
         return self.get_conjugate()
  
 
+def column_sum(x):
+    """
+    Sum x over all but its last axis.
+    """
+    return x.reshape((-1, x.shape[-1])).sum(0)
+
+def batch_columns(value, x, columns=None):
+    """
+    Data of a smooth atom, such as its offset or responses, matched
+    to x, a subset of the columns of a batch. The data either has the
+    shape of a single column and is shared by all columns, or has one
+    column per problem in the batch, in which case the columns
+    given by the index `columns` are selected.
+    """
+    value = np.asarray(value)
+    if value.ndim < x.ndim:
+        return value.reshape(value.shape + (1,))
+    if columns is not None:
+        return value[...,columns]
+    return value
+
 def acceptable_init_args(cls, proposed_keywords):
     """
     Check that the keywords in the dictionary proposed_keywords are arguments to __init__ of class cls
@@ -145,7 +213,28 @@ class affine_smooth(smooth_atom):
     coef = property(_get_coef, _set_coef)
 
     def smooth_objective(self, x, mode='both', check_feasibility=False):
-        eta = self.affine_transform.affine_map(x)
+        eta = self.linear_predictor(x)
+        return self.smooth_objective_predictor(eta, mode=mode)
+
+    def linear_predictor(self, x):
+        """
+        The argument of self.sm_atom at x, i.e. 
+        ``self.affine_transform.affine_map(x)``.
+
+        As the map is affine, the linear predictor of an affine
+        combination of points is the same combination of their
+        linear predictors.
+        """
+        return self.affine_transform.affine_map(x)
+
+    def smooth_objective_predictor(self, eta, mode='both'):
+        """
+        Evaluate the smooth objective and/or its gradient
+        at the point whose linear predictor is eta.
+
+        This skips the forward product with self.affine_transform,
+        only the gradient requires the adjoint product.
+        """
         if mode == 'both':
             v, g = self.sm_atom.smooth_objective(eta, mode='both')
             if self.store_grad:
@@ -162,6 +251,65 @@ class affine_smooth(smooth_atom):
             v = self.sm_atom.smooth_objective(eta, mode='func')
             return v 
 
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        """
+        The smooth objective of each column of x. The forward and 
+        adjoint products are each a single product with a matrix.
+        """
+        eta = self.linear_predictor(x)
+        if mode == 'func':
+            return self.sm_atom.batch_smooth_objective(eta, mode='func', columns=columns)
+        elif mode == 'both':
+            v, g = self.sm_atom.batch_smooth_objective(eta, mode='both', columns=columns)
+            return v, self.affine_transform.adjoint_map(g).reshape(x.shape)
+        elif mode == 'grad':
+            g = self.sm_atom.batch_smooth_objective(eta, mode='grad', columns=columns)
+            return self.affine_transform.adjoint_map(g).reshape(x.shape)
+        raise ValueError("mode incorrectly specified")
+
+    def design_rows(self, rows):
+        """
+        The rows indexed by rows of the linear part of 
+        self.affine_transform and of its offset. The linear part must
+        be an array or a sparse matrix.
+        """
+        transform = self.affine_transform
+        if transform.noneD or transform.affineD or transform.diagD:
+            raise ValueError('minibatches need a linear part that is an array or a sparse matrix')
+        if transform.sparseD and not transform.sparseD_csr:
+            if not hasattr(self, '_csr_operator'):
+                self._csr_operator = sparse.csr_matrix(transform.linear_operator)
+            X = self._csr_operator
+        else:
+            X = transform.linear_operator
+        offset = transform.affine_offset
+        if offset is not None:
+            offset = offset[rows]
+        return X[rows], offset
+
+    def minibatch_smooth_objective(self, x, rows, mode='both'):
+        """
+        Estimate the smooth objective and/or its gradient
+        from the rows of the design indexed by rows. The terms
+        of self.sm_atom in rows are rescaled by the number of rows of
+        the design over the size of the minibatch, so the
+        estimates are unbiased when rows is a uniform sample.
+        """
+        X, offset = self.design_rows(rows)
+        eta = X.dot(x)
+        if offset is not None:
+            eta += offset
+        factor = self.affine_transform.output_shape[0] / float(len(rows))
+        if mode == 'func':
+            return factor * self.sm_atom.subset_smooth_objective(eta, rows, mode='func')
+        elif mode == 'both':
+            v, g = self.sm_atom.subset_smooth_objective(eta, rows, mode='both')
+            return factor * v, factor * X.T.dot(g).reshape(self.shape)
+        elif mode == 'grad':
+            g = self.sm_atom.subset_smooth_objective(eta, rows, mode='grad')
+            return factor * X.T.dot(g).reshape(self.shape)
+        raise ValueError("mode incorrectly specified")
+
     @property
     def dual(self):
         try: 
@@ -282,6 +430,79 @@ class logistic_deviance(smooth_atom):
         else:
             raise ValueError("mode incorrectly specified")
 
+    def hessian_diag(self, x):
+        """
+        The Hessian of the deviance at x, which is diagonal.
+        """
+        x = self.apply_offset(x)
+        prob = np.exp(x - np.logaddexp(0, x))
+        return 2 * self.scale(self.trials * prob * (1 - prob))
+
+    def gradient_lipschitz(self):
+        """
+        The largest possible value of hessian_diag.
+        """
+        return 0.5 * self.scale(np.max(self.trials))
+
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        """
+        Evaluate the deviance and/or its gradient for each column of x.
+        See `batch_columns` for the shapes of self.successes
+        and self.trials.
+        """
+        x = self.apply_batch_offset(x, columns)
+        successes = batch_columns(self.successes, x, columns)
+        trials = batch_columns(self.trials, x, columns)
+        # log(1+exp(x)) without overflow
+        log_exp_x = np.logaddexp(0, x)
+
+        if mode in ['both', 'func']:
+            f = -2 * self.scale(column_sum(successes * x) - column_sum(trials * log_exp_x))
+            if mode == 'func':
+                return f
+        if mode in ['both', 'grad']:
+            g = -2 * self.scale(successes - trials * np.exp(x - log_exp_x))
+            if mode == 'grad':
+                return g
+            return f, g
+        raise ValueError("mode incorrectly specified")
+
+    def subset_smooth_objective(self, x, rows, mode='both'):
+        """
+        Evaluate the terms of the deviance indexed by rows
+        and/or their gradient. See `smooth_atom.subset_smooth_objective`.
+        """
+        x = self.apply_subset_offset(x, rows)
+        successes = self.successes[rows]
+        trials = self.trials[rows]
+        log_exp_x = np.logaddexp(0, x)
+
+        if mode in ['both', 'func']:
+            f = -2 * self.scale(np.dot(successes, x) - np.dot(trials, log_exp_x))
+            if mode == 'func':
+                return f
+        if mode in ['both', 'grad']:
+            g = -2 * self.scale(successes - trials * np.exp(x - log_exp_x))
+            if mode == 'grad':
+                return g
+            return f, g
+        raise ValueError("mode incorrectly specified")
+
+    def conjugate_value(self, u):
+        """
+        The value of the conjugate of the deviance at u, which is
+        finite when the implied success probabilities are in [0,1].
+        """
+        u = np.asarray(u)
+        value = 0
+        if self.offset is not None:
+            value += np.sum(u * self.offset)
+        prob = (u / self.coef + 2 * self.successes) / (2 * self.trials)
+        if np.any(prob < 0) or np.any(prob > 1):
+            return np.inf
+        return value + 2 * self.coef * np.sum(self.trials * (xlogy(prob, prob) + 
+                                                             xlogy(1 - prob, 1 - prob)))
+
 
 class poisson_deviance(smooth_atom):
 
@@ -345,6 +566,65 @@ class poisson_deviance(smooth_atom):
         else:
             raise ValueError("mode incorrectly specified")
 
+    def hessian_diag(self, x):
+        """
+        The Hessian of the deviance at x, which is diagonal.
+        """
+        x = self.apply_offset(x)
+        return 2. * self.scale(np.exp(x))
+
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        """
+        Evaluate the deviance and/or its gradient for each column of x.
+        See `batch_columns` for the shape of self.counts.
+        """
+        x = self.apply_batch_offset(x, columns)
+        counts = batch_columns(self.counts, x, columns)
+        exp_x = np.exp(x)
+
+        if mode == 'both':
+            return (-2. * self.scale(column_sum(counts * x - exp_x)),
+                    -2. * self.scale(counts - exp_x))
+        elif mode == 'grad':
+            return -2. * self.scale(counts - exp_x)
+        elif mode == 'func':
+            return -2. * self.scale(column_sum(counts * x - exp_x))
+        else:
+            raise ValueError("mode incorrectly specified")
+
+    def conjugate_value(self, u):
+        """
+        The value of the conjugate of the deviance at u, which is
+        finite when the implied means are nonnegative.
+        """
+        u = np.asarray(u)
+        value = 0
+        if self.offset is not None:
+            value += np.sum(u * self.offset)
+        mean2 = u / self.coef + 2 * self.counts
+        if np.any(mean2 < 0):
+            return np.inf
+        return value + self.coef * np.sum(xlogy(mean2, mean2 / 2.) - mean2)
+
+    def subset_smooth_objective(self, x, rows, mode='both'):
+        """
+        Evaluate the terms of the deviance indexed by rows
+        and/or their gradient. See `smooth_atom.subset_smooth_objective`.
+        """
+        x = self.apply_subset_offset(x, rows)
+        counts = self.counts[rows]
+        exp_x = np.exp(x)
+
+        if mode == 'both':
+            return (-2. * self.scale(np.dot(counts, x) - np.sum(exp_x)),
+                    -2. * self.scale(counts - exp_x))
+        elif mode == 'grad':
+            return -2. * self.scale(counts - exp_x)
+        elif mode == 'func':
+            return -2. * self.scale(np.dot(counts, x) - np.sum(exp_x))
+        else:
+            raise ValueError("mode incorrectly specified")
+
 
 class multinomial_deviance(smooth_atom):
 
@@ -6,7 +6,7 @@ except ImportError:
     warnings.warn('cannot import some cholesky solvers from scipy')
 
 from ..affine import affine_transform
-from ..smooth import smooth_atom
+from ..smooth import smooth_atom, column_sum
 from ..problems.composite import smooth_conjugate
 from ..atoms.cones import zero
 from ..identity_quadratic import identity_quadratic
@@ -75,6 +75,82 @@ class quadratic(smooth_atom):
             else:
                 raise ValueError("mode incorrectly specified")
 
+    def hessian_diag(self, x):
+        """
+        The Hessian of the quadratic, if Q is None or diagonal.
+        """
+        if self.Q is None:
+            return self.scale(np.ones(x.shape))
+        if self.Q_transform.diagD:
+            return self.scale(self.Q_transform.linear_operator * np.ones(x.shape))
+        raise NotImplementedError('Hessian is not diagonal')
+
+    def gradient_lipschitz(self):
+        """
+        The largest eigenvalue of the Hessian, if Q is None or diagonal.
+        """
+        if self.Q is None:
+            return self.scale(1.)
+        if self.Q_transform.diagD:
+            return self.scale(np.fabs(self.Q_transform.linear_operator).max())
+        raise NotImplementedError('Hessian is not diagonal')
+
+    def subset_smooth_objective(self, x, rows, mode='both'):
+        """
+        Evaluate the terms of the quadratic indexed by rows
+        and/or their gradient, if Q is None or diagonal.
+        See `smooth_atom.subset_smooth_objective`.
+        """
+        x = self.apply_subset_offset(x, rows)
+        if self.Q is None:
+            Qx = x
+        elif self.Q_transform.diagD:
+            Qx = self.Q_transform.linear_operator[rows] * x
+        else:
+            raise NotImplementedError('quadratic is not a sum over the entries of its argument')
+        if mode == 'both':
+            return self.scale(np.dot(x, Qx)) / 2., self.scale(Qx, copy=True)
+        elif mode == 'grad':
+            return self.scale(Qx, copy=True)
+        elif mode == 'func':
+            return self.scale(np.dot(x, Qx)) / 2.
+        else:
+            raise ValueError("mode incorrectly specified")
+
+    def batch_smooth_objective(self, x, mode='both', columns=None):
+        """
+        Evaluate the quadratic and/or its gradient for each column of x.
+        """
+        x = self.apply_batch_offset(x, columns)
+        if self.Q is None:
+            Qx = x
+        elif self.Q_transform.diagD:
+            Qx = self.Q_transform.linear_operator[:,np.newaxis] * x
+        else:
+            Qx = self.Q_transform.linear_map(x)
+        if mode == 'both':
+            return self.scale(column_sum(x * Qx)) / 2., self.scale(Qx, copy=True)
+        elif mode == 'grad':
+            return self.scale(Qx, copy=True)
+        elif mode == 'func':
+            return self.scale(column_sum(x * Qx)) / 2.
+        else:
+            raise ValueError("mode incorrectly specified")
+
+    def conjugate_value(self, u):
+        """
+        The value of the conjugate of the quadratic at u, if Q is 
+        None or diagonal.
+        """
+        u = np.asarray(u)
+        value = 0
+        if self.offset is not None:
+            value += np.sum(u * self.offset)
+        if self.Q is None:
+            return value + np.sum(u**2) / (2. * self.coef)
+        elif self.Q_transform.diagD:
+            return value + np.sum(u**2 / self.Q_transform.linear_operator) / (2. * self.coef)
+        raise NotImplementedError('Q is not diagonal')
 
     def get_conjugate(self, factor=False, as_quadratic=False):
 
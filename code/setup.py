@@ -24,6 +24,7 @@ if __name__ == '__main__':
     cython_extension("regreg/atoms/projl1_cython.pyx")
     cython_extension("regreg/atoms/mixed_lasso_cython.pyx")
     cython_extension("regreg/atoms/piecewise_linear.pyx")
+    cython_extension("regreg/atoms/tv1d_cython.pyx")
     
     from numpy.distutils.core import setup
 
@@ -244,3 +244,141 @@ def test_normalize_intercept():
         Y[:,0] /= (np.linalg.norm(Y[:,0]) / np.sqrt(Y.shape[0]))
         Y *= np.sqrt(value)
         np.testing.assert_allclose(np.dot(Y, [2,4,6]), Xn.linear_map(np.array([2,4,6])))
+
+
+def test_threaded_matvec():
+    # products in blocks on threads agree with the products
+    import scipy.sparse
+    from regreg.affine.threaded import threaded_matvec
+
+    backend = threaded_matvec(n_threads=3, min_size=0)
+    X = np.random.standard_normal((50, 20)) * np.random.binomial(1, 0.3, (50, 20))
+    v = np.random.standard_normal(20)
+    u = np.random.standard_normal(50)
+    V = np.random.standard_normal((20, 4))
+    for M in [X, np.asfortranarray(X), scipy.sparse.csr_matrix(X),
+              scipy.sparse.csc_matrix(X), scipy.sparse.coo_matrix(X)]:
+        assert_array_almost_equal(backend.dot(M, v), np.dot(X, v))
+        assert_array_almost_equal(backend.adjoint_dot(M, u), np.dot(X.T, u))
+        assert_array_almost_equal(backend.dot(M, V), np.dot(X, V))
+
+        T = rr.linear_transform(M, backend=backend)
+        assert_array_almost_equal(T.linear_map(v), np.dot(X, v))
+        assert_array_almost_equal(T.adjoint_map(u), np.dot(X.T, u))
+
+    L = rr.normalize(X, backend=backend)
+    L0 = rr.normalize(X)
+    assert_array_almost_equal(L.linear_map(v), L0.linear_map(v))
+    assert_array_almost_equal(L.adjoint_map(u), L0.adjoint_map(u))
+    assert_true(L.slice_columns(np.arange(5)).backend is backend)
+
+
+def test_power_L_cache():
+    import scipy.sparse
+    from regreg.affine import (power_L, cached_lipschitz, lipschitz_bound,
+                               clear_lipschitz_cache)
+
+    X = np.random.standard_normal((40, 15))
+    L = np.linalg.svd(X, compute_uv=False)[0]**2
+    T = rr.linear_transform(X)
+    clear_lipschitz_cache()
+    assert_true(np.fabs(power_L(T, cache=True) - L) < 1.e-6 * L)
+    assert_true(np.fabs(power_L(X, cache=True) - L) < 1.e-6 * L)
+    # arrays are never cached
+    assert_true(cached_lipschitz(X) is None)
+
+    # a cached estimate is returned until the version changes
+    X[:] = 2 * X
+    assert_equal(power_L(T, cache=True), cached_lipschitz(T)[1])
+    T.lipschitz_version = 1
+    assert_true(np.fabs(power_L(T, cache=True) - 4 * L) < 1.e-6 * L)
+
+    # without cache the estimate is recomputed
+    X *= 3
+    assert_true(np.fabs(power_L(X) - 36 * L) < 1.e-6 * L)
+    assert_true(np.fabs(power_L(T) - 36 * L) < 1.e-6 * L)
+    S = scipy.sparse.csr_matrix(X)
+    power_L(S)
+    S *= 0.5
+    assert_true(np.fabs(power_L(S) - 9 * L) < 1.e-6 * L)
+
+    # the estimate of a normalize bounds those of its column slices
+    N = rr.normalize(X)
+    LN = power_L(N, cache=True)
+    for sliced in [N.slice_columns(np.arange(5)), N.slice_columns(np.arange(5), view=True)]:
+        assert_equal(lipschitz_bound(sliced), LN)
+        assert_true(power_L(sliced) <= LN * (1 + 1.e-6))
+    clear_lipschitz_cache(N)
+    assert_true(lipschitz_bound(N) is None)
+
+
+def test_divided_difference():
+    # matrix-free divided differences agree with products of 
+    # dense difference matrices
+    from regreg.affine.fused_lasso import (divided_difference, difference_transform,
+                                           trend_filter)
+
+    # the entries of the difference matrices are large for close knots, 
+    # so they are compared relative to their size
+    def assert_close(x, y):
+        np.testing.assert_allclose(x, y, rtol=1.e-10, 
+                                   atol=1.e-10 * np.fabs(y).max())
+
+    knots = np.sort(np.random.standard_normal(30))
+    knots[5] = knots[4] # a step of 0
+    for order in [1, 2, 3]:
+        n = knots.shape[0]
+        dense = np.identity(n)
+        for j in range(1, order+1):
+            D = (-np.identity(n-j+1) + np.diag(np.ones(n-j), k=1))[:-1]
+            steps = knots[j:] - knots[:-j]
+            inv_steps = np.zeros(steps.shape)
+            inv_steps[steps != 0] = 1. / steps[steps != 0]
+            dense = np.dot(np.dot(np.diag(inv_steps), D), dense)
+
+        T = divided_difference(knots[::-1], order=order)
+        x = np.random.standard_normal(n)
+        u = np.random.standard_normal(n - order)
+        X = np.random.standard_normal((n, 3))
+        assert_close(T.linear_map(x), np.dot(dense, x))
+        assert_close(T.adjoint_map(u), np.dot(dense.T, u))
+        assert_close(T.linear_map(X), np.dot(dense, X))
+        assert_close(T.adjoint_map(np.dot(dense, X)), 
+                     np.dot(dense.T, np.dot(dense, X)))
+        assert_close(T.tosparse().toarray(), dense)
+        assert_close(difference_transform(knots, order=order, sorted=True).toarray(),
+                     dense)
+        assert_close(trend_filter(n, order=order, knots=knots).linear_map(x),
+                     np.dot(dense, x))
+
+
+def test_image_differences():
+    from regreg.affine.image2d import image2d_differences, image_differences, formD
+
+    m, n = 7, 5
+    x = np.random.standard_normal((m, n))
+    u = np.random.standard_normal((m*n-1, 2))
+    D = image2d_differences((m, n))
+    M = formD(m, n)
+    assert_array_almost_equal(D.linear_map(x), (M * x.reshape(-1)).reshape((2,-1)).T)
+    assert_array_almost_equal(D.adjoint_map(u), (M.T * u.T.reshape(-1)).reshape((m, n)))
+
+    for shape in [(6,5), (4,3,5), (3,4,2,3)]:
+        masks = [None, np.random.binomial(1, 0.7, shape).astype(np.bool)]
+        for mask in masks:
+            D = image_differences(shape, mask=mask)
+            x = np.random.standard_normal(D.input_shape)
+            u = np.random.standard_normal(D.output_shape)
+            # the adjoint is exact
+            assert_array_almost_equal(np.sum(D.linear_map(x) * u), np.sum(x * D.adjoint_map(u)))
+            if mask is None:
+                for axis in range(len(shape)):
+                    diff = np.zeros(shape)
+                    index = [slice(None)] * len(shape)
+                    index[axis] = slice(0, -1)
+                    diff[tuple(index)] = np.diff(x, axis=axis)
+                    assert_array_almost_equal(D.linear_map(x)[:,axis], diff.reshape(-1))
+            else:
+                # constant images have no differences, 
+                # even across the boundary of the mask
+                assert_array_almost_equal(D.linear_map(np.ones(D.input_shape)), 0)
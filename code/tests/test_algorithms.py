@@ -0,0 +1,430 @@
+import numpy as np
+from scipy import sparse
+
+from regreg.atoms.mixed_lasso import (UNPENALIZED, L1_PENALTY, POSITIVE_PART,
+                                      NONNEGATIVE)
+
+import regreg.api as rr
+
+from test_seminorms import ac
+
+def lasso_problem(n=100, p=20, lagrange=2.):
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal(n)
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, lagrange=lagrange)
+    return rr.simple_problem(loss, penalty)
+
+def test_workspace():
+    problem = lasso_problem()
+
+    solver = rr.FISTA(problem)
+    solver.fit(tol=1.e-12, max_its=2000)
+    coefs = problem.coefs.copy()
+
+    problem.coefs[:] = 0
+    ws_solver = rr.FISTA(problem)
+    original = problem.coefs
+    ws_solver.fit(tol=1.e-12, max_its=2000, workspace=True)
+
+    yield ac, coefs, problem.coefs, 'workspace FISTA agrees with FISTA'
+    yield np.testing.assert_, problem.coefs is original, 'coefs updated in place'
+
+    # a second fit reuses the same buffers
+    ws = ws_solver.get_workspace()
+    ws_solver.fit(tol=1.e-12, max_its=2000, workspace=True)
+    yield np.testing.assert_, ws_solver.get_workspace() is ws, 'workspace reused'
+    yield ac, coefs, problem.coefs, 'workspace FISTA warm started'
+
+def test_workspace_no_history():
+    problem = lasso_problem()
+    solver = rr.FISTA(problem)
+    value = solver.fit(tol=1.e-10, workspace=True, return_objective_hist=False)
+    np.testing.assert_equal(value, None)
+
+def test_proximal_out():
+    Z = np.random.standard_normal(30)
+    penalty = rr.l1norm(30, lagrange=0.4, offset=np.ones(30))
+    q = rr.identity_quadratic(1.3, Z, 0, 0)
+    out = np.zeros(30)
+    value = penalty.proximal_step(q, out=out)
+    yield np.testing.assert_, value is out, 'prox written to out'
+    yield ac, out, penalty.proximal(q), 'prox with out agrees with prox'
+
+    # an atom that does not write into out directly
+    cone = rr.nonnegative(30)
+    out = np.zeros(30)
+    value = cone.proximal_step(q, out=out)
+    yield np.testing.assert_, value is out, 'cone prox copied to out'
+    yield ac, out, cone.proximal(q), 'cone prox with out agrees with prox'
+
+def test_linear_predictor():
+    n, p = 200, 30
+    X = np.random.standard_normal((n, p))
+    Y = np.random.binomial(1, 0.5, size=(n,))
+    penalty = rr.l1norm(p, lagrange=0.02)
+    for loss in [rr.logistic_loss(X, Y),
+                 rr.squared_error(X, np.random.standard_normal(n))]:
+        problem = rr.simple_problem(loss, penalty)
+        yield np.testing.assert_, problem.has_linear_predictor
+
+        solver = rr.FISTA(problem)
+        solver.fit(tol=1.e-12, max_its=1000)
+        coefs = problem.coefs.copy()
+
+        for workspace in [False, True]:
+            problem.coefs[:] = 0
+            solver = rr.FISTA(problem)
+            solver.fit(tol=1.e-12, max_its=1000, workspace=workspace,
+                       track_linear_predictor=True)
+            yield ac, coefs, problem.coefs, 'tracking linear predictor agrees with FISTA'
+
+    eta = loss.linear_predictor(coefs)
+    yield ac, eta, np.dot(X, coefs), 'linear predictor'
+    v, g = loss.smooth_objective(coefs)
+    vp, gp = loss.smooth_objective_predictor(eta)
+    yield ac, v, vp, 'objective from linear predictor'
+    yield ac, g, gp, 'gradient from linear predictor'
+
+    # a problem whose smooth part is not an affine_smooth
+    problem = rr.simple_problem(rr.signal_approximator(np.random.standard_normal(p)), penalty)
+    yield np.testing.assert_, not problem.has_linear_predictor
+    solver = rr.FISTA(problem)
+    def fit_tracking():
+        solver.fit(track_linear_predictor=True)
+    yield np.testing.assert_raises, ValueError, fit_tracking
+
+def test_batched():
+    n, p, k = 100, 20, 5
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal((n, k))
+    successes = np.random.binomial(1, 0.5, size=(n, k))
+
+    for loss, responses, penalty in [
+        (rr.squared_error, Y, rr.l1norm(p, lagrange=5.)),
+        (rr.logistic_loss, successes, rr.l1norm(p, lagrange=0.02)),
+        # a penalty without a vectorized batch prox
+        (rr.squared_error, Y, rr.l2norm(p, lagrange=20.))]:
+
+        problem = rr.simple_problem(loss(X, responses), penalty)
+        batch_coefs = problem.solve_batched(k=k, tol=1.e-12, max_its=5000)
+        yield np.testing.assert_equal, batch_coefs.shape, (p, k)
+
+        for j in range(k):
+            single = rr.simple_problem(loss(X, responses[:,j]), penalty)
+            coefs = single.solve(tol=1.e-12, max_its=5000)
+            yield ac, coefs, batch_coefs[:,j], 'batched solution agrees with single problem'
+
+def test_batch_smooth_objective():
+    n, p, k = 50, 10, 4
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal((n, k))
+    B = np.random.standard_normal((p, k))
+    loss = rr.squared_error(X, Y)
+    v, g = loss.batch_smooth_objective(B)
+    for j in range(k):
+        single = rr.squared_error(X, Y[:,j])
+        vj, gj = single.smooth_objective(B[:,j])
+        yield ac, v[j], vj, 'batched objective'
+        yield ac, g[:,j], gj, 'batched gradient'
+
+    # a subset of the columns of the batch
+    columns = np.array([3, 1])
+    v, g = loss.batch_smooth_objective(B[:,columns], columns=columns)
+    vj, gj = rr.squared_error(X, Y[:,1]).smooth_objective(B[:,1])
+    yield ac, v[1], vj, 'batched objective on a subset of columns'
+    yield ac, g[:,1], gj, 'batched gradient on a subset of columns'
+
+    # a diagonal Q, with as many columns in the batch as coordinates
+    Qdiag = np.random.uniform(0.5, 2, p)
+    offset = np.random.standard_normal(p)
+    B = np.random.standard_normal((p, p))
+    for Q, diag in [(Qdiag, True), (np.diag(Qdiag), False)]:
+        loss = rr.quadratic(p, coef=2., Q=Q, Qdiag=diag, offset=offset)
+        v, g = loss.batch_smooth_objective(B)
+        for j in range(p):
+            vj, gj = loss.smooth_objective(B[:,j])
+            yield ac, v[j], vj, 'batched objective with a diagonal Q'
+            yield ac, g[:,j], gj, 'batched gradient with a diagonal Q'
+
+def test_proximal_newton():
+    n, p = 500, 20
+    X = np.random.standard_normal((n, p))
+    beta = np.zeros(p)
+    beta[:3] = 0.3
+    successes = np.random.binomial(1, 0.5, size=(n,))
+    counts = np.random.poisson(np.exp(np.dot(X, beta)))
+
+    groups = np.arange(p) // 4
+    for loss, penalty in [
+        (rr.logistic_loss(X, successes), rr.l1norm(p, lagrange=0.02)),
+        (rr.affine_smooth(rr.poisson_deviance(n, counts, coef=1./n), X), rr.l1norm(p, lagrange=0.05)),
+        # a sparse design matrix
+        (rr.logistic_loss(sparse.csr_matrix(X), successes), rr.l1norm(p, lagrange=0.02)),
+        # a linear operator
+        (rr.logistic_loss(rr.normalize(X), successes), rr.l1norm(p, lagrange=0.02)),
+        (rr.logistic_loss(rr.block_design.from_array(X, block_rows=120), successes), 
+         rr.l1norm(p, lagrange=0.02)),
+        (rr.logistic_loss(X, successes), rr.mixed_lasso(groups, lagrange=0.02)),
+        # the penalty moves coordinates at 0
+        (rr.logistic_loss(X, successes), rr.l1norm(p, lagrange=0.02, 
+                                                   quadratic=rr.identity_quadratic(0, 0, np.linspace(-0.05, 0.05, p), 0)))]:
+
+        problem = rr.simple_problem(loss, penalty)
+        coefs = problem.solve(tol=1.e-14, max_its=10000).copy()
+
+        problem.coefs[:] = 0
+        solver = rr.proximal_newton(problem)
+        solver.fit(tol=1.e-12)
+        yield ac, coefs, problem.coefs, 'proximal Newton agrees with FISTA'
+        yield np.testing.assert_, solver.iterations < 20, 'proximal Newton takes few iterations'
+        yield (np.testing.assert_equal, solver.restrict, penalty.quadratic.iszero, 
+               'the model is restricted to a working set')
+        if not isinstance(solver.design, (np.ndarray, sparse.csc_matrix)):
+            # the design is not made dense
+            yield np.testing.assert_equal, solver.design, loss.affine_transform.linear_operator
+
+    # needs an affine_smooth
+    problem = rr.simple_problem(rr.signal_approximator(np.random.standard_normal(p)),
+                                rr.l1norm(p, lagrange=0.1))
+    yield np.testing.assert_raises, ValueError, rr.proximal_newton, problem
+
+def test_working_set_problem():
+    from regreg.problems.simple import working_set_problem, WorkingSetError
+    p = 20
+    working_set = np.array([0, 3, 4, 5, 11, 12, 19])
+    structure = np.array([UNPENALIZED] + [L1_PENALTY] * 3 + [POSITIVE_PART] * 2 + 
+                         [NONNEGATIVE] * 2 + [0] * 4 + [1] * 4 + [2] * 4)
+    weights = np.random.uniform(0.5, 2, p)
+    model = rr.quadratic(working_set.shape, coef=1.)
+    for atom in [rr.l1norm(p, lagrange=0.5),
+                 rr.l1norm(p, bound=0.5),
+                 rr.supnorm(p, lagrange=0.5),
+                 rr.l2norm(p, bound=0.5),
+                 rr.weighted_l1norm(p, weights, lagrange=0.5),
+                 rr.weighted_supnorm(p, weights, bound=0.5),
+                 rr.mixed_lasso(structure, 0.5)]:
+        problem = working_set_problem(model, atom, working_set)
+        yield np.testing.assert_, problem.restricted_atom is not None
+        q = rr.identity_quadratic(1.5, np.random.standard_normal(working_set.shape), 
+                                  np.random.standard_normal(working_set.shape), 0)
+        Q = rr.identity_quadratic(1.5, problem.embed(q.center), problem.embed(q.linear_term), 0)
+        yield ac, problem.proximal(q), atom.proximal(Q)[working_set], 'restricted proximal map of %s' % atom
+        x = np.random.standard_normal(working_set.shape)
+        yield ac, problem.nonsmooth_objective(x), atom.nonsmooth_objective(problem.embed(x))
+
+    # an atom that moves coordinates outside the working set
+    atom = rr.l1norm(p, lagrange=0.5, quadratic=rr.identity_quadratic(0, 0, np.ones(p), 0))
+    problem = working_set_problem(model, atom, working_set)
+    yield np.testing.assert_, problem.restricted_atom is None
+    q = rr.identity_quadratic(1., 0, 0, 0)
+    yield np.testing.assert_raises, WorkingSetError, problem.proximal, q
+
+def test_minibatch_smooth_objective():
+    n, p = 60, 10
+    X = np.random.standard_normal((n, p))
+    beta = np.random.standard_normal(p) * 0.2
+    successes = np.random.binomial(1, 0.5, size=(n,))
+    counts = np.random.poisson(1, size=(n,))
+    rows = np.arange(n)
+    first, second = rows[:25], rows[25:]
+
+    for loss in [rr.squared_error(X, np.random.standard_normal(n)),
+                 rr.logistic_loss(X, successes),
+                 rr.logistic_loss(sparse.csc_matrix(X), successes),
+                 rr.affine_smooth(rr.poisson_deviance(n, counts), X)]:
+        v, g = loss.smooth_objective(beta)
+        vb, gb = loss.minibatch_smooth_objective(beta, rows)
+        yield ac, v, vb, 'minibatch of all rows'
+        yield ac, g, gb, 'minibatch gradient of all rows'
+
+        # rescaled minibatches of a partition of the rows
+        v1, g1 = loss.minibatch_smooth_objective(beta, first)
+        v2, g2 = loss.minibatch_smooth_objective(beta, second)
+        yield ac, v, (25 * v1 + 35 * v2) / n, 'minibatches of a partition'
+        yield ac, g, (25 * g1 + 35 * g2) / n, 'minibatch gradients of a partition'
+
+def test_variance_reduced():
+    n, p = 2000, 10
+    X = np.random.standard_normal((n, p))
+    beta = np.zeros(p)
+    beta[:3] = 0.3
+    eta = np.dot(X, beta)
+    successes = np.random.binomial(1, np.exp(eta) / (1 + np.exp(eta)))
+    counts = np.random.poisson(np.exp(eta))
+    Y = eta + np.random.standard_normal(n)
+
+    for loss, lagrange in [
+        (rr.squared_error(X / np.sqrt(n), Y / np.sqrt(n)), 0.05),
+        (rr.logistic_loss(X, successes), 0.02),
+        (rr.affine_smooth(rr.poisson_deviance(n, counts, coef=1./n), X), 0.05)]:
+
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=lagrange))
+        coefs = problem.solve(tol=1.e-14, max_its=10000).copy()
+
+        for solver in [rr.saga, rr.svrg]:
+            problem.coefs[:] = 0
+            solver(problem, batch_size=50, seed=0).fit(tol=1.e-9)
+            yield ac, coefs, problem.coefs, '%s agrees with FISTA' % solver.__name__
+
+    # needs an affine_smooth
+    problem = rr.simple_problem(rr.signal_approximator(np.random.standard_normal(p)),
+                                rr.l1norm(p, lagrange=0.1))
+    yield np.testing.assert_raises, ValueError, rr.saga, problem
+
+def test_step_policy():
+    # well conditioned, so that the coefficients, not only
+    # the objective, are determined to the tolerance of ac
+    n, p = 200, 50
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal(n)
+    successes = np.random.binomial(1, 0.5, size=(n,))
+
+    for loss, lagrange in [(rr.squared_error(X, Y), 10.),
+                           (rr.logistic_loss(X, successes), 2.)]:
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=lagrange))
+        coefs = problem.solve(tol=1.e-14, max_its=20000).copy()
+
+        for policy in ['backtracking', 'bb', 'sgb', 'restart',
+                       rr.barzilai_borwein(gradient_restart=True),
+                       rr.scheinberg_goldfarb_bai(decrease=0.8)]:
+            for track in [False, True]:
+                problem.coefs[:] = 0
+                solver = rr.FISTA(problem)
+                solver.fit(tol=1.e-12, max_its=20000, step_policy=policy,
+                           track_linear_predictor=track, workspace=track)
+                yield ac, coefs, problem.coefs, 'step policy %s agrees with FISTA' % str(policy)
+                yield np.testing.assert_, solver.rejected_trials >= 0
+
+    solver = rr.FISTA(problem)
+    def fit_unknown():
+        solver.fit(step_policy='unknown')
+    yield np.testing.assert_raises, ValueError, fit_unknown
+
+def test_duality_gap():
+    n, p = 100, 20
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal(n)
+    successes = np.random.binomial(1, 0.5, size=(n,))
+    counts = np.random.poisson(1, size=(n,))
+    structure = np.array([UNPENALIZED] + [L1_PENALTY] * 10 + [POSITIVE_PART] * 3 + 
+                         [NONNEGATIVE] * 2 + [0, 0, 1, 1])
+
+    for loss in [rr.squared_error(X, Y),
+                 rr.logistic_loss(X, successes),
+                 rr.affine_smooth(rr.poisson_deviance(n, counts, coef=1./n), X)]:
+        for penalty in [rr.l1norm(p, lagrange=0.1),
+                        rr.l2norm(p, lagrange=0.3),
+                        rr.l1norm(p, bound=0.5),
+                        rr.mixed_lasso(structure, 0.05)]:
+            problem = rr.simple_problem(loss, penalty)
+            problem.coefs[:] = 0
+            solver = rr.FISTA(problem)
+            solver.fit(tol=1.e-14, min_its=500, max_its=5000)
+            best = problem.objective(problem.coefs)
+            yield np.testing.assert_, problem.duality_gap(problem.coefs) < 1.e-6, 'duality gap at the solution'
+
+            # the gap bounds the suboptimality of early iterates
+            problem.coefs[:] = 0
+            solver.fit(max_its=5, min_its=5, tol=0)
+            gap = problem.duality_gap(problem.coefs)
+            yield np.testing.assert_, problem.objective(problem.coefs) - best <= gap + 1.e-10, 'duality gap bounds suboptimality'
+
+            problem.coefs[:] = 0
+            solver.fit(gap_tol=1.e-8, gap_every=5, tol=0)
+            yield np.testing.assert_, solver.duality_gap / max(1, abs(best)) < 1.e-8, 'fit stops with certified gap'
+            yield np.testing.assert_, problem.objective(problem.coefs) - best <= solver.duality_gap + 1.e-12
+
+    # a penalty without a dual seminorm
+    problem = rr.simple_problem(rr.squared_error(X, Y), rr.nonnegative(p))
+    yield np.testing.assert_raises, ValueError, problem.duality_gap, np.zeros(p)
+
+def test_duality_gap_offset():
+    n, p = 100, 20
+    X = np.random.standard_normal((n, p))
+    Y = np.random.standard_normal(n)
+    b = np.random.standard_normal(n) * 3
+    structure = np.array([UNPENALIZED] + [L1_PENALTY] * 10 + [POSITIVE_PART] * 3 + 
+                         [NONNEGATIVE] * 2 + [0, 0, 1, 1])
+    # the dual seminorm of mixed_lasso_conjugate is infinite if the 
+    # (rounded) gradient has the wrong sign on sign constrained coordinates
+    unsigned_structure = np.array([UNPENALIZED] + [L1_PENALTY] * 15 + [0, 0, 1, 1])
+
+    # the loss is evaluated at X beta + b
+    loss = rr.affine_smooth(rr.signal_approximator(Y), rr.affine_transform(X, b))
+    for penalty in [rr.l1norm(p, lagrange=0.1),
+                    rr.l1norm(p, bound=0.5),
+                    rr.mixed_lasso(structure, 0.05),
+                    rr.mixed_lasso_conjugate(unsigned_structure, 0.5)]:
+        problem = rr.simple_problem(loss, penalty)
+        problem.coefs[:] = 0
+        solver = rr.FISTA(problem)
+        solver.fit(tol=1.e-14, min_its=500, max_its=5000)
+        best = problem.objective(problem.coefs)
+        gap = problem.duality_gap(problem.coefs)
+        yield np.testing.assert_, np.fabs(gap) < 1.e-6, 'duality gap at the solution with an offset'
+
+        problem.coefs[:] = 0
+        solver.fit(max_its=5, min_its=5, tol=0)
+        gap = problem.duality_gap(problem.coefs)
+        yield np.testing.assert_, problem.objective(problem.coefs) - best <= gap + 1.e-10, 'duality gap bounds suboptimality'
+
+def test_monitor():
+    problem = lasso_problem()
+    history = []
+    solver = rr.FISTA(problem)
+    with rr.monitor(callback=lambda solver, info: history.append(info['objective'])) as m:
+        solver.fit(tol=1.e-10, max_its=500)
+    summary = m.as_dict()
+    counts = summary['counts']
+
+    yield ac, len(history), counts['iterations'], 'callback called once per iteration'
+    # the last iteration checks convergence and is not counted by the solver
+    yield np.testing.assert_, counts['iterations'] - solver.iterations in [0, 1]
+    yield ac, counts['proximal'], counts['backtrack_trials']
+    yield ac, counts['rejected_trials'], solver.rejected_trials
+    # each smooth objective evaluation is one product with X and 
+    # gradients need another one with X^T 
+    yield ac, counts['linear_map'], sum([v for k, v in counts.items() if k.startswith('smooth_objective')])
+    yield ac, counts['adjoint_map'], counts['smooth_objective[both]'] + counts.get('smooth_objective[grad]', 0)
+    yield np.testing.assert_, summary['times']['proximal'] <= summary['elapsed'] 
+    yield ac, len(summary['solves']), 1
+    yield np.testing.assert_equal, summary['solves'][0]['counts'], counts
+    yield ac, summary['solves'][0]['iterations'], solver.iterations
+    yield np.testing.assert_equal, summary['solves'][0]['solver'], 'FISTA'
+
+    # nothing is recorded once the monitor is not active
+    solver.fit(tol=1.e-10, max_its=500)
+    yield ac, m.as_dict()['counts']['iterations'], counts['iterations']
+
+    # power_L and nested solves in a container
+    X = np.random.standard_normal((30, 10))
+    with rr.monitor() as m:
+        L = rr.power_L(X)
+        problem = rr.container(rr.squared_error(np.identity(10), np.random.standard_normal(10)),
+                               rr.l1norm.linear(X, lagrange=0.5))
+        problem.solve(tol=1.e-6, max_its=20)
+    summary = m.as_dict()
+    yield np.testing.assert_, summary['counts']['container.proximal'] > 0
+    # the container estimates its Lipschitz constant once
+    yield ac, summary['counts']['power_L'], 2
+    yield np.testing.assert_, len(summary['solves']) > 1
+    yield np.testing.assert_equal, [s['depth'] for s in summary['solves']][-1], 0
+
+    # proximal Newton and the stochastic solvers call the monitor 
+    # once per (outer) iteration or epoch
+    n, p = 500, 10
+    X = np.random.standard_normal((n, p))
+    problem = rr.simple_problem(rr.logistic_loss(X, np.random.binomial(1, 0.5, size=(n,))),
+                                rr.l1norm(p, lagrange=0.02))
+    for solver in [rr.proximal_newton(problem), 
+                   rr.saga(problem, batch_size=50, seed=0),
+                   rr.svrg(problem, batch_size=50, seed=0)]:
+        problem.coefs[:] = 0
+        history = []
+        with rr.monitor(callback=lambda s, info: history.append((s, info))) as m:
+            solver.fit(tol=1.e-8)
+        outer = [info for s, info in history if s is solver]
+        yield ac, len(outer), getattr(solver, 'iterations', getattr(solver, 'epochs', None))
+        yield np.testing.assert_equal, [info['iteration'] for info in outer], range(len(outer))
+        yield np.testing.assert_, None not in [info['objective'] for info in outer]
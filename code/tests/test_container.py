@@ -200,3 +200,27 @@ def test_quadratic_for_smooth2():
                        'dual problem with loss having a quadratic',
                        'container with loss having a quadratic']):
         yield ac, aq, p, msg
+
+def test_power_L_once():
+    # the Lipschitz constant of the dual problems is estimated
+    # once, not on every proximal step
+    from regreg.affine.fused_lasso import difference_transform
+    n = 30
+    Y = np.random.standard_normal(n)
+    D = difference_transform(np.arange(n), transform=True)
+    problem = rr.container(rr.signal_approximator(Y), 
+                           rr.l1norm.linear(D, lagrange=0.5),
+                           rr.l1norm(n, lagrange=0.2))
+    with rr.monitor() as m:
+        rr.FISTA(problem).fit(max_its=5, min_its=5, tol=0)
+    counts = m.as_dict()['counts']
+    np.testing.assert_(counts['container.proximal'] >= 5)
+    np.testing.assert_equal(counts['power_L'], 1)
+
+    # a new estimate only when the version of the transform changes
+    with rr.monitor() as m:
+        problem.transform_lipschitz()
+        problem.transform.lipschitz_version = 1
+        problem.transform_lipschitz()
+        problem.transform_lipschitz()
+    np.testing.assert_equal(m.as_dict()['counts']['power_L'], 1)
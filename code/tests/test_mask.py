@@ -0,0 +1,64 @@
+import numpy as np
+import nose.tools as nt
+
+from regreg.mask import prepare_adj, create_D, graph_D, convert_to_array
+
+def loop_adj(mask, numx=1, numy=1, numz=1, regions=None):
+    """
+    The adjacency list of `prepare_adj` computed
+    with a loop over the voxels.
+    """
+    vmap = -np.ones(mask.shape, np.int)
+    vmap[mask] = np.arange(mask.sum())
+    if regions is None:
+        regions = np.zeros(mask.shape)
+    adj = []
+    nx, ny, nz = mask.shape
+    for i, j, k in zip(*np.nonzero(mask)):
+        box = (slice(max(i-numx,0), i+numx+1),
+               slice(max(j-numy,0), j+numy+1),
+               slice(max(k-numz,0), k+numz+1))
+        nbrs = vmap[box][mask[box] & (regions[box] == regions[i,j,k])]
+        nbrs[nbrs == vmap[i,j,k]] = -1
+        adj.append(nbrs)
+    return adj
+
+def loop_D(adj):
+    rows = []
+    for i in range(adj.shape[0]):
+        for nbr in adj[i]:
+            if nbr > i:
+                row = np.zeros(adj.shape[0])
+                row[i], row[nbr] = 1, -1
+                rows.append(row)
+    return np.array(rows)
+
+def test_prepare_adj():
+    np.random.seed(0)
+    mask = np.random.binomial(1, 0.6, (6,7,5)).astype(np.bool)
+    regions = np.random.random_integers(0, 2, mask.shape)
+    for radius in [(1,1,1), (2,1,0), (0,0,1)]:
+        for R in [None, regions]:
+            adj = prepare_adj(mask, *radius, regions=R)
+            expected = loop_adj(mask, *radius, regions=R)
+            np.testing.assert_equal(adj, convert_to_array(expected))
+            for a, b in zip(prepare_adj(mask, *radius, regions=R, return_array=False), expected):
+                np.testing.assert_equal(a, b)
+
+            D = create_D(adj)
+            nt.assert_equal(D.shape[0], np.sum(adj > -1) // 2)
+            np.testing.assert_allclose(D.toarray(), loop_D(adj))
+            np.testing.assert_allclose(graph_D(mask, radius, R).toarray(), D.toarray())
+
+def test_4d_mask():
+    np.random.seed(1)
+    mask = np.random.binomial(1, 0.7, (3,4,5,6)).astype(np.bool)
+    adj = prepare_adj(mask, radius=(1,1,1,1))
+
+    # the center voxel of a full 3x3x3x3 mask has 80 neighbors
+    full_adj = prepare_adj(np.ones((3,3,3,3)), radius=(1,1,1,1))
+    nt.assert_equal(full_adj.shape, (81, 81))
+    nt.assert_equal(np.sum(full_adj[40] > -1), 80)
+    D = graph_D(mask, (1,1,1,1))
+    nt.assert_equal(D.shape, (np.sum(adj > -1) // 2, mask.sum()))
+    np.testing.assert_allclose(D.toarray(), create_D(adj).toarray())
@@ -1,4 +1,5 @@
 import numpy as np
+import scipy.sparse
 import regreg.api as rr
 from regreg.identity_quadratic import identity_quadratic as sq
 import nose.tools as nt
@@ -524,3 +525,41 @@ def test_centering_fit_inplace(debug=False):
 
     nt.assert_true(np.linalg.norm(coefs - coefs2) / max(np.linalg.norm(coefs),1) < 1.0e-04)
 
+
+def test_slice_columns_view():
+    """
+    This test verifies that column views of normalized
+    transforms agree with copies of the columns.
+    """
+    X = np.random.standard_normal((40,30))
+    X *= np.random.binomial(1, 0.3, X.shape) # sparse columns
+    columns = np.zeros(30, np.bool)
+    columns[[1,3,4,11,20,29]] = True
+    for M in [X, scipy.sparse.csc_matrix(X), scipy.sparse.csr_matrix(X)]:
+        for center, scale in [(True, True), (True, False), (False, True)]:
+            L = rr.normalize(M, center=center, scale=scale)
+            for index_obj in [columns, list(np.nonzero(columns)[0]), slice(3,17)]:
+                copied = L.slice_columns(index_obj)
+                view = L.slice_columns(index_obj, view=True)
+                view.block_bytes = 80 # several blocks of columns
+                nt.assert_false(view.materialized)
+
+                beta = np.random.standard_normal(copied.input_shape)
+                np.testing.assert_almost_equal(view.linear_map(beta), copied.linear_map(beta))
+                y = np.random.standard_normal(40)
+                np.testing.assert_almost_equal(view.adjoint_map(y), copied.adjoint_map(y))
+                B = np.random.standard_normal(copied.input_shape + (3,))
+                np.testing.assert_almost_equal(view.linear_map(B), copied.linear_map(B))
+                U = np.random.standard_normal((40,3))
+                np.testing.assert_almost_equal(view._adjoint_product(U), copied._adjoint_product(U))
+                nt.assert_false(view.materialized)
+                if scipy.sparse.issparse(M):
+                    # the csc format of the parent is shared by its views
+                    nt.assert_true(scipy.sparse.isspmatrix_csc(view._csc))
+                    nt.assert_true(L.slice_columns(index_obj, view=True)._csc is view._csc)
+
+                view.materialize_after = 4
+                np.testing.assert_almost_equal(view.adjoint_map(y), copied.adjoint_map(y))
+                nt.assert_true(view.materialized)
+                np.testing.assert_almost_equal(view.materialize().linear_map(beta), 
+                                               copied.linear_map(beta))
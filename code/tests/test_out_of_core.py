@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import regreg.api as rr
+import nose.tools as nt
+
+def designs(X, tempdir):
+    """
+    X stored as a memory mapped .npy file, as several .npy files
+    and as an .npz file.
+    """
+    filename = os.path.join(tempdir, 'X.npy')
+    np.save(filename, X)
+    yield rr.block_design.from_array(filename, block_rows=7)
+
+    filenames = []
+    for i, rows in enumerate([slice(0,20), slice(20,21), slice(21,None)]):
+        filenames.append(os.path.join(tempdir, 'X_%d.npy' % i))
+        np.save(filenames[-1], X[rows])
+    yield rr.block_design.from_npy(filenames)
+
+    filename = os.path.join(tempdir, 'X.npz')
+    np.savez(filename, *[X[rows] for rows in [slice(0,30), slice(30,None)]])
+    yield rr.block_design.from_npz(filename)
+
+def test_block_design():
+    X = np.random.standard_normal((50,8))
+    beta = np.random.standard_normal(8)
+    y = np.random.standard_normal(50)
+    tempdir = tempfile.mkdtemp()
+    try:
+        for design in designs(X, tempdir):
+            nt.assert_equal(design.shape, X.shape)
+            np.testing.assert_allclose(design.linear_map(beta), np.dot(X, beta))
+            np.testing.assert_allclose(design.adjoint_map(y), np.dot(X.T, y))
+            B = np.random.standard_normal((8,3))
+            np.testing.assert_allclose(design.linear_map(B), np.dot(X, B))
+
+            sums, sumsq = design.column_moments()
+            np.testing.assert_allclose(sums, X.sum(0))
+            np.testing.assert_allclose(sumsq, (X**2).sum(0))
+
+            columns = [1,4,5]
+            np.testing.assert_allclose(design[:,columns].linear_map(beta[columns]),
+                                       np.dot(X[:,columns], beta[columns]))
+            np.testing.assert_allclose(design[:,columns].toarray(), X[:,columns])
+            X1 = np.hstack([np.ones((50,1)), X])
+            np.testing.assert_allclose(design.with_intercept()[:,[0,2]].adjoint_map(y),
+                                       np.dot(X1[:,[0,2]].T, y))
+
+            for center, scale in [(True, True), (False, True), (True, False)]:
+                L = rr.normalize(design, center=center, scale=scale)
+                L0 = rr.normalize(X, center=center, scale=scale)
+                if scale:
+                    np.testing.assert_allclose(L.col_stds, L0.col_stds)
+                np.testing.assert_allclose(L.linear_map(beta), L0.linear_map(beta))
+                np.testing.assert_allclose(L.adjoint_map(y), L0.adjoint_map(y))
+                view = L.slice_columns(np.array(columns), view=True)
+                np.testing.assert_allclose(view.adjoint_map(y), L0.slice_columns(columns).adjoint_map(y))
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_row_subset():
+    from regreg.affine.out_of_core import row_subset
+
+    X = np.random.standard_normal((50,8))
+    rows = np.random.binomial(1, 0.7, 50).astype(np.bool)
+    y = np.random.standard_normal(rows.sum())
+    X1 = np.hstack([np.ones((50,1)), X])
+    for index in [rows, np.nonzero(rows)[0]]:
+        for design, X0 in [(row_subset(X, index), X), 
+                           (row_subset(X, index).with_intercept(), X1),
+                           (row_subset(X, index).with_intercept()[:,[0,3,4]], X1[:,[0,3,4]]),
+                           (row_subset(X, index)[:,[2,5]], X[:,[2,5]])]:
+            X0 = X0[rows]
+            beta = np.random.standard_normal(X0.shape[1])
+            nt.assert_equal(design.shape, X0.shape)
+            np.testing.assert_allclose(design.linear_map(beta), np.dot(X0, beta))
+            np.testing.assert_allclose(design.adjoint_map(y), np.dot(X0.T, y))
+            B = np.random.standard_normal((X0.shape[1],3))
+            np.testing.assert_allclose(design.linear_map(B), np.dot(X0, B))
+            sums, sumsq = design.column_moments()
+            np.testing.assert_allclose(sums, X0.sum(0))
+            np.testing.assert_allclose(sumsq, (X0**2).sum(0))
+            np.testing.assert_allclose(design.toarray(), X0)
+
+def test_block_design_path():
+    X = np.random.standard_normal((100,10))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:3], [3,4,5])
+    sol1 = rr.lasso.squared_error(X, Y, nstep=15).main(inner_tol=1.e-12)
+    tempdir = tempfile.mkdtemp()
+    try:
+        for design in designs(X, tempdir):
+            path = rr.lasso.squared_error(design, Y, nstep=15)
+            sol2 = path.main(inner_tol=1.e-12)
+            # restricted problems use their columns read into memory
+            candidate_set = np.zeros(path.shape[1], np.bool)
+            candidate_set[[1,2,4]] = True
+            Xslice = path.sliced_design(candidate_set)
+            nt.assert_true(isinstance(Xslice.M, np.ndarray))
+            np.testing.assert_allclose(Xslice.linear_map(np.ones(3)),
+                                       path.slice_columns(candidate_set).linear_map(np.ones(3)))
+            np.testing.assert_allclose(sol1['beta'].toarray(), sol2['beta'].toarray(), 
+                                       rtol=1.e-6, atol=1.e-8)
+    finally:
+        shutil.rmtree(tempdir)
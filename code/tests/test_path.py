@@ -1,4 +1,7 @@
+import os
+
 import numpy as np, regreg.api as rr
+import scipy.sparse
 import nose.tools as nt
 
 def test_path():
@@ -218,3 +221,303 @@ def test_path_nonnegative():
     nt.assert_true(np.linalg.norm(beta1-beta2) / np.linalg.norm(beta1) < 1.e-5)
 
 
+
+def test_path_coordinate_descent():
+    '''
+    this test compares the paths found by FISTA and
+    coordinate descent
+
+    '''
+    X = np.random.standard_normal((100,5))
+    U = np.random.standard_normal((100,2))
+    Y = np.random.standard_normal(100)
+    betaX = np.array([3,4,5,0,0])
+    betaU = np.array([10,-5])
+    Y += np.dot(X, betaX) + np.dot(U, betaU)
+
+    for penalty_structure in [[rr.L1_PENALTY]*5 + [rr.UNPENALIZED]*2,
+                              [rr.POSITIVE_PART]*5 + [rr.NONNEGATIVE]*2]:
+        lasso1 = rr.lasso.squared_error(np.hstack([X,U]),Y, penalty_structure=penalty_structure, nstep=23)
+        beta1 = lasso1.main(inner_tol=1.e-12)['beta'].todense()
+
+        lasso2 = rr.lasso.squared_error(np.hstack([X,U]),Y, penalty_structure=penalty_structure, nstep=23)
+        beta2 = lasso2.main(inner_tol=1.e-12, solver='coordinate_descent')['beta'].todense()
+
+        np.testing.assert_allclose(beta1, beta2, rtol=1.e-5, atol=1.e-8)
+        # Gram columns are only computed for variables that were nonzero
+        nt.assert_true(len(lasso2.coordinate_descent.gram) <= lasso2.ever_active.sum())
+
+def test_path_store():
+    from regreg.paths import path_store
+
+    p, nsol = 50, 40
+    solutions = np.random.standard_normal((nsol, p)) * np.random.binomial(1, 0.1, (nsol, p))
+    for max_memory in [np.inf, 100]:
+        store = path_store(p, initial_size=1, max_memory=max_memory)
+        for solution in solutions:
+            store.append(solution)
+        path = store.finalize()
+        np.testing.assert_equal(len(store), nsol)
+        np.testing.assert_equal(store.spilled, max_memory < np.inf)
+        np.testing.assert_allclose(path.toarray(), solutions.T)
+        np.testing.assert_equal(path.nnz, (solutions != 0).sum())
+
+    tempdir = store.tempdir
+    nt.assert_true(os.path.exists(tempdir))
+    del(store)
+    nt.assert_false(os.path.exists(tempdir))
+    # the finalized path remains valid 
+    np.testing.assert_allclose(path.toarray(), solutions.T)
+
+    nt.assert_raises(ValueError, path_store(p).append, np.zeros(p+1))
+
+def test_path_spill():
+    X = np.random.standard_normal((100,5))
+    Y = np.random.standard_normal(100) + np.dot(X, [3,4,5,0,0])
+    sol1 = rr.lasso.squared_error(X, Y, nstep=23).main(inner_tol=1.e-12)
+    sol2 = rr.lasso.squared_error(X, Y, nstep=23).main(inner_tol=1.e-12, max_path_memory=0)
+    nt.assert_equal(sol1['beta'].shape, (6, 23))
+    np.testing.assert_allclose(sol1['beta'].toarray(), sol2['beta'].toarray())
+
+def test_path_zero_columns():
+    '''
+    columns of zeros are dropped from the design and 
+    their coefficients are zero along the path
+    '''
+    X = np.random.standard_normal((100,5))
+    Y = np.random.standard_normal(100) + np.dot(X, [3,4,5,0,0])
+    Z = np.zeros((100,7))
+    Z[:,[0,1,3,4,6]] = X
+    sol1 = rr.lasso.squared_error(X, Y, nstep=23, 
+                                  penalty_structure=[rr.L1_PENALTY] * 4 + [rr.UNPENALIZED]).main(inner_tol=1.e-12)
+    for design in [Z, scipy.sparse.csc_matrix(Z)]:
+        sol2 = rr.lasso.squared_error(design, Y, nstep=23,
+                                      penalty_structure=[rr.L1_PENALTY] * 6 + [rr.UNPENALIZED]).main(inner_tol=1.e-12)
+        beta2 = sol2['beta'].toarray()
+        np.testing.assert_equal(beta2[[3,6]], 0)
+        beta1 = sol1['beta'].toarray()
+        nt.assert_true(np.linalg.norm(beta2[[0,1,2,4,5,7]] - beta1) / np.linalg.norm(beta1) < 1.e-4)
+
+def test_path_parallel():
+    '''
+    this test compares paths computed serially and in parallel segments
+    '''
+    X = np.random.standard_normal((100,20))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:5], [3,4,5,2,1])
+
+    for design, kwargs in [(X, {}),
+                           (scipy.sparse.csc_matrix(X), {}),
+                           (X, {'scale':False, 'center':False, 'intercept':False})]:
+        for solver in ['FISTA', 'coordinate_descent']:
+            if scipy.sparse.issparse(design) and solver == 'coordinate_descent':
+                continue
+            sol1 = rr.lasso.squared_error(design, Y, nstep=23, **kwargs).main(inner_tol=1.e-12, solver=solver)
+            lasso2 = rr.lasso.squared_error(design, Y, nstep=23, **kwargs)
+            sol2 = lasso2.main(inner_tol=1.e-12, solver=solver, n_jobs=3)
+
+            nt.assert_equal(sorted(sol1.keys()), sorted(sol2.keys()))
+            nt.assert_equal(sol1['beta'].shape, sol2['beta'].shape)
+            nt.assert_equal(len(sol1['df']), len(sol2['df']))
+            np.testing.assert_allclose(sol1['beta'].toarray(), sol2['beta'].toarray(), rtol=1.e-5, atol=1.e-6)
+            np.testing.assert_allclose(sol1['devratio'], sol2['devratio'], rtol=1.e-5, atol=1.e-6)
+            # the parent is left at the end of the path
+            np.testing.assert_allclose(lasso2.nonzero.adjoint_map(lasso2.solution),
+                                       sol2['beta'].toarray()[:,-1])
+
+def test_shared_copy():
+    from regreg.paths import shared_copy
+
+    X = np.random.standard_normal((10,4))
+    for M in [X, scipy.sparse.csc_matrix(X), scipy.sparse.coo_matrix(X)]:
+        S = shared_copy(M)
+        if scipy.sparse.issparse(M):
+            np.testing.assert_allclose(S.toarray(), X)
+        else:
+            np.testing.assert_allclose(S, X)
+
+def test_cv_lasso():
+    X = np.random.standard_normal((100,10))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:3], [3,4,5])
+
+    cv1 = rr.cv_lasso.squared_error(X, Y, nfolds=4, seed=0, nstep=15)
+    results1 = cv1.fit(inner_tol=1.e-10)
+    cv2 = rr.cv_lasso.squared_error(X, Y, nfolds=4, seed=0, nstep=15, n_jobs=2)
+    results2 = cv2.fit(inner_tol=1.e-10)
+
+    np.testing.assert_allclose(results1['cv_mean'], results2['cv_mean'], rtol=1.e-6)
+    nt.assert_equal(results1['deviance'].shape, (4, 15))
+    nt.assert_equal(len(results1['fold_times']), 4)
+    nt.assert_true(results1['lagrange_1se'] >= results1['lagrange_min'])
+    # the signal is strong: the smallest deviance is not at the null model
+    nt.assert_true(results1['lagrange_min'] < results1['lagrange'][0])
+
+    # the deviance of a fold is that of its cases under the fold's path
+    test = cv1.folds[0]
+    train = np.ones(100, np.bool)
+    train[test] = False
+    fold_lasso = rr.lasso.squared_error(X[train], Y[train], nstep=15)
+    fold_lasso.lagrange_sequence = cv1.lagrange_sequence
+    fold_lasso.main(inner_tol=1.e-10)
+    Xn = (X[test] - X[train].mean(0)) / X[train].std(0)
+    eta = np.dot(Xn, fold_lasso.solution[1:]) + fold_lasso.solution[0]
+    np.testing.assert_allclose(results1['deviance'][0,-1],
+                               cv1.loss_factory.deviance(eta, Y[test]), rtol=1.e-4)
+
+def test_cv_deviance():
+    from regreg.paths import logistic_factory, squared_error_factory
+
+    # the mean binomial deviance and the mean squared error
+    Y = np.random.binomial(1, 0.5, 50)
+    eta = np.random.standard_normal((50,3))
+    pi = np.exp(eta) / (1 + np.exp(eta))
+    loglik = (Y[:,np.newaxis] * np.log(pi) + (1 - Y[:,np.newaxis]) * np.log(1 - pi)).mean(0)
+    np.testing.assert_allclose(logistic_factory(Y).deviance(eta, Y), -2 * loglik)
+    np.testing.assert_allclose(logistic_factory(Y).deviance(np.zeros(50), Y), 2 * np.log(2))
+
+    # squared_error(X, Z) is minimized at np.dot(X, beta) = -Z
+    Z = np.random.standard_normal(50)
+    np.testing.assert_allclose(squared_error_factory(Z).deviance(eta, Z), 
+                               ((Z[:,np.newaxis] + eta)**2).mean(0))
+
+def test_path_screening():
+    '''
+    this test compares paths computed with and without gap safe screening
+    '''
+    # the paths agree only up to the tolerance of the KKT checks
+    np.random.seed(0)
+    X = np.random.standard_normal((100,60))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:5], [3,4,5,2,1])
+    penalty_structure = [0]*3 + [1]*3 + [rr.L1_PENALTY]*50 + [rr.POSITIVE_PART]*4
+
+    sol1 = rr.lasso.squared_error(X, Y, nstep=20, penalty_structure=penalty_structure).main(inner_tol=1.e-12)
+    for screening in ['static', 'sequential', 'dynamic']:
+        sol2 = rr.lasso.squared_error(X, Y, nstep=20, penalty_structure=penalty_structure).main(inner_tol=1.e-12, screening=screening)
+        np.testing.assert_allclose(sol1['beta'].toarray(), sol2['beta'].toarray(), rtol=1.e-5, atol=1.e-6)
+        nt.assert_equal(sol2['screened'].shape, (20,))
+        nt.assert_true(sol2['screened'][1] > 0)
+        nt.assert_true(sol2['kkt_checks_avoided'].sum() > 0)
+        nt.assert_true(np.all(sol2['kkt_checks_avoided'] <= (sol2['kkt_retries'] + 1) * sol2['screened']))
+
+    # screened coordinates are 0 at the solution
+    path_lasso = rr.lasso.squared_error(X, Y, nstep=20)
+    sol = path_lasso.main(inner_tol=1.e-12)
+    screened = path_lasso.safe_screen(path_lasso.solution)
+    nt.assert_true(np.all(path_lasso.solution[screened] == 0))
+
+    nt.assert_raises(ValueError, path_lasso.main, screening='unknown')
+
+def test_partial_grad():
+    '''
+    this test compares gradients on subsets of columns, computed from
+    the maintained linear predictor, with the full gradient
+    '''
+    X = np.random.standard_normal((100,30))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:3], [3,4,5])
+
+    for design in [X, scipy.sparse.csc_matrix(X)]:
+        for path_lasso in [rr.lasso.squared_error(design, Y, nstep=10),
+                           rr.lasso.logistic(design, (Y > 0).astype(np.float), nstep=10)]:
+            path_lasso.main(inner_tol=1.e-10)
+            path_lasso.linear_predictor()
+            # the predictor is updated from the coefficients that change
+            path_lasso.solution[[0,4,7]] += [0.3,-1,2]
+            np.testing.assert_allclose(path_lasso.linear_predictor(),
+                                       path_lasso.loss.linear_predictor(path_lasso.solution))
+
+            full_grad = path_lasso.grad()
+            columns = np.zeros(31, np.bool)
+            columns[[0,2,5,9]] = True
+            for subset in [columns, ~columns]:
+                partial_grad = path_lasso.grad(columns=subset, out=np.zeros(31))
+                np.testing.assert_allclose(partial_grad[subset], full_grad[subset])
+                np.testing.assert_equal(partial_grad[~subset], 0)
+
+def test_restricted_lipschitz():
+    '''
+    this test checks the bound on the Lipschitz constants of the
+    restricted problems, from the estimate of the full design
+    '''
+    X = np.random.standard_normal((100,30))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:3], [3,4,5])
+    candidate_set = np.zeros(31, np.bool)
+    candidate_set[[0,2,5,9,12]] = True
+
+    for path_lasso in [rr.lasso.squared_error(X, Y, nstep=10),
+                       rr.lasso.logistic(X, (Y > 0).astype(np.float), nstep=10)]:
+        with rr.monitor() as m:
+            path_lasso.main(inner_tol=1.e-10)
+        # power_L is only called for the full design
+        nt.assert_equal(m.as_dict()['counts']['power_L'], 1)
+
+        subproblem = path_lasso.restricted_problem(candidate_set, path_lasso.lagrange_sequence[0])[0]
+        bound = path_lasso.restricted_lipschitz(subproblem.smooth_atom)
+        curvature = subproblem.smooth_atom.sm_atom.gradient_lipschitz()
+        nt.assert_true(np.allclose(bound, curvature * path_lasso.lipschitz))
+        Xslice = path_lasso.Xn.slice_columns(candidate_set)
+        nt.assert_true(curvature * rr.power_L(Xslice) <= bound * (1 + 1.e-6))
+
+def test_subproblem_cache():
+    '''
+    this test compares paths computed with and without cached 
+    restricted problems, and designs extended from cached ones 
+    with sliced designs
+    '''
+    from regreg.paths import subproblem_cache
+
+    cache = subproblem_cache(max_entries=2, max_memory=100)
+    sets = [np.arange(6) < k for k in range(2, 6)]
+    cache.put(sets[0], 'a', 40)
+    cache.put(sets[1], 'b', 40)
+    nt.assert_equal(cache.get(sets[0]), 'a')
+    cache.put(sets[2], 'c', 40)
+    # the least recently used entry is evicted
+    nt.assert_true(cache.get(sets[1]) is None)
+    nt.assert_equal(len(cache), 2)
+    cache.put(sets[3], 'd', 80)
+    nt.assert_equal(len(cache), 1)
+    nt.assert_equal(cache.nbytes, 80)
+    cache.put(sets[1], 'e', 200)
+    nt.assert_true(cache.get(sets[1]) is None)
+    nt.assert_equal(cache.nearest_subset(np.ones(6, np.bool), 2)[1], 'd')
+    nt.assert_true(cache.nearest_subset(sets[2], 2) is None)
+
+    X = np.random.standard_normal((100,20))
+    Y = np.random.standard_normal(100) + np.dot(X[:,:5], [3,4,5,2,1])
+    for design in [X, scipy.sparse.csc_matrix(X), scipy.sparse.csr_matrix(X)]:
+        sol1 = rr.lasso.squared_error(design, Y, nstep=23).main(inner_tol=1.e-12, max_cache_memory=0)
+        path_lasso = rr.lasso.squared_error(design, Y, nstep=23)
+        sol2 = path_lasso.main(inner_tol=1.e-12)
+        np.testing.assert_allclose(sol1['beta'].toarray(), sol2['beta'].toarray())
+        nt.assert_true(path_lasso.subproblem_cache.hits > 0)
+
+        candidate_set = np.zeros(21, np.bool)
+        candidate_set[[0,3,8]] = True
+        path_lasso.restricted_problem(candidate_set, 1., cache=True)
+        candidate_set[[1,12]] = True
+        extended = path_lasso.sliced_design(candidate_set)
+        sliced = path_lasso.slice_columns(candidate_set)
+        beta = np.random.standard_normal(5)
+        np.testing.assert_allclose(extended.linear_map(beta), sliced.linear_map(beta))
+
+def test_slope():
+    np.random.seed(0)
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + np.dot(X[:,:3], [3,-2,2])
+
+    # with equal weights, the path is that of the lasso
+    lasso_path = rr.lasso.squared_error(X, Y, nstep=10).main(inner_tol=1.e-12)
+    slope_path = rr.slope.squared_error(X, Y, np.ones(p), nstep=10).main(inner_tol=1.e-12)
+    np.testing.assert_allclose(slope_path['beta'].todense(), lasso_path['beta'].todense(), 
+                               rtol=1.e-4, atol=1.e-6)
+
+    # each solution solves the full problem
+    weights = np.linspace(2, 1, p)
+    path_slope = rr.slope.squared_error(X, Y, weights, nstep=10)
+    path_slope.main(inner_tol=1.e-12)
+    lagrange = path_slope.lagrange_sequence[-1]
+    problem = path_slope.restricted_problem(np.ones(p+1, np.bool), lagrange)[0]
+    soln = problem.solve(tol=1.e-14, min_its=500) 
+    np.testing.assert_allclose(path_slope.solution, soln, rtol=1.e-3, atol=1.e-5)
+
+    nt.assert_raises(ValueError, path_slope.main, solver='coordinate_descent')
@@ -0,0 +1,76 @@
+import numpy as np
+import itertools
+import nose.tools as nt
+
+import regreg.api as rr
+from regreg.atoms import piecewise_linear as PL
+from regreg.atoms.projl1_cython import projl1, projl1_epigraph, projl1_weighted
+
+from test_seminorms import ac
+
+def bisect(b, slope, norms, weights):
+    """
+    The solution of f(t) = slope*t + b by bisection.
+    """
+    f = lambda t: (weights * np.maximum(norms - weights * t, 0)).sum() - slope * t - b
+    lo, hi = 0., 1.
+    while f(hi) > 0:
+        hi *= 2
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        if f(mid) > 0:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+def test_solutions():
+    np.random.seed(0)
+    for p, slope, weighted in itertools.product([1, 2, 10, 100], [0, 1, 0.3], [False, True]):
+        norms = np.fabs(np.random.standard_normal(p)) * 2
+        norms[::7] = 0
+        if weighted:
+            weights = np.random.uniform(0.1, 2, p)
+        else:
+            weights = np.ones(p)
+        total = (weights * norms).sum()
+        for b in [0.1 * total, 0.5 * total, 0.99 * total]:
+            condat = PL.find_solution_piecewise_linear_condat(b, slope, norms, weights)
+            yield ac, condat, bisect(b, slope, norms, weights), 'condat against bisection'
+            yield ac, condat, PL.find_solution_piecewise_linear_sort(b, slope, norms, weights), 'condat against sorting'
+            if not weighted:
+                yield ac, PL.find_solution_piecewise_linear_condat(b, slope, norms), condat, 'unweighted condat'
+                yield ac, PL.find_solution_piecewise_linear_c_sort(b, slope, norms), condat, 'unweighted sorting'
+
+        # outside of the ball f(0) < b
+        yield nt.assert_equal, PL.find_solution_piecewise_linear_condat(total + 1, slope, norms, weights), np.inf
+
+    # a negative b for the epigraph, the solution is past the largest knot
+    norms = np.array([1., 2, 3])
+    for find in [PL.find_solution_piecewise_linear_condat, PL.find_solution_piecewise_linear_sort]:
+        yield ac, find(-5., 1., norms, np.ones(3)), 5., 'solution past the largest knot'
+
+def test_set_method():
+    np.random.seed(1)
+    x = np.random.standard_normal(50) * 2
+    center = np.hstack([0.5, x])
+    old_method = PL.set_method('sort')
+    try:
+        sort_results = [projl1(x, 2.), projl1_epigraph(center), 
+                        projl1_weighted(x, 2., np.linspace(0.5, 2, 50)),
+                        rr.l1norm(50, bound=2.).bound_prox(x)]
+        PL.set_method('condat')
+        condat_results = [projl1(x, 2.), projl1_epigraph(center), 
+                          projl1_weighted(x, 2., np.linspace(0.5, 2, 50)),
+                          rr.l1norm(50, bound=2.).bound_prox(x)]
+    finally:
+        PL.set_method(old_method)
+    for sort_result, condat_result in zip(sort_results, condat_results):
+        yield ac, sort_result, condat_result, 'sort and condat projections'
+    yield ac, np.fabs(projl1(x, 2.)).sum(), 2., 'projection onto the l1 sphere'
+    nt.assert_raises(ValueError, PL.set_method, 'quickselect')
+
+def test_projl1_epigraph_polar():
+    # a point of the polar cone is projected to 0
+    center = np.array([-3., 1., -1.])
+    ac(projl1_epigraph(center), np.zeros(3), 'polar cone projects to 0')
@@ -0,0 +1,96 @@
+import numpy as np
+import itertools
+import nose.tools as nt
+
+import regreg.api as rr
+from regreg.atoms.seminorms import sorted_l1_support
+
+from test_seminorms import solveit, ac
+
+def isotonic_prox(x, weights):
+    """
+    The proximal map of the sorted l1 norm from the min-max 
+    formula of the nonincreasing fit to the sorted np.fabs(x) - weights.
+    """
+    order = np.argsort(-np.fabs(x))
+    v = np.fabs(x)[order] - weights
+    p = x.shape[0]
+    fit = np.array([min([max([v[s:t+1].mean() for t in range(i, p)]) 
+                         for s in range(i+1)]) for i in range(p)])
+    result = np.zeros(p)
+    result[order] = np.maximum(fit, 0)
+    return np.sign(x) * result
+
+def test_lagrange_prox():
+    np.random.seed(0)
+    for _ in range(20):
+        p = np.random.random_integers(1, 15)
+        x = np.random.standard_normal(p) * 2
+        weights = np.sort(np.random.uniform(0, 2, p))[::-1]
+        penalty = rr.sorted_l1norm(p, weights=weights, lagrange=0.7)
+        yield ac, penalty.lagrange_prox(x, lipschitz=2.), isotonic_prox(x, weights * 0.35), 'sorted l1 prox'
+
+    # equal weights give the l1 norm
+    x = np.random.standard_normal(30)
+    yield ac, rr.sorted_l1norm(30, lagrange=0.5).lagrange_prox(x), rr.l1norm(30, lagrange=0.5).lagrange_prox(x), 'sorted l1 with equal weights'
+
+def test_bound_prox():
+    np.random.seed(1)
+    p = 25
+    x = np.random.standard_normal(p) * 3
+    weights = np.linspace(2, 0.5, p)
+    penalty = rr.sorted_l1norm(p, weights=weights, lagrange=0.7)
+    soln = penalty.lagrange_prox(x)
+    bound = penalty.seminorm(soln, lagrange=1)
+
+    bound_penalty = rr.sorted_l1norm(p, weights=weights, bound=bound)
+    yield ac, bound_penalty.bound_prox(x), soln, 'projection onto the sorted l1 ball'
+    yield nt.assert_equal, bound_penalty.constraint(bound_penalty.bound_prox(x)), 0
+
+    dual = penalty.conjugate
+    yield nt.assert_equal, dual.__class__, rr.sorted_l1norm_dual
+    yield ac, dual.bound_prox(x), x - soln, 'projection onto the dual ball'
+    yield nt.assert_equal, dual.constraint(x - soln), 0
+    yield ac, dual.seminorm(x - soln, lagrange=1), 0.7, 'the residual is on the dual sphere'
+
+def test_support():
+    # the strong rule of SLOPE with equal thresholds is that of the lasso
+    x = np.random.standard_normal(50)
+    np.testing.assert_equal(sorted_l1_support(x, 0.8 * np.ones(50)), np.fabs(x) > 0.8)
+
+@np.testing.dec.slow
+def test_proximal_maps():
+    shape = 20
+
+    bound = 0.14
+    lagrange = 0.13
+
+    Z = np.random.standard_normal(shape) * 2
+    W = 0.02 * np.random.standard_normal(shape)
+    U = 0.02 * np.random.standard_normal(shape)
+    linq = rr.identity_quadratic(0,0,W,0)
+    weights = np.linspace(1.5, 0.5, shape)
+
+    for L, atom, q, offset, FISTA, coef_stop in itertools.product([0.5,1,0.1],
+                                                                  [rr.sorted_l1norm, rr.sorted_l1norm_dual],
+                                                                  [None, linq],
+                                                                  [None, U],
+                                                                  [False, True],
+                                                                  [False, True]):
+
+        p = atom(shape, weights=weights, quadratic=q, lagrange=lagrange,
+                 offset=offset)
+        d = p.conjugate 
+        yield ac, p.lagrange_prox(Z, lipschitz=L), Z-d.bound_prox(Z*L)/L, 'testing lagrange_prox and bound_prox starting from atom %s ' % atom
+
+        nt.assert_raises(AttributeError, setattr, p, 'bound', 4.)
+        nt.assert_raises(AttributeError, setattr, d, 'lagrange', 4.)
+
+        for t in solveit(p, Z, W, U, linq, L, FISTA, coef_stop):
+            yield t
+
+        b = atom(shape, weights=weights, bound=bound, quadratic=q,
+                 offset=offset)
+
+        for t in solveit(b, Z, W, U, linq, L, FISTA, coef_stop):
+            yield t
@@ -0,0 +1,102 @@
+import numpy as np
+import itertools
+import nose.tools as nt
+
+import regreg.api as rr
+from regreg.affine.fused_lasso import difference_transform
+
+from test_seminorms import solveit, ac
+
+def test_lagrange_prox():
+    np.random.seed(0)
+    n = 30
+    Y = np.repeat([0, 3, -1.], 10) + np.random.standard_normal(n)
+    D = difference_transform(np.arange(n))
+    weights = np.random.uniform(0.5, 1.5, n-1)
+
+    for W, lagrange, L in itertools.product([None, weights], [0.3, 2.], [0.5, 1]):
+        penalty = rr.tv1d(n, weights=W, lagrange=lagrange)
+        direct = penalty.lagrange_prox(Y, lipschitz=L)
+
+        # the same prox through the dual of a fused lasso
+        if W is None:
+            W = np.ones(n-1)
+        fused = rr.linear_atom(rr.weighted_l1norm(n-1, W, lagrange=lagrange / L),
+                               rr.linear_transform(D))
+        loss = rr.signal_approximator(Y)
+        dual = rr.dual_problem.fromprimal(loss, fused)
+        yield ac, direct, dual.solve(tol=1.e-14, max_its=5000), 'tv1d prox against dual_problem'
+
+        # the prox is constant between jumps and its jumps
+        # have the sign of the dual variable
+        u = np.cumsum(Y - direct)[:-1]
+        yield np.testing.assert_, np.all(np.fabs(u) <= L**(-1) * lagrange * W + 1.e-8)
+        jumps = np.fabs(np.diff(direct)) > 1.e-8
+        yield ac, u[jumps], -np.sign(np.diff(direct))[jumps] * lagrange * W[jumps] / L
+
+def test_bound_prox():
+    np.random.seed(1)
+    n = 25
+    Y = np.random.standard_normal(n) * 3
+    penalty = rr.tv1d(n, lagrange=0.7)
+    soln = penalty.lagrange_prox(Y)
+    bound = penalty.seminorm(soln, lagrange=1)
+
+    bound_penalty = rr.tv1d(n, bound=bound)
+    yield ac, bound_penalty.bound_prox(Y), soln, 'projection onto the tv1d ball'
+    yield nt.assert_equal, bound_penalty.constraint(bound_penalty.bound_prox(Y)), 0
+
+    # conjugate pair and Moreau's identity
+    dual = penalty.conjugate
+    yield nt.assert_equal, dual.__class__, rr.tv1d_dual
+    yield nt.assert_equal, dual.bound, 0.7
+    yield ac, dual.bound_prox(Y), Y - soln, 'projection onto the dual ball'
+    yield nt.assert_equal, dual.constraint(Y - soln), 0
+    yield nt.assert_equal, dual.constraint(Y - Y.mean() + 1), np.inf
+
+def test_simple_problem():
+    np.random.seed(2)
+    n = 100
+    Y = np.repeat([0, 3, -1, 2.], 25) + np.random.standard_normal(n)
+    penalty = rr.tv1d(n, lagrange=2.)
+    # signal_approximator(-Y) is 0.5 * ||beta - Y||^2_2
+    problem = rr.simple_problem(rr.signal_approximator(-Y), penalty)
+    yield ac, problem.solve(tol=1.e-12), penalty.lagrange_prox(Y), 'simple_problem with tv1d'
+
+@np.testing.dec.slow
+def test_proximal_maps():
+    shape = 20
+
+    bound = 0.14
+    lagrange = 0.13
+
+    Z = np.random.standard_normal(shape) * 2
+    W = 0.02 * np.random.standard_normal(shape)
+    U = 0.02 * np.random.standard_normal(shape)
+    linq = rr.identity_quadratic(0,0,W,0)
+    weights = np.random.uniform(0.5, 1.5, shape-1)
+
+    for L, atom, q, offset, FISTA, coef_stop, w in itertools.product([0.5,1,0.1],
+                                                                     [rr.tv1d, rr.tv1d_dual],
+                                                                     [None, linq],
+                                                                     [None, U],
+                                                                     [False, True],
+                                                                     [False, True],
+                                                                     [None, weights]):
+
+        p = atom(shape, weights=w, quadratic=q, lagrange=lagrange,
+                 offset=offset)
+        d = p.conjugate 
+        yield ac, p.lagrange_prox(Z, lipschitz=L), Z-d.bound_prox(Z*L)/L, 'testing lagrange_prox and bound_prox starting from atom %s ' % atom
+
+        nt.assert_raises(AttributeError, setattr, p, 'bound', 4.)
+        nt.assert_raises(AttributeError, setattr, d, 'lagrange', 4.)
+
+        for t in solveit(p, Z, W, U, linq, L, FISTA, coef_stop):
+            yield t
+
+        b = atom(shape, weights=w, bound=bound, quadratic=q,
+                 offset=offset)
+
+        for t in solveit(b, Z, W, U, linq, L, FISTA, coef_stop):
+            yield t
@@ -62,3 +62,43 @@ def test_weighted_l1_with_zero():
     npt.assert_equal(a.lagrange_prox(z), z-b.bound_prox(z))
     npt.assert_equal(a.lagrange_prox(z)[0], z[0])
     npt.assert_equal(a.lagrange_prox(z)[1:], c.lagrange_prox(z[1:]))
+
+def test_weighted_l1_bound_prox():
+    np.random.seed(0)
+    z = np.random.standard_normal(10) * 3
+    a = rr.weighted_l1norm(10, 2*np.ones(10), bound=1.)
+    b = rr.l1norm(10, bound=0.5)
+    npt.assert_almost_equal(a.bound_prox(z), b.bound_prox(z))
+    npt.assert_almost_equal(a.dual[1].lagrange_prox(z), b.dual[1].lagrange_prox(z))
+
+    # zero weights are not constrained, infinite weights are set to 0
+    w = np.random.uniform(0.5, 2, 10)
+    w[0] = 0
+    w[1] = np.inf
+    c = rr.weighted_l1norm(10, w, bound=1.)
+    projected = c.bound_prox(z)
+    npt.assert_equal(projected[0], z[0])
+    npt.assert_equal(projected[1], 0)
+    npt.assert_almost_equal(np.fabs(w[2:] * projected[2:]).sum(), 1.)
+
+def test_weighted_supnorm_lagrange_prox():
+    np.random.seed(0)
+    z = np.random.standard_normal(10) * 3
+    a = rr.weighted_supnorm(10, 2*np.ones(10), lagrange=0.5)
+    b = rr.supnorm(10, lagrange=1.)
+    npt.assert_almost_equal(a.lagrange_prox(z), b.lagrange_prox(z))
+
+    # the minimizer of 0.5 * ((x - z)**2).sum() + lagrange * np.fabs(w * x).max()
+    # clips z at t / w, where ((np.fabs(z) - t / w)_+ / w).sum() = lagrange
+    w = np.random.uniform(0.5, 2, 10)
+    c = rr.weighted_supnorm(10, w, lagrange=0.5)
+    lo, hi = 0, np.fabs(w * z).max()
+    for _ in range(100):
+        t = 0.5 * (lo + hi)
+        if (np.maximum(np.fabs(z) - t / w, 0) / w).sum() > 0.5:
+            lo = t
+        else:
+            hi = t
+    npt.assert_almost_equal(c.lagrange_prox(z), np.sign(z) * np.minimum(np.fabs(z), t / w))
+    npt.assert_almost_equal(c.lagrange_prox(z, lipschitz=2), 
+                            rr.weighted_supnorm(10, w, lagrange=0.25).lagrange_prox(z))